@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Benchmark zpracování a agregací nad syntetickými daty
+
+Měří propustnost (dokumenty/s), špičku RSS a alokace tří fází backendu:
+
+- process  - process_elasticsearch_data_with_existing_logic (validace hitů)
+- averages - calculate_averages_and_yoy_with_existing_logic (ořez, průměry, YoY)
+- rent     - agregace nájmů jako v /api/pmx/rent (averages_and_yoy + záznamy)
+
+Každá kombinace fáze a velikosti běží ve vlastním procesu, aby se špičky
+paměti neovlivňovaly. Výsledky se porovnají s uloženou baseline a při
+zhoršení nad toleranci skončí skript s kódem 1. Chybějící baseline
+(nebo měřený případ, který v ní není) je chyba s kódem 2.
+
+Použití:
+    python benchmark_pipeline.py --docs 10000 100000 1000000
+    python benchmark_pipeline.py --update-baseline
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+CASES = ("process", "averages", "rent")
+DEFAULT_DOCS = (10000, 100000)
+BASELINE_FILE = "benchmark_baseline.json"
+
+# Vstup se generuje jen do této velikosti, větší běhy ho opakují dokola
+POOL_LIMIT = 1000000
+
+# Měření alokací (tracemalloc) je pomalé - jen do této velikosti
+ALLOC_LIMIT = 1000000
+
+# Paměťové rozdíly pod touto hranicí jsou šum alokátoru
+MEMORY_SLACK_MB = 8.0
+
+def rss_mb():
+    """Aktuální RSS procesu v MB (Linux /proc, jinak maximum z getrusage)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError, AttributeError):
+        import resource
+        scale = 1048576 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+class PeakRss:
+    """Vlákno, které během měření sleduje nejvyšší RSS"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, rss_mb())
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, rss_mb())
+
+def hit_pool(docs, market_type, seed):
+    """Vstupní hity - nad POOL_LIMIT se stejné dokumenty opakují"""
+    from pmx_synthetic import generate_hits
+    return list(generate_hits(min(docs, POOL_LIMIT), seed=seed, market_type=market_type))
+
+def prepare(case, docs, seed):
+    """Vstup a měřená funkce pro fázi (příprava se do měření nepočítá)"""
+    import simple_backend as backend
+    from pmx_processing import averages_and_yoy, frame_to_records
+
+    market_type = "Residential Rent" if case == "rent" else "Residential Sale"
+    pool = hit_pool(docs, market_type, seed)
+
+    def hits():
+        return itertools.islice(itertools.cycle(pool), docs)
+
+    if case == "process":
+        return hits, backend.process_elasticsearch_data_with_existing_logic
+
+    records = backend.process_elasticsearch_data_with_existing_logic(hits())
+    del pool
+    gc.collect()
+
+    if case == "averages":
+        return lambda: records, backend.calculate_averages_and_yoy_with_existing_logic
+
+    current_year = datetime.now().year
+
+    def rent(data):
+        avg_frame, yoy_frame = averages_and_yoy(data, current_year)
+        return frame_to_records(avg_frame, 'avg'), frame_to_records(yoy_frame, 'yoy', 'avg_yoy')
+
+    return lambda: records, rent
+
+def run_case(case, docs, seed, repeats):
+    """Změř jednu fázi v tomto procesu a vrať slovník metrik"""
+    make_input, fn = prepare(case, docs, seed)
+
+    timings = []
+    peak_rss = 0.0
+    for _ in range(repeats):
+        data = make_input()
+        gc.collect()
+        with PeakRss() as rss:
+            started = time.perf_counter()
+            fn(data)
+            timings.append(time.perf_counter() - started)
+        peak_rss = max(peak_rss, rss.peak_mb - rss.start_mb)
+        del data
+
+    result = {
+        "docs": docs,
+        "seconds": round(min(timings), 4),
+        "docs_per_s": round(docs / min(timings), 1),
+        "peak_rss_mb": round(peak_rss, 1),
+        "alloc_peak_mb": None
+    }
+
+    if docs <= ALLOC_LIMIT:
+        data = make_input()
+        gc.collect()
+        tracemalloc.start()
+        fn(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["alloc_peak_mb"] = round(peak / 1048576, 1)
+
+    return result
+
+def run_isolated(case, docs, seed, repeats):
+    """Spusť fázi v samostatném procesu - výsledek je poslední řádek výstupu"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", case,
+         "--docs", str(docs), "--seed", str(seed), "--repeats", str(repeats)],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{case}@{docs} selhal:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(results, baseline, tolerance):
+    """Seznam regresí vůči baseline (propustnost dolů, paměť nahoru)"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        if current["docs_per_s"] < previous["docs_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: propustnost {current['docs_per_s']:,.0f}/s < {previous['docs_per_s']:,.0f}/s"
+            )
+        for metric in ("peak_rss_mb", "alloc_peak_mb"):
+            if current.get(metric) is None or previous.get(metric) is None:
+                continue
+            limit = max(previous[metric] * (1 + tolerance), previous[metric] + MEMORY_SLACK_MB)
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {current[metric]} MB > {previous[metric]} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark zpracování PMX nad syntetickými daty")
+    parser.add_argument("--docs", type=int, nargs="+", default=list(DEFAULT_DOCS),
+                        help="Počty dokumentů (10k - 10M)")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Povolené zhoršení proti baseline (0.2 = 20 %%)")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--child", choices=CASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_case(args.child, args.docs[0], args.seed, args.repeats)))
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("results", {})
+
+    # Kontrola bez baseline by vždy prošla - selže hned, ještě před měřením
+    if not args.update_baseline and not baseline:
+        print(f"❌ Baseline {args.baseline} neexistuje - spusť s --update-baseline")
+        return 2
+
+    results = {}
+    for case in args.cases:
+        for docs in args.docs:
+            name = f"{case}@{docs}"
+            result = run_isolated(case, docs, args.seed, args.repeats)
+            results[name] = result
+            alloc = "-" if result["alloc_peak_mb"] is None else f"{result['alloc_peak_mb']} MB"
+            print(f"📊 {name:<18} {result['docs_per_s']:>12,.0f} dok/s  "
+                  f"RSS +{result['peak_rss_mb']} MB  alokace {alloc}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "seed": args.seed,
+                "results": {**baseline, **results}
+            }, f, indent=2, sort_keys=True)
+        print(f"💾 Baseline uložena do {args.baseline}")
+        return 0
+
+    missing = sorted(name for name in results if name not in baseline)
+    if missing:
+        print(f"❌ Baseline {args.baseline} nemá {', '.join(missing)} - spusť s --update-baseline")
+        return 2
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"❌ Regrese {regression}")
+    if regressions:
+        return 1
+
+    print(f"✅ Bez regresí proti {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
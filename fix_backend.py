@@ -15,7 +15,8 @@ def check_dependencies():
         'uvicorn==0.24.0.post1', 
         'requests==2.31.0',
         'pandas==2.1.3',
-        'python-dateutil==2.8.2'
+        'python-dateutil==2.8.2',
+        'httpx==0.25.2'
     ]
     
     for dep in required:
@@ -37,6 +38,7 @@ def test_imports():
         import fastapi
         import uvicorn
         import requests
+        import httpx
         import pandas
         from datetime import datetime
         print("✅ Všechny importy fungují")
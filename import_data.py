@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
 """
 Import dat z Elasticsearch do MySQL
+
+Výchozí je import v tomto procesu (pmx_import.py) - prodeje i nájmy
+souběžně, s průběhem a checkpointem. Původní spouštění sales.py/rent.py
+jako podprocesů zůstává přes --legacy nebo PMX_IMPORT_MODE=subprocess.
 """
 import sys
 import os
 import subprocess
-import time
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+
+from pmx_import import run_inprocess_import, refresh_aggregates, invalidate_api_cache, parse_args
 
 def run_elasticsearch_import():
-    """Spuštění importu z Elasticsearch"""
+    """Spuštění importu z Elasticsearch (podprocesy sales.py a rent.py)"""
     print("📊 Importuji data z Elasticsearch...")
     
     elasticsearch_dir = "Elasticsearch-to-MySQL-master/Elasticsearch-to-MySQL-master/ElasticsearchToMysql"
@@ -63,17 +66,25 @@ def run_elasticsearch_import():
         os.chdir(original_dir)
 
 def main():
+    args = parse_args()
+    
     print("📥 Spouštím import dat...")
     print("⚠️  POZOR: Import může trvat několik minut")
     print("=" * 50)
     
-    if run_elasticsearch_import():
+    imported = run_elasticsearch_import() if args.legacy else run_inprocess_import(args)
+    
+    if imported:
+        refresh_aggregates(from_records=not args.legacy)
+        invalidate_api_cache()
         print("\n✅ IMPORT DOKONČEN!")
         print("\n📋 DALŠÍ KROK:")
         print("Spusť API server: python start_api.py")
-    else:
-        print("\n❌ Import selhal!")
-        print("Zkus spustit API s demo daty: python start_simple_api.py")
+        return 0
+    
+    print("\n❌ Import selhal nebo nebyl dokončen!")
+    print("Spusť import znovu (naváže), nebo API s demo daty: python start_simple_api.py")
+    return 1
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
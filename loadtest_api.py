@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Zátěžový test API se stejným mixem požadavků jako dashboard
+
+Mix odpovídá volání ze src/services/api.ts - Overview (all county
+average + yoy), CountyAnalysis (average/yoy pro vybraný kraj a ložnice),
+RentAnalysis (rent avg + yoy), PropertySearch (eval/property) a občas
+region/area. Kraje se vybírají s reálným zešikmením (Dublin, Cork...).
+
+Backend běží buď v tomto procesu (--app, přes ASGI bez sítě), nebo
+se volá přes HTTP (--url). Výstup: propustnost, p50/p95/p99, chybovost
+a počet dotazů na upstream na jeden požadavek (z /metrics).
+
+Použití:
+    python loadtest_api.py --app simple_backend --stub-auth --concurrency 32 --duration 30
+    python loadtest_api.py --url http://localhost:8000 --requests 2000 --json run.json
+    python loadtest_api.py --app working_backend --compare run.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import random
+import re
+import sys
+import time
+
+import httpx
+
+from pmx_synthetic import COUNTY_WEIGHTS
+
+API_KEY = "test_api_key_123"
+DOMAIN = "localhost"
+
+# (váha, endpoint, parametry) - váhy podle toho, jak často se pohledy dashboardu otevírají
+REQUEST_MIX = [
+    (20, "/api/pmx/all", lambda rng: {"entity": "county", "version": "average"}),
+    (20, "/api/pmx/all", lambda rng: {"entity": "county", "version": "yoy"}),
+    (15, "/api/pmx/average", lambda rng: county_params(rng)),
+    (15, "/api/pmx/yoy", lambda rng: county_params(rng)),
+    (8, "/api/pmx/rent", lambda rng: {"version": "avg"}),
+    (8, "/api/pmx/rent", lambda rng: {"version": "yoy"}),
+    (8, "/api/eval/property", lambda rng: {"area": "All"}),
+    (3, "/api/pmx/all", lambda rng: {"entity": rng.choice(["region", "area"]), "version": rng.choice(["average", "yoy"])}),
+]
+
+UPSTREAM_METRIC = re.compile(r'^pmx_stage_duration_seconds_count\{stage="es_fetch"\} (\S+)$', re.M)
+HITS_METRIC = re.compile(r'^pmx_es_hits_fetched_total (\S+)$', re.M)
+
+def county_params(rng):
+    """Kraj podle podílu prodejů, ložnice často nevyplněné (jako v CountyAnalysis)"""
+    counties = list(COUNTY_WEIGHTS)
+    params = {"county": rng.choices(counties, weights=list(COUNTY_WEIGHTS.values()))[0]}
+    if rng.random() < 0.4:
+        params["beds"] = ",".join(str(b) for b in sorted(rng.sample(range(1, 7), rng.randint(1, 3))))
+    return params
+
+def percentile(values, p):
+    """Percentil metodou nearest-rank (values musí být seřazené)"""
+    if not values:
+        return None
+    rank = max(int(round(p / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+async def scrape_upstream(client):
+    """(dotazy na upstream, stažené hity) z /metrics - None, pokud backend metriky nemá"""
+    try:
+        response = await client.get("/metrics")
+        text = response.text
+    except httpx.HTTPError:
+        return None
+    calls = UPSTREAM_METRIC.search(text)
+    hits = HITS_METRIC.search(text)
+    return (
+        float(calls.group(1)) if calls else 0.0,
+        float(hits.group(1)) if hits else 0.0
+    )
+
+def is_error(response):
+    """HTTP chyba nebo 200 s {"error": ...} (backendy chyby často vrací v těle)"""
+    if response.status_code >= 400:
+        return True
+    try:
+        body = response.json()
+    except ValueError:
+        return True
+    return isinstance(body, dict) and "error" in body
+
+async def run_load(client, concurrency, total, duration, seed, warmup=0):
+    """Uzavřená smyčka - `concurrency` uživatelů, každý posílá další požadavek po odpovědi"""
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in REQUEST_MIX]
+    samples = []
+    issued = 0
+
+    def next_request():
+        nonlocal issued
+        if total is not None and issued >= total:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        _, path, build = rng.choices(REQUEST_MIX, weights=weights)[0]
+        return path, dict(build(rng), key=API_KEY, domain=DOMAIN)
+
+    async def user():
+        while True:
+            request = next_request()
+            if request is None:
+                return
+            path, params = request
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                error = is_error(response)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                error, status = True, type(e).__name__
+            samples.append((path, time.perf_counter() - started, error, status))
+
+    # Zahřátí - první načtení dat se do výsledků nepočítá
+    for _ in range(warmup):
+        _, path, build = rng.choices(REQUEST_MIX, weights=weights)[0]
+        await client.get(path, params=dict(build(rng), key=API_KEY, domain=DOMAIN))
+
+    before = await scrape_upstream(client)
+    deadline = time.perf_counter() + duration if duration else None
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await scrape_upstream(client)
+
+    upstream = None
+    if before is not None and after is not None:
+        upstream = (after[0] - before[0], after[1] - before[1])
+    return samples, elapsed, upstream
+
+def summarize(samples, elapsed, upstream, concurrency):
+    """Souhrn běhu - celkově i po endpointech"""
+    def stats(rows):
+        latencies = sorted(latency for _, latency, _, _ in rows)
+        errors = sum(1 for _, _, error, _ in rows if error)
+        return {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4) if rows else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2) if rows else None,
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2) if rows else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2) if rows else None,
+            "max_ms": round(latencies[-1] * 1000, 2) if rows else None
+        }
+
+    report = stats(samples)
+    report.update({
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "upstream_calls": None,
+        "upstream_calls_per_request": None,
+        "hits_per_request": None
+    })
+    if upstream is not None and samples:
+        report["upstream_calls"] = int(upstream[0])
+        report["upstream_calls_per_request"] = round(upstream[0] / len(samples), 4)
+        report["hits_per_request"] = round(upstream[1] / len(samples), 1)
+
+    by_endpoint = {}
+    for row in samples:
+        by_endpoint.setdefault(row[0], []).append(row)
+    report["endpoints"] = {path: stats(rows) for path, rows in sorted(by_endpoint.items())}
+    return report
+
+def print_report(report, previous=None):
+    def delta(key, source=report, base=previous):
+        if not base or base.get(key) is None or source.get(key) is None:
+            return ""
+        change = source[key] - base[key]
+        return f" ({'+' if change >= 0 else ''}{change:.4g})"
+
+    print("=" * 72)
+    print(f"📈 {report['requests']} požadavků za {report['seconds']} s, souběžnost {report['concurrency']}")
+    print(f"   propustnost   {report['throughput_rps']} req/s{delta('throughput_rps')}")
+    print(f"   p50/p95/p99   {report['p50_ms']} / {report['p95_ms']} / {report['p99_ms']} ms"
+          f"{delta('p95_ms')}")
+    print(f"   chybovost     {report['error_rate']:.2%} ({report['errors']}){delta('error_rate')}")
+    if report["upstream_calls"] is not None:
+        print(f"   upstream      {report['upstream_calls']} dotazů, "
+              f"{report['upstream_calls_per_request']} / požadavek{delta('upstream_calls_per_request')}, "
+              f"{report['hits_per_request']} hitů / požadavek")
+    else:
+        print("   upstream      nezjištěno (backend nemá /metrics)")
+
+    print("-" * 72)
+    for path, stats in report["endpoints"].items():
+        print(f"   {path:<20} {stats['requests']:>6}  p50 {stats['p50_ms']:>9} ms  "
+              f"p99 {stats['p99_ms']:>9} ms  chyby {stats['error_rate']:.1%}")
+
+async def main_async(args):
+    if args.app:
+        backend = importlib.import_module(args.app)
+        if args.stub_auth and hasattr(backend, "api_key_auth"):
+            # Bez MySQL - každý klíč je platný, cache ověřování se neměří
+            backend.api_key_auth.check = lambda key, domain: 1
+
+        await backend.app.router.startup()
+        transport = httpx.ASGITransport(app=backend.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+    else:
+        backend = None
+        client = httpx.AsyncClient(
+            base_url=args.url, timeout=args.timeout,
+            limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        )
+
+    try:
+        samples, elapsed, upstream = await run_load(
+            client, args.concurrency, args.requests, args.duration, args.seed, warmup=args.warmup
+        )
+    finally:
+        await client.aclose()
+        if backend is not None:
+            await backend.app.router.shutdown()
+
+    return summarize(samples, elapsed, upstream, args.concurrency)
+
+def main():
+    parser = argparse.ArgumentParser(description="Zátěžový test PMX API s mixem požadavků dashboardu")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--app", choices=["simple_backend", "working_backend"], help="Backend v tomto procesu")
+    target.add_argument("--url", help="Běžící backend, např. http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=None, help="Počet požadavků (výchozí 1000 bez --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="Délka běhu v sekundách")
+    parser.add_argument("--warmup", type=int, default=2, help="Požadavky před měřením")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stub-auth", action="store_true", help="S --app: přeskoč ověření klíče v MySQL")
+    parser.add_argument("--json", help="Ulož výsledek do souboru")
+    parser.add_argument("--compare", help="Porovnej s dřívějším výsledkem (--json)")
+    args = parser.parse_args()
+
+    if args.requests is None and args.duration is None:
+        args.requests = 1000
+
+    report = asyncio.run(main_async(args))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(report, previous)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Výsledek uložen do {args.json}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Agregace county × beds počítané přímo v Elasticsearch (size: 0)
+
+Místo stahování tisíců záznamů přes _source se pošle jeden agregační dotaz
+a z bucketů se sestaví stejné odpovědi jako z pandas groupby.
+"""
+import os
+from datetime import datetime, timezone
+
+# Textová pole se agregují přes keyword podpole
+KEYWORD_SUFFIX = os.getenv("PMX_ES_KEYWORD_SUFFIX", ".keyword")
+COUNTY_FIELD = f"county{KEYWORD_SUFFIX}"
+
+# Ložnice > 5 se slučují do kategorie 6 stejně jako při zpracování záznamů
+BEDS_RANGES = [
+    {"key": "1", "from": 1, "to": 2},
+    {"key": "2", "from": 2, "to": 3},
+    {"key": "3", "from": 3, "to": 4},
+    {"key": "4", "from": 4, "to": 5},
+    {"key": "5", "from": 5, "to": 6},
+    {"key": "6", "from": 6},
+]
+
+PERCENTS = [25, 50, 75]
+
+def build_filtered_query(market_type, date_from, date_to, counties, price_gt=0, price_lt=None):
+    """Sestav filtr odpovídající validaci záznamů (kraj, ložnice, cena, datum)"""
+    price_range = {"gt": price_gt}
+    if price_lt is not None:
+        price_range["lt"] = price_lt
+
+    return {
+        "bool": {
+            "must": [{"match": {"marketType": market_type}}],
+            "filter": [
+                {
+                    "range": {
+                        "saleDate": {
+                            "gte": date_from.strftime("%Y-%m-%d"),
+                            "lte": date_to.strftime("%Y-%m-%d")
+                        }
+                    }
+                },
+                {"terms": {COUNTY_FIELD: list(counties)}},
+                {"range": {"beds": {"gte": 1}}},
+                {"range": {"price": price_range}}
+            ]
+        }
+    }
+
+def build_price_percentiles_body(market_type, date_from, date_to, counties, percents=(5, 95)):
+    """Dotaz na globální percentily ceny - hranice pro odstranění outlierů"""
+    return {
+        "size": 0,
+        "query": build_filtered_query(market_type, date_from, date_to, counties),
+        "aggs": {
+            "price_percentiles": {
+                "percentiles": {"field": "price", "percents": list(percents)}
+            }
+        }
+    }
+
+def build_county_beds_body(market_type, date_from, date_to, counties, price_gt=0, price_lt=None):
+    """Jeden agregační dotaz county → beds → průměr, počet, percentily a měsíční součty"""
+    return {
+        "size": 0,
+        "query": build_filtered_query(
+            market_type, date_from, date_to, counties,
+            price_gt=price_gt, price_lt=price_lt
+        ),
+        "aggs": {
+            "by_county": {
+                "terms": {"field": COUNTY_FIELD, "size": len(counties)},
+                "aggs": {
+                    "by_beds": {
+                        "range": {"field": "beds", "ranges": BEDS_RANGES},
+                        "aggs": {
+                            "avg_price": {"avg": {"field": "price"}},
+                            "sum_price": {"sum": {"field": "price"}},
+                            "price_percentiles": {
+                                "percentiles": {"field": "price", "percents": PERCENTS}
+                            },
+                            "by_month": {
+                                "date_histogram": {
+                                    "field": "saleDate",
+                                    "calendar_interval": "month",
+                                    "min_doc_count": 1
+                                },
+                                "aggs": {
+                                    "sum_price": {"sum": {"field": "price"}}
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+def parse_price_percentiles(aggregations):
+    """Vrať (p_low, p_high) z odpovědi build_price_percentiles_body"""
+    values = aggregations["price_percentiles"]["values"]
+    percents = sorted(values, key=float)
+    return values[percents[0]], values[percents[-1]]
+
+def parse_county_beds_buckets(aggregations):
+    """Převeď buckety na řádky {county, beds, count, avg, percentiles, months}
+
+    months je slovník "YYYY-MM" → (count, sum), ze kterého lze dopočítat
+    průměr libovolného okna včetně YoY.
+    """
+    rows = []
+
+    for county_bucket in aggregations.get("by_county", {}).get("buckets", []):
+        county = county_bucket["key"]
+
+        for beds_bucket in county_bucket["by_beds"]["buckets"]:
+            count = beds_bucket["doc_count"]
+            if not count:
+                continue
+
+            months = {}
+            for month_bucket in beds_bucket["by_month"]["buckets"]:
+                month = datetime.fromtimestamp(month_bucket["key"] / 1000, tz=timezone.utc).strftime("%Y-%m")
+                months[month] = (month_bucket["doc_count"], month_bucket["sum_price"]["value"])
+
+            rows.append({
+                "county": county,
+                "beds": int(beds_bucket["key"]),
+                "count": count,
+                "avg": beds_bucket["avg_price"]["value"],
+                "sum": beds_bucket["sum_price"]["value"],
+                "percentiles": {
+                    float(p): v for p, v in beds_bucket["price_percentiles"]["values"].items()
+                },
+                "months": months
+            })
+
+    return rows
+
+def yearly_average(row, year):
+    """Průměr ceny za kalendářní rok z měsíčních součtů, None pokud chybí data"""
+    prefix = f"{year}-"
+    count = 0
+    total = 0.0
+
+    for month, (month_count, month_sum) in row["months"].items():
+        if month.startswith(prefix):
+            count += month_count
+            total += month_sum
+
+    return total / count if count else None
+
+def rows_to_avg_results(rows):
+    """{county: [{county, beds, avg}]} - stejný tvar jako /api/pmx/all?version=avg"""
+    avg_results = {}
+
+    for row in sorted(rows, key=lambda r: (r["county"], r["beds"])):
+        avg_results.setdefault(row["county"], []).append({
+            'county': row["county"],
+            'beds': row["beds"],
+            'avg': float(row["avg"])
+        })
+
+    return avg_results
+
+def rows_to_yoy_results(rows, current_year, key='yoy'):
+    """{county: [{county, beds, <key>}]} - meziroční změna průměru v %"""
+    yoy_results = {}
+
+    for row in sorted(rows, key=lambda r: (r["county"], r["beds"])):
+        current_price = yearly_average(row, current_year)
+        last_price = yearly_average(row, current_year - 1)
+
+        if current_price is None or last_price is None:
+            continue
+
+        yoy_change = ((current_price - last_price) / last_price) * 100
+        yoy_results.setdefault(row["county"], []).append({
+            'county': row["county"],
+            'beds': row["beds"],
+            key: round(yoy_change, 1)
+        })
+
+    return yoy_results
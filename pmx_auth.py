@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Krátkodobá cache před existujícím ověřením API klíčů
+
+Ověření samotné zůstává na auth_api_key z PMX-api (app.api.utils.auth),
+tady se jen pamatuje jeho výsledek: úspěšně ověřené dvojice (klíč,
+doména) pár desítek sekund, odmítnuté jen pár sekund. Zrušený token
+tak přestane fungovat nejpozději po PMX_AUTH_CACHE_TTL sekundách
+a opakované dotazy se stejným klíčem nechodí do pmx_api_auth. Hned
+se dá cache vyprázdnit přes POST /api/cache/invalidate?auth=true.
+
+Vlastní dotaz do pmx_api_auth (připojení z poolu) se tu neimplementuje -
+zůstává na auth_api_key, aby ověření mělo jediné místo.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+from pmx_metrics import AUTH_SECONDS
+
+AUTH_CACHE_TTL = float(os.getenv("PMX_AUTH_CACHE_TTL", "60"))
+# Krátce - jen aby opakované pokusy se špatným klíčem nezatěžovaly databázi;
+# nově vydaný klíč by jinak byl odmítán celou dobu
+AUTH_NEGATIVE_TTL = float(os.getenv("PMX_AUTH_NEGATIVE_TTL", "2"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("PMX_AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+def hash_key(key):
+    """sha256 hex API klíče - v cache se nedrží klíče v čitelné podobě"""
+    return hashlib.sha256(key.encode()).hexdigest()
+
+class ApiKeyAuth:
+    """Cache ověřených i odmítnutých klíčů (TTL + LRU) před funkcí check
+
+    check(key=..., domain=...) je existující auth_api_key - při platném
+    klíči vrátí výsledek, při neplatném vyhodí HTTPException.
+    """
+
+    def __init__(self, check, ttl=AUTH_CACHE_TTL,
+                 negative_ttl=AUTH_NEGATIVE_TTL, max_entries=AUTH_CACHE_MAX_ENTRIES):
+        self.check = check
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.lookup_seconds = 0.0
+
+    def authenticate(self, key, domain):
+        """Jako auth_api_key - vrať jeho výsledek, nebo vyhoď HTTPException
+
+        Odmítnutí (HTTPException z check) se pamatuje negative_ttl sekund
+        a vyhodí se znovu se stejným stavem a detailem. Jiná chyba (např. nedostupná
+        databáze) se necachuje a vrátí 503.
+        """
+        cache_key = (hash_key(key or ""), domain)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                valid, outcome = entry[1], entry[2]
+            else:
+                self.misses += 1
+                entry = None
+
+        if entry is None:
+            valid, outcome = self._check(key, domain, cache_key)
+
+        if not valid:
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(status_code=outcome.status_code, detail=outcome.detail, headers=outcome.headers)
+        return outcome
+
+    def _check(self, key, domain, cache_key):
+        """Zavolej check a ulož výsledek; (platný, výsledek nebo HTTPException)"""
+        started = time.perf_counter()
+        try:
+            valid, outcome = True, self.check(key=key, domain=domain)
+        except HTTPException as e:
+            valid, outcome = False, e
+        except Exception as e:
+            AUTH_SECONDS.observe(time.perf_counter() - started, result="error")
+            print(f"❌ Chyba ověření API klíče: {str(e)}")
+            raise HTTPException(status_code=503, detail="Ověření API klíče není dostupné")
+        elapsed = time.perf_counter() - started
+        AUTH_SECONDS.observe(elapsed, result="valid" if valid else "invalid")
+
+        ttl = self.ttl if valid else self.negative_ttl
+        with self._lock:
+            self.lookup_seconds += elapsed
+            self._entries[cache_key] = (time.monotonic() + ttl, valid, outcome)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return valid, outcome
+
+    def invalidate(self, key=None):
+        """Zapomeň jeden klíč (všechny domény), nebo celou cache"""
+        with self._lock:
+            if key is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+
+            hashed_key = hash_key(key)
+            keys = [cache_key for cache_key in self._entries if cache_key[0] == hashed_key]
+            for cache_key in keys:
+                del self._entries[cache_key]
+            return len(keys)
+
+    def stats(self):
+        """Počítadla pro monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "negative_ttl": self.negative_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "rejected": self.rejected,
+                "lookup_seconds": round(self.lookup_seconds, 6)
+            }
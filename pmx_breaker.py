@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Circuit breaker pro ippi.io
+
+Po několika selháních za sebou se upstream přestane volat a po uplynutí
+backoffu se pustí jediný zkušební dotaz. Když selže i ten, backoff se
+zdvojnásobí (až do maxima). Backend mezitím odpovídá z posledních dat.
+"""
+import os
+import threading
+import time
+
+BREAKER_FAILURES = int(os.getenv("PMX_BREAKER_FAILURES", "5"))
+BREAKER_BACKOFF = float(os.getenv("PMX_BREAKER_BACKOFF", "5"))
+BREAKER_MAX_BACKOFF = float(os.getenv("PMX_BREAKER_MAX_BACKOFF", "300"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class UpstreamUnavailable(Exception):
+    """Upstream selhal nebo je breaker otevřený"""
+
+class CircuitBreaker:
+    """closed → (N selhání) → open → (backoff) → half_open → closed/open"""
+
+    def __init__(self, name="ippi.io", failure_threshold=BREAKER_FAILURES,
+                 backoff=BREAKER_BACKOFF, max_backoff=BREAKER_MAX_BACKOFF):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = backoff
+        self.retry_at = 0.0
+        self.opened = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_success = None
+
+    def allow(self):
+        """Smí dotaz na upstream? V half_open projde jen jeden zkušební"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN and time.monotonic() >= self.retry_at:
+                self.state = HALF_OPEN
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.backoff = self.base_backoff
+            self.last_success = time.time()
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error) if error is not None else None
+
+            if self.state == HALF_OPEN:
+                # Zkušební dotaz selhal - čekej dvakrát déle
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.retry_at = time.monotonic() + self.backoff
+        self.opened += 1
+        print(f"🔌 {self.name}: circuit breaker otevřen, další pokus za {self.backoff:g} s")
+
+    def call(self, fn, *args, **kwargs):
+        """Zavolej fn přes breaker - výjimka i None je selhání (UpstreamUnavailable)"""
+        if not self.allow():
+            raise UpstreamUnavailable(f"{self.name} je dočasně vypnutý (circuit breaker)")
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record_failure(e)
+            raise UpstreamUnavailable(f"{self.name}: {str(e)}") from e
+
+        if result is None:
+            self.record_failure("prázdná odpověď")
+            raise UpstreamUnavailable(f"{self.name} nevrátil odpověď")
+
+        self.record_success()
+        return result
+
+    def stats(self):
+        """Stav breakeru pro monitoring"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "backoff": self.backoff,
+                "retry_in": round(max(self.retry_at - time.monotonic(), 0.0), 1) if self.state == OPEN else 0.0,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+                "last_success": self.last_success
+            }
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Hromadné nahrávání řádků do pmx_report
+
+Místo executemany po jednotlivých řádcích se dávka zapíše jedním
+LOAD DATA LOCAL INFILE z dočasného TSV souboru, nebo (když server či
+připojení LOCAL INFILE nepovolí) víceřádkovými INSERT ... ON DUPLICATE
+KEY UPDATE. Každá dávka je vlastní transakce. Při prvním nahrání do
+prázdné tabulky lze sekundární indexy dočasně odstranit a postavit je až
+po nahrání dat - InnoDB je pak vytvoří jedním seřazeným průchodem.
+
+Připojení používá stejné parametry jako setup_database.py, jen z
+proměnných PMX_MYSQL_* (MYSQL_CONFIG v pmx_materialize.py).
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from pmx_materialize import MYSQL_CONFIG
+
+BULK_METHOD = os.getenv("PMX_BULK_METHOD", "auto")
+BULK_BATCH_ROWS = int(os.getenv("PMX_BULK_BATCH_ROWS", "50000"))
+BULK_STATEMENT_ROWS = int(os.getenv("PMX_BULK_STATEMENT_ROWS", "2000"))
+
+NULL = "\\N"
+
+# LOCAL INFILE vypnutý na serveru (local_infile=0) nebo v klientovi
+LOCAL_INFILE_ERRORS = (1148, 2068, 3948, 3950)
+
+def connect(local_infile=True):
+    """Samostatné připojení do pmx_report s povoleným LOAD DATA LOCAL INFILE"""
+    import mysql.connector
+    return mysql.connector.connect(allow_local_infile=local_infile, autocommit=False, **MYSQL_CONFIG)
+
+# Escapování textu pro LOAD DATA (ESCAPED BY '\\')
+ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+SPECIAL = ("\\", "\t", "\n", "\r")
+
+def _tsv_column(series):
+    """Sloupec → seznam textů pro TSV; převody běží v numpy, Python jen u textu"""
+    values = series.to_numpy()
+    missing = pd.isna(values) if values.dtype == object else series.isna().to_numpy()
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series) \
+            or pd.api.types.is_datetime64_any_dtype(series):
+        # Hodnoty se opakují (data, ložnice, ceny) - formátuje se jen každá jednou
+        codes, uniques = pd.factorize(values)
+        uniques = np.asarray(uniques)
+        if uniques.dtype.kind == "M":
+            uniques = uniques.astype("datetime64[s]")
+            # Čistá data bez času jako DATE, jinak DATETIME (ISO s "T" MySQL přijme)
+            unit = "D" if (uniques.astype("datetime64[D]") == uniques).all() else "s"
+            formatted = np.datetime_as_string(uniques, unit=unit)
+        else:
+            formatted = uniques.astype(np.int8 if uniques.dtype == bool else uniques.dtype).astype(str)
+        text = np.append(formatted.astype(object), NULL)[codes]
+        return text.tolist()
+    else:
+        strings = [value if type(value) is str else str(value) for value in values.tolist()]
+        joined = "".join(strings)
+        if any(char in joined for char in SPECIAL):
+            strings = [value.translate(ESCAPES) for value in strings]
+        text = strings
+
+    if missing.any():
+        text = np.where(missing, NULL, np.asarray(text, dtype=object))
+    return text.tolist() if isinstance(text, np.ndarray) else text
+
+def frame_to_tsv(frame):
+    """DataFrame → text pro LOAD DATA (tabulátory, \\N jako NULL)"""
+    if frame.empty:
+        return ""
+    columns = [_tsv_column(frame[column]) for column in frame.columns]
+    return "\n".join(map("\t".join, zip(*columns))) + "\n"
+
+def frame_rows(frame):
+    """DataFrame → n-tice pro INSERT s Python typy (NaN/NaT jako None)
+
+    mysql-connector neumí numpy skaláry ani pandas Timestamp, proto se
+    datumy převádí na datetime a čísla na int/float.
+    """
+    columns = []
+    for column in frame.columns:
+        series = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = np.array(series.dt.to_pydatetime(), dtype=object)
+        else:
+            values = series.to_numpy(dtype=object)
+        values[series.isna().to_numpy()] = None
+        columns.append(values.tolist())
+    return list(zip(*columns))
+
+class BulkLoader:
+    """Nahrává DataFrame do tabulky po dávkách, každou dávku v jedné transakci
+
+    update_columns zapne upsert: při LOAD DATA jako REPLACE (řádek se
+    stejným klíčem se nahradí), při INSERT jako ON DUPLICATE KEY UPDATE.
+    method "auto" zkusí LOAD DATA a při zakázaném LOCAL INFILE přejde
+    natrvalo na víceřádkové INSERT. before_batch(cursor, batch) běží na
+    začátku transakce každé dávky (např. smazání řádků, které dávka nahradí).
+    """
+
+    def __init__(self, connection, table, columns, update_columns=None, method=BULK_METHOD,
+                 batch_rows=BULK_BATCH_ROWS, statement_rows=BULK_STATEMENT_ROWS, before_batch=None):
+        self.connection = connection
+        self.table = table
+        self.columns = list(columns)
+        self.update_columns = list(update_columns or [])
+        self.method = method
+        self.batch_rows = batch_rows
+        self.statement_rows = statement_rows
+        self.before_batch = before_batch
+        self.rows = 0
+
+    def load(self, frame):
+        """Nahraj všechny řádky frame (sloupce v pořadí columns), vrať jejich počet"""
+        if frame is None or frame.empty:
+            return 0
+
+        frame = frame[self.columns]
+        loaded = 0
+        for start in range(0, len(frame), self.batch_rows):
+            batch = frame.iloc[start:start + self.batch_rows]
+            self._load_batch(batch)
+            loaded += len(batch)
+
+        self.rows += loaded
+        return loaded
+
+    def _prepare(self, batch):
+        if self.before_batch is None:
+            return
+        cursor = self.connection.cursor()
+        try:
+            self.before_batch(cursor, batch)
+        finally:
+            cursor.close()
+
+    def _load_batch(self, batch):
+        if self.method in ("auto", "infile"):
+            try:
+                self._prepare(batch)
+                self._load_infile(batch)
+                self.connection.commit()
+                return
+            except Exception as e:
+                self.connection.rollback()
+                if self.method == "infile" or getattr(e, "errno", None) not in LOCAL_INFILE_ERRORS:
+                    raise
+                print(f"⚠️ LOAD DATA LOCAL INFILE není povolený ({e}) - nahrávám přes INSERT")
+                self.method = "insert"
+
+        try:
+            self._prepare(batch)
+            self._load_insert(batch)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
+    def _load_infile(self, batch):
+        handle = tempfile.NamedTemporaryFile("w", suffix=".tsv", encoding="utf-8", delete=False)
+        try:
+            with handle:
+                handle.write(frame_to_tsv(batch))
+
+            cursor = self.connection.cursor()
+            try:
+                cursor.execute(f"""
+                    LOAD DATA LOCAL INFILE %s {'REPLACE' if self.update_columns else ''}
+                    INTO TABLE {self.table}
+                    CHARACTER SET utf8mb4
+                    FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                    LINES TERMINATED BY '\\n'
+                    ({', '.join(self.columns)})
+                """, (handle.name,))
+            finally:
+                cursor.close()
+        finally:
+            os.remove(handle.name)
+
+    def _insert_statement(self, count):
+        placeholders = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        statement = (
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES "
+            + ", ".join([placeholders] * count)
+        )
+        if self.update_columns:
+            statement += " ON DUPLICATE KEY UPDATE " + ", ".join(
+                f"{column} = VALUES({column})" for column in self.update_columns
+            )
+        return statement
+
+    def _load_insert(self, batch):
+        rows = frame_rows(batch)
+        cursor = self.connection.cursor()
+        try:
+            for start in range(0, len(rows), self.statement_rows):
+                chunk = rows[start:start + self.statement_rows]
+                cursor.execute(self._insert_statement(len(chunk)), [value for row in chunk for value in row])
+        finally:
+            cursor.close()
+
+def secondary_indexes(connection, table):
+    """{název: [sloupce]} pro neunikátní B-tree indexy
+
+    Unikátní indexy zůstávají - bez nich by upsert mohl vložit duplicity
+    a index by pak nešlo znovu vytvořit.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SHOW INDEX FROM {table}")
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    indexes = {}
+    # Table, Non_unique, Key_name, Seq_in_index, Column_name, Collation, Cardinality, Sub_part, Packed, Null, Index_type
+    for row in sorted(rows, key=lambda r: (r[2], r[3])):
+        name, non_unique, column, sub_part, index_type = row[2], row[1], row[4], row[7], row[10]
+        if not non_unique or index_type != "BTREE":
+            continue
+        indexes.setdefault(name, []).append(f"{column}({sub_part})" if sub_part else column)
+    return indexes
+
+@contextmanager
+def deferred_indexes(connection, table):
+    """Odstraň sekundární indexy na dobu plného nahrání a pak je postav najednou
+
+    Jen pro tabulku, ze které se zatím nečte - bez indexů by dotazy backendu
+    procházely celé oddíly.
+    """
+    indexes = secondary_indexes(connection, table)
+    cursor = connection.cursor()
+    try:
+        if indexes:
+            print(f"🗂 Odkládám indexy {table}: {', '.join(indexes)}")
+            cursor.execute(f"ALTER TABLE {table} " + ", ".join(f"DROP INDEX {name}" for name in indexes))
+        yield indexes
+    finally:
+        if indexes:
+            cursor.execute(f"ALTER TABLE {table} " + ", ".join(
+                f"ADD INDEX {name} ({', '.join(columns)})" for name, columns in indexes.items()
+            ))
+            print(f"🗂 Indexy {table} znovu vytvořeny")
+        cursor.close()
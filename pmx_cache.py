@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Omezená in-memory cache spočítaných agregací (TTL + LRU)
+
+Data se mění jen po importu, takže opakované dotazy na stejné okno
+lze obsloužit z paměti. Import po dokončení volá invalidate().
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_TTL = float(os.getenv("PMX_CACHE_TTL", "900"))
+CACHE_MAX_BYTES = int(os.getenv("PMX_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+MISSING = object()
+
+def estimate_size(value, _seen=None):
+    """Přibližná velikost hodnoty v bajtech včetně vnořených dict/list"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k, _seen) + estimate_size(v, _seen)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += estimate_size(item, _seen)
+    return size
+
+def make_key(market_type, date_from, date_to, entity="county", version="avg"):
+    """Normalizovaný klíč - okno zarovnané na měsíce z get_date_range"""
+    return (
+        market_type,
+        date_from.strftime("%Y-%m"),
+        date_to.strftime("%Y-%m"),
+        (entity or "county").lower(),
+        "yoy" if version == "yoy" else "avg"
+    )
+
+class AggregateCache:
+    """LRU cache s TTL, limitem paměti a počítadly hit/miss"""
+
+    def __init__(self, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Vrať uloženou hodnotu, nebo MISSING pokud chybí či vypršela"""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Ulož hodnotu; nejstarší záznamy se vyhodí při překročení limitu"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, market_type=None):
+        """Smaž všechny záznamy (nebo jen jednoho typu trhu), vrať jejich počet"""
+        with self._lock:
+            keys = [
+                key for key in self._entries
+                if market_type is None or key[0] == market_type
+            ]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += 1
+            return len(keys)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        """Počítadla pro monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Hierarchická kostka kraj → region → oblast × ložnice × měsíc
+
+Kostka se postaví jednou po obnově dat z měsíčních součtů (počet, součet)
+a pro každý řez (úroveň, entita) si rovnou spočítá průměry i YoY. Dotaz
+na oblast je pak stejně levný jako dotaz na kraj - jen vyhledání ve
+slovníku, bez procházení záznamů.
+"""
+import pandas as pd
+
+from pmx_metrics import stage_timer
+
+LEVELS = ("county", "region", "area")
+
+CELL_COLUMNS = ["county", "region", "area", "beds", "month"]
+
+def normalize_level(entity):
+    """entity z API → úroveň kostky, None pro neznámou entitu"""
+    level = (entity or "county").lower()
+    return level if level in LEVELS else None
+
+class RollupCube:
+    """Předpočítané průměry a YoY pro všechny úrovně a entity"""
+
+    def __init__(self, cells, current_year):
+        """cells jsou n-tice (county, region, area, beds, "YYYY-MM", count, sum)"""
+        with stage_timer("grouping"):
+            self._build(cells, current_year)
+
+    def _build(self, cells, current_year):
+        self.current_year = current_year
+        self.months = {}
+
+        for county, region, area, beds, month, count, total in cells:
+            if count <= 0:
+                continue
+
+            for level, entity in (("county", county), ("region", region), ("area", area)):
+                if not entity:
+                    continue
+
+                slot = self.months.setdefault((level, entity), {}).setdefault((county, int(beds)), {})
+                entry = slot.get(month)
+                if entry is None:
+                    slot[month] = [count, total]
+                else:
+                    entry[0] += count
+                    entry[1] += total
+
+        self._avg = {}
+        self._yoy = {}
+        for slice_key, groups in self.months.items():
+            avg_rows, yoy_rows = self._summarize(groups)
+            self._avg[slice_key] = avg_rows
+            if yoy_rows:
+                self._yoy[slice_key] = yoy_rows
+
+        self.entities = {
+            level: sorted(entity for slice_level, entity in self.months if slice_level == level)
+            for level in LEVELS
+        }
+
+    def _summarize(self, groups):
+        """Průměr okna a YoY pro každou dvojici (kraj, ložnice) řezu"""
+        avg_rows = []
+        yoy_rows = []
+
+        for (county, beds), months in sorted(groups.items()):
+            per_year = {}
+            for month, (count, total) in months.items():
+                year = int(month[:4])
+                year_count, year_sum = per_year.get(year, (0.0, 0.0))
+                per_year[year] = (year_count + count, year_sum + total)
+
+            count = sum(c for c, _ in per_year.values())
+            total = sum(t for _, t in per_year.values())
+            avg_rows.append((county, beds, total / count))
+
+            current = per_year.get(self.current_year)
+            last = per_year.get(self.current_year - 1)
+            if current and last:
+                current_price = current[1] / current[0]
+                last_price = last[1] / last[0]
+                yoy_rows.append((county, beds, round(((current_price - last_price) / last_price) * 100, 1)))
+
+        return avg_rows, yoy_rows
+
+    @classmethod
+    def from_frame(cls, df, current_year):
+        """Postav kostku ze zpracovaných záznamů (county, region, area, beds, price, saleDate)"""
+        if df.empty:
+            return cls([], current_year)
+
+        frame = pd.DataFrame({
+            "county": df["county"].astype(object),
+            "region": df["region"].astype(object).fillna(""),
+            "area": df["area"].astype(object).fillna(""),
+            "beds": df["beds"].astype(int),
+            "month": pd.to_datetime(df["saleDate"], errors="coerce").dt.strftime("%Y-%m"),
+            "price": df["price"]
+        }).dropna(subset=["month"])
+
+        with stage_timer("grouping"):
+            grouped = frame.groupby(CELL_COLUMNS)["price"].agg(["count", "sum"])
+        cells = (
+            key + (int(count), float(total))
+            for key, count, total in zip(grouped.index, grouped["count"], grouped["sum"])
+        )
+        return cls(cells, current_year)
+
+    def slice(self, level, entity, version="avg", county=None, beds=None, value_key=None):
+        """Záznamy jednoho řezu, volitelně jen pro kraj a seznam ložnic"""
+        table = self._yoy if version == "yoy" else self._avg
+        value_key = value_key or ("yoy" if version == "yoy" else "avg")
+
+        rows = table.get((level, entity), [])
+        if county is not None:
+            rows = [row for row in rows if row[0] == county]
+        if beds:
+            rows = [row for row in rows if row[1] in beds]
+
+        if level == "county":
+            return [{'county': c, 'beds': b, value_key: value} for c, b, value in rows]
+        return [{'county': c, level: entity, 'beds': b, value_key: value} for c, b, value in rows]
+
+    def results(self, level="county", version="avg", value_key=None):
+        """{entity: [záznamy]} pro celou úroveň - tvar /api/pmx/all"""
+        results = {}
+        with stage_timer("serialization"):
+            for entity in self.entities.get(level, []):
+                records = self.slice(level, entity, version, value_key=value_key)
+                if records:
+                    results[entity] = records
+        return results
+
+    def stats(self):
+        return {level: len(entities) for level, entities in self.entities.items()}
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Souběžné stahování okna z Elasticsearch po úsecích
+
+Jeden kurzor přes search_after stahuje stránky jednu po druhé, takže celé
+tříleté okno trvá (počet stránek × latence ippi.io). Tady se okno rozdělí
+na úseky (měsíce nebo kraje), každý úsek má vlastní kurzor ve vlákně
+a stránky všech úseků se slévají do jednoho generátoru hitů.
+
+Fronta mezi vlákny a konzumentem je omezená - v paměti je jen několik
+stránek bez ohledu na velikost okna. Úsek, který selže, se zopakuje od
+hodnot sort posledního předaného hitu, takže se nestahuje znovu celé
+okno a žádný hit se nepředá dvakrát.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+FETCH_FANOUT = int(os.getenv("PMX_ES_FETCH_FANOUT", "4"))
+FETCH_SLICE = os.getenv("PMX_ES_FETCH_SLICE", "month")
+FETCH_SLICE_MONTHS = int(os.getenv("PMX_ES_FETCH_SLICE_MONTHS", "3"))
+SLICE_RETRIES = int(os.getenv("PMX_ES_SLICE_RETRIES", "2"))
+SLICE_RETRY_BACKOFF = float(os.getenv("PMX_ES_SLICE_RETRY_BACKOFF", "0.5"))
+
+# Po kolika hitech úsek předá stránku konzumentovi (a posune bod návratu)
+CHUNK_SIZE = 1000
+
+_DONE = object()
+
+class _Failed:
+    """Chyba úseku předaná frontou do vlákna konzumenta"""
+
+    def __init__(self, error):
+        self.error = error
+
+def month_slices(date_from, date_to, months):
+    """Rozděl okno na navazující úseky po `months` měsících (oba konce včetně)"""
+    slices = []
+    start = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_window = date_to.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    while start <= end_of_window:
+        year, month = divmod(start.year * 12 + start.month - 1 + max(months, 1), 12)
+        next_start = datetime(year, month + 1, 1)
+        end = min(next_start - timedelta(days=1), end_of_window)
+        slices.append((start, end))
+        start = next_start
+    return slices
+
+def slice_label(spec):
+    parts = []
+    if spec.get("date_from") is not None:
+        parts.append(f"{spec['date_from']:%Y-%m-%d}..{spec['date_to']:%Y-%m-%d}")
+    if spec.get("county"):
+        parts.append(spec["county"])
+    return " ".join(parts) or "okno"
+
+def _put(output, item, stop):
+    """Vlož do fronty; False, pokud konzument mezitím skončil"""
+    while not stop.is_set():
+        try:
+            output.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _run_slice(spec, stream_slice, output, stop, retries, backoff, retryable):
+    """Projdi jeden úsek; při chybě naváž od posledního předaného hitu"""
+    search_after = None
+    delivered = 0
+    attempt = 0
+
+    while not stop.is_set():
+        chunk = []
+        try:
+            for hit in stream_slice(search_after=search_after, **spec):
+                chunk.append(hit)
+                if len(chunk) < CHUNK_SIZE:
+                    continue
+                if not _put(output, chunk, stop):
+                    return
+                delivered += len(chunk)
+                search_after = chunk[-1].get("sort")
+                chunk = []
+                if stop.is_set():
+                    return
+
+            if chunk and not _put(output, chunk, stop):
+                return
+            _put(output, _DONE, stop)
+            return
+
+        except Exception as e:
+            attempt += 1
+            # Bez hodnot sort nejde navázat bez duplicit
+            if attempt > retries or (delivered and search_after is None) or not retryable(e):
+                _put(output, _Failed(e), stop)
+                return
+            print(f"⚠️ Úsek {slice_label(spec)} selhal ({e}) - pokus {attempt}/{retries}, "
+                  f"navazuji po {delivered} záznamech")
+            if stop.wait(backoff * 2 ** (attempt - 1)):
+                return
+
+def fetch_slices(specs, stream_slice, fanout=FETCH_FANOUT, retries=SLICE_RETRIES,
+                 backoff=SLICE_RETRY_BACKOFF, retryable=lambda error: True):
+    """Generátor hitů ze všech úseků stahovaných souběžně
+
+    stream_slice(search_after=..., **spec) je generátor hitů jednoho úseku
+    seřazených podle sort. Pořadí hitů mezi úseky není zaručené. Chyba,
+    pro kterou retryable(chyba) vrátí False (např. otevřený breaker), se
+    neopakuje; chyba úseku po vyčerpání pokusů ukončí i ostatní úseky
+    a vyhodí se konzumentovi.
+    """
+    specs = list(specs)
+    if not specs:
+        return
+
+    workers = max(min(fanout, len(specs)), 1)
+    output = queue.Queue(maxsize=workers * 2)
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pmx-fetch")
+    for spec in specs:
+        pool.submit(_run_slice, spec, stream_slice, output, stop, retries, backoff, retryable)
+
+    remaining = len(specs)
+    try:
+        while remaining:
+            item = output.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, _Failed):
+                raise item.error
+            else:
+                yield from item
+    finally:
+        # Konzument skončil (i předčasně) - vlákna dokončí rozpracovaný dotaz a skončí
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Levné liveness/readiness sondy
+
+Stav ippi.io zjišťuje prober na pozadí a sondy load balanceru jen vrací
+poslední výsledek z paměti - nikdy nesahají do Elasticsearch ani MySQL.
+"""
+import asyncio
+import os
+import time
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("PMX_HEALTH_PROBE_INTERVAL", "30"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("PMX_HEALTH_PROBE_TIMEOUT", "5"))
+
+# Nejmenší možný dotaz - bez hitů, jen ověří, že index odpovídá
+PROBE_QUERY = {"size": 0, "query": {"match_all": {}}}
+
+class UpstreamProber:
+    """Pravidelně ověřuje upstream a drží poslední výsledek"""
+
+    def __init__(self, probe, interval=HEALTH_PROBE_INTERVAL, timeout=HEALTH_PROBE_TIMEOUT):
+        self.probe = probe
+        self.interval = interval
+        self.timeout = timeout
+        self.status = "unknown"
+        self.checked_at = None
+        self.latency_ms = None
+        self.error = None
+        self.checks = 0
+        self._task = None
+
+    async def check(self):
+        """Jedna sonda - probe() je async funkce, pravdivý výsledek = upstream běží"""
+        started = time.perf_counter()
+        try:
+            ok = await asyncio.wait_for(self.probe(), self.timeout)
+            self.status, self.error = ("up", None) if ok else ("down", "prázdná odpověď")
+        except asyncio.TimeoutError:
+            self.status, self.error = "down", f"timeout {self.timeout:g} s"
+        except Exception as e:
+            self.status, self.error = "down", str(e)
+
+        self.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.checked_at = time.time()
+        self.checks += 1
+        return self.status
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def report(self):
+        """Poslední výsledek sondy (bez dotazu na upstream)"""
+        return {
+            "status": self.status,
+            "checked_ago": round(time.time() - self.checked_at, 1) if self.checked_at else None,
+            "latency_ms": self.latency_ms,
+            "error": self.error,
+            "checks": self.checks
+        }
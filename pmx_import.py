@@ -0,0 +1,652 @@
+#!/usr/bin/env python3
+"""
+Import záznamů z Elasticsearch do pmx_report v jednom procesu
+
+Nahrazuje sekvenční spouštění sales.py a rent.py jako podprocesů. Okno
+z get_date_range se pro každý typ trhu rozdělí na úseky po několika
+měsících a úseky běží souběžně v omezeném počtu vláken. Každý úsek
+prochází Elasticsearch přes search_after a po každé dávce zapíše do
+checkpointu hodnoty sort posledního hitu - přerušený (timeout, pád,
+Ctrl+C) import tak při dalším spuštění naváže tam, kde skončil.
+
+Po dokončení se pro typ trhu uloží watermark - nejvyšší saleDate a id.
+Další běh stahuje jen dokumenty od watermarku mínus překryv (pozdě
+zaindexované záznamy) a zapisuje je jako upsert podle id. Plná
+rekonciliace celého okna (--full nebo jednou za PMX_IMPORT_RECONCILE_DAYS,
+výchozí týden) navíc smaže záznamy, které v Elasticsearch už nejsou.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from pmx_materialize import get_connection, MARKET_TYPES, TRIM_OUTLIERS
+from pmx_fanout import month_slices
+from pmx_window import get_date_range
+from pmx_bulkload import BulkLoader, connect as bulk_connect, deferred_indexes
+from pmx_schema import (
+    RECORDS_TABLE, RECORD_COLUMNS, WATERMARKS_TABLE, migrate, ensure_partitions, drop_partitions_before,
+    refresh_price_bounds
+)
+
+IMPORT_PARALLELISM = int(os.getenv("PMX_IMPORT_PARALLELISM", "4"))
+IMPORT_SLICE_MONTHS = int(os.getenv("PMX_IMPORT_SLICE_MONTHS", "12"))
+IMPORT_BATCH_SIZE = int(os.getenv("PMX_IMPORT_BATCH_SIZE", "5000"))
+IMPORT_CHECKPOINT = os.getenv("PMX_IMPORT_CHECKPOINT", "import_checkpoint.json")
+PROGRESS_INTERVAL = float(os.getenv("PMX_IMPORT_PROGRESS_INTERVAL", "10"))
+# "subprocess" = původní import přes sales.py/rent.py (--legacy)
+IMPORT_MODE = os.getenv("PMX_IMPORT_MODE", "inprocess")
+
+# Kolik dní před watermarkem se stahuje znovu (0 = přesně od posledního id)
+IMPORT_OVERLAP_DAYS = int(os.getenv("PMX_IMPORT_OVERLAP_DAYS", "3"))
+# Po kolika dnech se místo přírůstku udělá plná rekonciliace (0 = jen ručně přes --full);
+# bez ní by v MySQL zůstávaly záznamy smazané z Elasticsearch
+IMPORT_RECONCILE_DAYS = float(os.getenv("PMX_IMPORT_RECONCILE_DAYS", "7"))
+
+# Po kolika id se v jednom DELETE mažou předchozí verze záznamů dávky
+DELETE_CHUNK_ROWS = 2000
+
+IMPORT_SOURCE_FIELDS = [
+    "saleDate", "county", "area", "region", "rawAddress", "price", "beds", "id", "sqrMetres"
+]
+IMPORT_EXTRA_FIELDS = {"saleDate": "", "rawAddress": "", "sqrMetres": None, "id": ""}
+
+# Stavy úlohy
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+STOPPED = "stopped"
+FAILED = "failed"
+
+class ImportCheckpoint:
+    """Pozice úseků v JSON souboru - zapisuje se atomicky po každé dávce"""
+
+    def __init__(self, path=IMPORT_CHECKPOINT):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            return dict(self._state.get(key, {}))
+
+    def update(self, key, **values):
+        with self._lock:
+            entry = self._state.setdefault(key, {})
+            entry.update(values, updated_at=datetime.now().isoformat(timespec="seconds"))
+            self._write()
+
+    def retain(self, keys):
+        """Zahoď úseky jiného okna (posunul se měsíc od přerušeného běhu)"""
+        with self._lock:
+            stale = set(self._state) - set(keys)
+            for key in stale:
+                del self._state[key]
+            if stale:
+                self._write()
+
+    def clear(self):
+        with self._lock:
+            self._state = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+def prepare_records_table(connection, window_from):
+    """Schéma přes migrace, oddíly na nové měsíce a zahození měsíců před oknem"""
+    migrate(connection, verbose=False)
+    cursor = connection.cursor()
+    try:
+        ensure_partitions(cursor)
+        dropped = drop_partitions_before(cursor, window_from)
+        connection.commit()
+    finally:
+        cursor.close()
+    if dropped:
+        print(f"🗓 Zahozené oddíly před oknem: {', '.join(dropped)}")
+
+def records_table_empty(connection):
+    """Je tabulka záznamů prázdná (první import, žádná data se z ní ještě neservírují)?"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT 1 FROM {RECORDS_TABLE} LIMIT 1")
+        return cursor.fetchone() is None
+    finally:
+        cursor.close()
+
+def sort_date(sort_values):
+    """Datum z hodnot sort (saleDate v ms od epochy)"""
+    return (datetime(1970, 1, 1) + timedelta(milliseconds=int(sort_values[0]))).date()
+
+def read_watermarks(connection):
+    """{market_type: {sale_date, doc_id, sort_values, last_full_at}}"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"SELECT market_type, sale_date, doc_id, sort_values, last_full_at FROM {WATERMARKS_TABLE}")
+        return {
+            market_type: {
+                "sale_date": sale_date, "doc_id": doc_id,
+                "sort_values": json.loads(sort_values), "last_full_at": last_full_at
+            }
+            for market_type, sale_date, doc_id, sort_values, last_full_at in cursor.fetchall()
+        }
+    finally:
+        cursor.close()
+
+def save_watermark(connection, market_type, sort_values, full=False):
+    """Ulož nejvyšší importovanou pozici; last_full_at se mění jen po plném běhu"""
+    now = datetime.now().replace(microsecond=0)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            INSERT INTO {WATERMARKS_TABLE}
+            (market_type, sale_date, doc_id, sort_values, last_full_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                sale_date = VALUES(sale_date), doc_id = VALUES(doc_id), sort_values = VALUES(sort_values),
+                last_full_at = IF(%s, VALUES(last_full_at), last_full_at), updated_at = VALUES(updated_at)
+        """, (market_type, sort_date(sort_values), str(sort_values[1]), json.dumps(sort_values),
+              now if full else None, now, full))
+        connection.commit()
+    finally:
+        cursor.close()
+
+def needs_full_import(watermark, reconcile_days=IMPORT_RECONCILE_DAYS, now=None):
+    """Plný běh bez watermarku, nebo když je poslední rekonciliace starší než reconcile_days"""
+    if watermark is None:
+        return True
+    if reconcile_days <= 0:
+        return False
+    last_full_at = watermark.get("last_full_at")
+    return last_full_at is None or (now or datetime.now()) - last_full_at >= timedelta(days=reconcile_days)
+
+def plan_market(watermark, window_from, full, overlap_days=IMPORT_OVERLAP_DAYS):
+    """(date_from, start_after) pro jeden typ trhu - přírůstek od watermarku, nebo celé okno"""
+    if full or watermark is None:
+        return window_from, None
+
+    mark = watermark["sale_date"]
+    mark = datetime(mark.year, mark.month, mark.day)
+    if overlap_days > 0:
+        return max(window_from, mark - timedelta(days=overlap_days)), None
+    if mark < window_from:
+        return window_from, None
+    return mark, watermark["sort_values"]
+
+def prune_records(connection, market_type, window_from, synced_before=None):
+    """Smaž záznamy před oknem a po plném běhu i ty, které se nesynchronizovaly"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"DELETE FROM {RECORDS_TABLE} WHERE market_type = %s AND sale_date < %s",
+            (market_type, window_from.date())
+        )
+        removed = cursor.rowcount
+        if synced_before is not None:
+            cursor.execute(
+                f"DELETE FROM {RECORDS_TABLE} WHERE market_type = %s AND synced_at < %s",
+                (market_type, synced_before)
+            )
+            removed += cursor.rowcount
+        connection.commit()
+        return removed
+    finally:
+        cursor.close()
+
+def load_imported_records(market_type, date_from=None, date_to=None):
+    """Importované záznamy v okně jako DataFrame pro build_aggregate_frame"""
+    if date_from is None or date_to is None:
+        window_from, window_to, _ = get_date_range()
+        date_from = date_from or window_from
+        date_to = date_to or window_to
+
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT county, region, area, beds, price, sale_date
+            FROM {RECORDS_TABLE}
+            WHERE market_type = %s AND sale_date BETWEEN %s AND %s
+        """, (market_type, date_from.date(), date_to.date()))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+    df = pd.DataFrame(rows, columns=["county", "region", "area", "beds", "price", "saleDate"])
+    df["saleDate"] = pd.to_datetime(df["saleDate"])
+    return df
+
+def record_frame(records, market_type, synced_at=None):
+    """Zpracované záznamy → řádky pmx_records ve sloupcích RECORD_COLUMNS (bez id a data se zahodí)"""
+    if records.empty:
+        return pd.DataFrame(columns=RECORD_COLUMNS)
+    synced_at = synced_at or datetime.now().replace(microsecond=0)
+
+    frame = pd.DataFrame({
+        "market_type": market_type,
+        "id": records["id"].to_numpy().astype(str),
+        "sale_date": records["saleDate"].dt.normalize(),
+        "county": records["county"],
+        "region": records["region"],
+        "area": records["area"],
+        "beds": records["beds"].astype(int),
+        "price": records["price"].astype(float),
+        "sqr_metres": pd.to_numeric(records["sqrMetres"], errors="coerce"),
+        "raw_address": records["rawAddress"].astype(object),
+        "synced_at": synced_at
+    })
+    return frame[(frame["id"] != "") & records["saleDate"].notna().to_numpy()]
+
+def delete_previous_versions(cursor, batch):
+    """Smaž dosavadní řádky se stejným (market_type, id) jako dávka
+
+    sale_date je součástí primárního klíče (kvůli oddílům), takže upsert
+    by záznam s posunutým datem prodeje vložil podruhé.
+    """
+    for market_type, group in batch.groupby("market_type", sort=False):
+        ids = group["id"].tolist()
+        for start in range(0, len(ids), DELETE_CHUNK_ROWS):
+            chunk = ids[start:start + DELETE_CHUNK_ROWS]
+            cursor.execute(
+                f"DELETE FROM {RECORDS_TABLE} WHERE market_type = %s AND id IN ({', '.join(['%s'] * len(chunk))})",
+                [market_type] + chunk
+            )
+
+def records_loader(connection):
+    """Upsert do pmx_records podle (market_type, id) - opakování i překryv přepíšou starý řádek"""
+    return BulkLoader(
+        connection, RECORDS_TABLE, RECORD_COLUMNS, update_columns=RECORD_COLUMNS[2:],
+        before_batch=delete_previous_versions
+    )
+
+def write_records(loader, market_type, records):
+    """Zapiš jednu dávku zpracovaných záznamů (v transakci po dávkách loaderu)"""
+    return loader.load(record_frame(records, market_type))
+
+class ImportJob:
+    """Jeden úsek okna pro jeden typ trhu"""
+
+    def __init__(self, market_type, date_from, date_to, checkpoint, batch_size=IMPORT_BATCH_SIZE,
+                 start_after=None):
+        self.market_type = market_type
+        self.date_from = date_from
+        self.date_to = date_to
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.start_after = start_after
+        self.key = f"{market_type}:{date_from:%Y-%m-%d}:{date_to:%Y-%m-%d}"
+        self.state = PENDING
+        self.last_sort = None
+        self.started_at = None
+        self.total = None
+        self.docs = 0
+        self.resumed_docs = 0
+        self.rows = 0
+        self.error = None
+
+    def count(self, backend):
+        self.total = backend.count_elasticsearch_hits(self.market_type, self.date_from, self.date_to)
+        return self.total
+
+    def run(self, backend, stop_event):
+        saved = self.checkpoint.get(self.key)
+        self.docs = self.resumed_docs = saved.get("docs", 0)
+        self.rows = saved.get("rows", 0)
+        self.last_sort = saved.get("search_after")
+        # Začátek prvního (i přerušeného) běhu úseku - hranice pro mazání po rekonciliaci
+        self.started_at = (
+            datetime.fromisoformat(saved["started_at"]) if "started_at" in saved
+            else datetime.now().replace(microsecond=0)
+        )
+
+        if saved.get("done"):
+            self.state = DONE
+            return self
+        if stop_event.is_set():
+            self.state = STOPPED
+            return self
+
+        self.state = RUNNING
+        connection = bulk_connect()
+        loader = records_loader(connection)
+        try:
+            hits = backend.stream_elasticsearch_hits(
+                self.market_type, source_fields=IMPORT_SOURCE_FIELDS,
+                date_from=self.date_from, date_to=self.date_to,
+                search_after=self.last_sort or self.start_after
+            )
+
+            batch = []
+            for hit in hits:
+                batch.append(hit)
+                if len(batch) < self.batch_size:
+                    continue
+
+                self._flush(backend, loader, batch)
+                batch = []
+                if stop_event.is_set():
+                    self.state = STOPPED
+                    return self
+
+            if batch:
+                self._flush(backend, loader, batch)
+
+            self.checkpoint.update(self.key, done=True)
+            self.state = DONE
+
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = FAILED
+        finally:
+            connection.close()
+        return self
+
+    def _flush(self, backend, loader, batch):
+        """Zpracuj a zapiš dávku, teprve po commitu posuň checkpoint"""
+        records = backend.process_elasticsearch_data_with_existing_logic(batch, IMPORT_EXTRA_FIELDS)
+        rows = write_records(loader, self.market_type, records)
+
+        self.docs += len(batch)
+        self.rows += rows
+        self.last_sort = batch[-1].get("sort") or self.last_sort
+        self.checkpoint.update(
+            self.key, search_after=self.last_sort, docs=self.docs, rows=self.rows,
+            started_at=self.started_at.isoformat()
+        )
+
+def format_eta(seconds):
+    if seconds is None:
+        return "?"
+    return str(timedelta(seconds=int(seconds)))
+
+class ImportProgress:
+    """Vlákno, které průběžně vypisuje dokumenty/s a odhad do konce"""
+
+    def __init__(self, jobs, interval=PROGRESS_INTERVAL):
+        self.jobs = jobs
+        self.interval = interval
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def snapshot(self):
+        docs = sum(job.docs for job in self.jobs)
+        fresh = sum(job.docs - job.resumed_docs for job in self.jobs)
+        elapsed = time.monotonic() - self.started
+        rate = fresh / elapsed if elapsed > 0 else 0.0
+
+        total = None
+        if all(job.total is not None for job in self.jobs):
+            total = sum(max(job.total, job.docs) for job in self.jobs)
+
+        eta = None
+        if total is not None and rate > 0:
+            eta = (total - docs) / rate
+        return {"docs": docs, "total": total, "rate": rate, "eta": eta, "seconds": elapsed}
+
+    def report(self):
+        progress = self.snapshot()
+        running = sum(1 for job in self.jobs if job.state == RUNNING)
+        finished = sum(1 for job in self.jobs if job.state == DONE)
+
+        total = "?" if progress["total"] is None else f"{progress['total']:,}"
+        share = ""
+        if progress["total"]:
+            share = f" ({progress['docs'] / progress['total']:.1%})"
+        print(f"⏳ {progress['docs']:,}/{total} dok{share} · {progress['rate']:,.0f} dok/s · "
+              f"ETA {format_eta(progress['eta'])} · úseky {running} běží, {finished}/{len(self.jobs)} hotovo")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def _try_count(job, backend):
+    """Počet pro ETA - chyba počítání import nezastaví"""
+    try:
+        return job.count(backend)
+    except Exception as e:
+        print(f"⚠️ Počet záznamů {job.key} nezjištěn: {e}")
+        return None
+
+def finish_market(market_type, jobs, window_from, window_to, full, watermark):
+    """Po dokončení všech úseků posuň watermark, ukliď tabulku záznamů a přepočítej meze ořezu"""
+    last_sorts = [job.last_sort for job in jobs if job.last_sort]
+    sort_values = last_sorts[-1] if last_sorts else (watermark or {}).get("sort_values")
+
+    connection = get_connection()
+    try:
+        synced_before = min(job.started_at for job in jobs) if full and jobs else None
+        removed = prune_records(connection, market_type, window_from, synced_before)
+        if sort_values:
+            save_watermark(connection, market_type, sort_values, full)
+        if TRIM_OUTLIERS.get(market_type):
+            refresh_price_bounds(connection, market_type, window_from, window_to)
+    finally:
+        connection.close()
+
+    if sort_values:
+        print(f"🔖 {market_type}: watermark {sort_date(sort_values)} / id {sort_values[1]}"
+              f"{f', smazáno {removed} záznamů' if removed else ''}")
+
+def run_jobs(jobs, backend, parallelism, timeout=None, progress_interval=PROGRESS_INTERVAL):
+    """Spusť úseky v omezeném poolu; po timeoutu nebo Ctrl+C je zastav po aktuální dávce"""
+    stop_event = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=max(parallelism, 1), thread_name_prefix="pmx-import") as pool:
+        # Počty dopředu, aby ETA platila od začátku a ne až po spuštění všech úseků
+        list(pool.map(lambda job: _try_count(job, backend), jobs))
+
+        with ImportProgress(jobs, progress_interval) as progress:
+            futures = [pool.submit(job.run, backend, stop_event) for job in jobs]
+            try:
+                _, not_done = wait(futures, timeout=timeout)
+                if not_done:
+                    print(f"⏰ Limit {timeout:.0f} s vypršel - import se zastaví po aktuálních dávkách")
+                    stop_event.set()
+                    wait(not_done)
+            except KeyboardInterrupt:
+                print("🛑 Přerušeno - import se zastaví po aktuálních dávkách")
+                stop_event.set()
+                wait(futures)
+            progress.report()
+    return progress
+
+def run_import(market_types=MARKET_TYPES, parallelism=IMPORT_PARALLELISM, slice_months=IMPORT_SLICE_MONTHS,
+               timeout=None, restart=False, checkpoint_path=IMPORT_CHECKPOINT,
+               progress_interval=PROGRESS_INTERVAL, batch_size=IMPORT_BATCH_SIZE,
+               full=None, overlap_days=IMPORT_OVERLAP_DAYS, reconcile_days=IMPORT_RECONCILE_DAYS):
+    """Importuj všechny typy trhu souběžně a vrať souhrn běhu
+
+    Bez watermarku (první běh) nebo s full=True se importuje celé okno,
+    jinak jen přírůstek od watermarku. full=None rozhodne podle
+    reconcile_days. Po vypršení `timeout` (sekundy) se úseky zastaví po
+    aktuální dávce a checkpoint zůstane uložený; po úplném dokončení se
+    checkpoint smaže a posune se watermark.
+    """
+    import simple_backend as backend
+
+    checkpoint = ImportCheckpoint(checkpoint_path)
+    if restart:
+        checkpoint.clear()
+
+    window_from, window_to, _ = get_date_range()
+    window_from = window_from.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    connection = get_connection()
+    try:
+        prepare_records_table(connection, window_from)
+        watermarks = read_watermarks(connection)
+        empty_table = records_table_empty(connection)
+    finally:
+        connection.close()
+
+    jobs = []
+    modes = {}
+    for market_type in market_types:
+        watermark = watermarks.get(market_type)
+        market_full = needs_full_import(watermark, reconcile_days) if full is None else full
+        date_from, start_after = plan_market(watermark, window_from, market_full, overlap_days)
+        modes[market_type] = market_full
+
+        mode = "plný import okna" if market_full else f"přírůstek od {date_from:%Y-%m-%d}"
+        print(f"📅 {market_type}: {mode}")
+
+        for index, (slice_from, slice_to) in enumerate(month_slices(date_from, window_to, slice_months)):
+            jobs.append(ImportJob(
+                market_type, slice_from, slice_to, checkpoint, batch_size,
+                start_after=start_after if index == 0 else None
+            ))
+    checkpoint.retain([job.key for job in jobs])
+
+    resumed = [job for job in jobs if checkpoint.get(job.key)]
+    if resumed:
+        print(f"↩️ Navazuji na přerušený import ({len(resumed)}/{len(jobs)} úseků má checkpoint)")
+
+    started = time.monotonic()
+
+    if any(modes.values()) and empty_table:
+        # První plné nahrání - sekundární indexy se postaví až nad nahranými daty.
+        # Nad naplněnou tabulkou zůstanou, backend z nich během importu čte.
+        index_connection = bulk_connect()
+        try:
+            with deferred_indexes(index_connection, RECORDS_TABLE):
+                progress = run_jobs(jobs, backend, parallelism, timeout, progress_interval)
+        finally:
+            index_connection.close()
+    else:
+        progress = run_jobs(jobs, backend, parallelism, timeout, progress_interval)
+
+    complete = all(job.state == DONE for job in jobs)
+    for job in jobs:
+        if job.state == FAILED:
+            print(f"❌ {job.key}: {job.error}")
+
+    for market_type in market_types:
+        market_jobs = [job for job in jobs if job.market_type == market_type]
+        if all(job.state == DONE for job in market_jobs):
+            finish_market(
+                market_type, market_jobs, window_from, window_to, modes[market_type], watermarks.get(market_type)
+            )
+
+    if complete:
+        checkpoint.clear()
+
+    summary = progress.snapshot()
+    return {
+        "complete": complete,
+        "docs": summary["docs"],
+        "rows": sum(job.rows for job in jobs),
+        "seconds": round(time.monotonic() - started, 1),
+        "docs_per_s": round(summary["rate"], 1),
+        "full": modes,
+        "jobs": [
+            {"key": job.key, "state": job.state, "docs": job.docs, "rows": job.rows,
+             "total": job.total, "error": job.error}
+            for job in jobs
+        ]
+    }
+
+# Společné kroky skriptů import_data.py a run_data_import.py
+
+def run_inprocess_import(args):
+    """Souběžný import v tomto procesu - při přerušení naváže další spuštění"""
+    print("📊 Importuji data z Elasticsearch (prodeje a nájmy souběžně)...")
+
+    try:
+        summary = run_import(
+            parallelism=args.parallelism, timeout=args.timeout, restart=args.restart,
+            full=True if args.full else None
+        )
+    except Exception as e:
+        print(f"❌ Chyba při importu: {e}")
+        return False
+
+    print(f"📦 {summary['docs']:,} dokumentů, {summary['rows']:,} řádků za {summary['seconds']} s "
+          f"({summary['docs_per_s']:,.0f} dok/s)")
+
+    if not summary["complete"]:
+        print("⏸ Import není dokončený - další spuštění naváže od uloženého checkpointu")
+        return False
+
+    print("✅ Data o prodeji a nájmech úspěšně importována!")
+    return True
+
+def refresh_aggregates(from_records=False):
+    """Přepočítej materializované agregace v pmx_report
+
+    Po importu v tomto procesu se čte z pmx_records místo nového stahování okna.
+    """
+    print("🧮 Přepočítávám materializované agregace...")
+
+    try:
+        from pmx_materialize import refresh_materialized_tables
+        if from_records:
+            refresh_materialized_tables(loader=load_imported_records)
+        else:
+            refresh_materialized_tables()
+        return True
+    except Exception as e:
+        print(f"⚠️ Agregace se nepodařilo přepočítat: {e}")
+        return False
+
+def invalidate_api_cache():
+    """Po importu zneplatni cache agregací v běžícím API"""
+    api_url = os.getenv("PMX_API_URL", "http://localhost:8000")
+    admin_token = os.getenv("PMX_ADMIN_TOKEN")
+    if not admin_token:
+        print("⚠️ PMX_ADMIN_TOKEN není nastavený - cache API se nezneplatní (vyprší po PMX_CACHE_TTL)")
+        return
+
+    try:
+        import requests
+        response = requests.post(
+            f"{api_url}/api/cache/invalidate",
+            headers={"X-PMX-Admin-Token": admin_token},
+            timeout=5
+        )
+
+        if response.status_code == 200:
+            print(f"🧹 Cache API zneplatněna ({response.json().get('invalidated', 0)} záznamů)")
+        else:
+            print(f"⚠️ Cache API se nepodařilo zneplatnit: {response.status_code}")
+    except Exception as e:
+        print(f"⚠️ API neběží - cache není potřeba zneplatnit ({e})")
+
+def parse_args(description="Import dat z Elasticsearch do MySQL"):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--legacy", action="store_true", default=IMPORT_MODE == "subprocess",
+                        help="Původní import přes podprocesy sales.py a rent.py")
+    parser.add_argument("--parallelism", type=int, default=IMPORT_PARALLELISM,
+                        help="Kolik úseků okna se importuje souběžně")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Limit v sekundách; nedokončený import naváže při dalším spuštění")
+    parser.add_argument("--restart", action="store_true", help="Zahoď checkpoint a začni od začátku")
+    parser.add_argument("--full", action="store_true",
+                        help="Plná rekonciliace celého okna místo přírůstku od watermarku")
+    return parser.parse_args()
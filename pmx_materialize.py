@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Materializované agregace v pmx_report
+
+Import po načtení dat přepočítá tabulku pmx_aggregates (kraj/region/oblast
+× ložnice × měsíc) a atomicky ji vymění přes RENAME TABLE. Backend pak
+může /api/pmx/* obsluhovat bodovými dotazy nad indexem místo Elasticsearch.
+"""
+import os
+from datetime import datetime
+
+import pandas as pd
+
+MYSQL_CONFIG = {
+    "host": os.getenv("PMX_MYSQL_HOST", "localhost"),
+    "port": int(os.getenv("PMX_MYSQL_PORT", "3306")),
+    "user": os.getenv("PMX_MYSQL_USER", "root"),
+    "password": os.getenv("PMX_MYSQL_PASSWORD", ""),
+    "database": "pmx_report"
+}
+
+AGGREGATES_TABLE = "pmx_aggregates"
+LEVELS = ("county", "region", "area")
+MARKET_TYPES = ("Residential Sale", "Residential Rent")
+
+# Prodeje se čistí od outlierů stejně jako v backendu, nájmy ne
+TRIM_OUTLIERS = {"Residential Sale": True, "Residential Rent": False}
+
+CREATE_AGGREGATES_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    market_type VARCHAR(32) NOT NULL,
+    level VARCHAR(8) NOT NULL,
+    county VARCHAR(64) NOT NULL,
+    entity VARCHAR(128) NOT NULL,
+    beds TINYINT NOT NULL,
+    month DATE NOT NULL,
+    count INT NOT NULL,
+    sum DOUBLE NOT NULL,
+    mean DOUBLE NOT NULL,
+    median DOUBLE NOT NULL,
+    trimmed_mean DOUBLE NOT NULL,
+    PRIMARY KEY (market_type, level, entity, county, beds, month)
+)
+"""
+
+_pool = None
+
+def get_connection():
+    """Připojení do pmx_report ze sdíleného poolu"""
+    global _pool
+
+    if _pool is None:
+        from mysql.connector import pooling
+        _pool = pooling.MySQLConnectionPool(
+            pool_name="pmx_report",
+            pool_size=int(os.getenv("PMX_MYSQL_POOL_SIZE", "5")),
+            **MYSQL_CONFIG
+        )
+    return _pool.get_connection()
+
+def build_aggregate_frame(records, market_type, trim_outliers=None):
+    """Spočítej count/sum/mean/median/trimmed_mean pro všechny úrovně × beds × měsíc
+
+    records jsou zpracované záznamy (county, region, area, beds, price, saleDate).
+    Při trim_outliers se nejdřív odstraní globální 5 % / 95 % cen, takže
+    součet sum/count přes okno odpovídá průměru z backendu.
+    """
+    if trim_outliers is None:
+        trim_outliers = TRIM_OUTLIERS.get(market_type, False)
+
+    df = pd.DataFrame(records, columns=["county", "region", "area", "beds", "price", "saleDate"])
+    if df.empty:
+        return pd.DataFrame()
+
+    df["month"] = pd.to_datetime(df["saleDate"], errors="coerce").dt.to_period("M").dt.to_timestamp()
+    df = df.dropna(subset=["month"])
+    df["region"] = df["region"].astype(object).fillna("")
+    df["area"] = df["area"].astype(object).fillna("")
+
+    if trim_outliers:
+        condition = (df['price'] > df['price'].quantile(0.05)) & (df['price'] < df['price'].quantile(0.95))
+        df = df.loc[condition]
+
+    frames = []
+    for level in LEVELS:
+        level_df = df if level == "county" else df[df[level] != ""]
+        if level_df.empty:
+            continue
+
+        keys = ["county", level, "beds", "month"] if level != "county" else ["county", "beds", "month"]
+        grouped = level_df.groupby(keys, observed=True)["price"]
+        frame = grouped.agg(["count", "sum", "mean", "median"])
+
+        # Oříznutý průměr uvnitř bucketu (5 % - 95 %)
+        low = grouped.transform("quantile", 0.05)
+        high = grouped.transform("quantile", 0.95)
+        inside = level_df.loc[(level_df["price"] >= low) & (level_df["price"] <= high)]
+        frame["trimmed_mean"] = inside.groupby(keys, observed=True)["price"].mean()
+        frame["trimmed_mean"] = frame["trimmed_mean"].fillna(frame["mean"])
+
+        frame = frame.reset_index()
+        frame["entity"] = frame[level]
+        frame["level"] = level
+        frames.append(frame)
+
+    result = pd.concat(frames, ignore_index=True)
+    result["market_type"] = market_type
+    result["month"] = result["month"].dt.date
+    return result[[
+        "market_type", "level", "county", "entity", "beds", "month",
+        "count", "sum", "mean", "median", "trimmed_mean"
+    ]]
+
+def write_materialized_tables(frames, connection=None):
+    """Nahraj agregace do nové tabulky a atomicky ji vyměň za pmx_aggregates"""
+    from pmx_bulkload import BulkLoader, connect
+
+    own_connection = connection is None
+    if own_connection:
+        connection = connect()
+
+    new_table = f"{AGGREGATES_TABLE}_new"
+    old_table = f"{AGGREGATES_TABLE}_old"
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {new_table}")
+        cursor.execute(CREATE_AGGREGATES_TABLE.format(table=new_table))
+        cursor.execute(CREATE_AGGREGATES_TABLE.format(table=AGGREGATES_TABLE))
+
+        # Nová tabulka je prázdná a do výměny ji nikdo nečte - čistý bulk load
+        loader = BulkLoader(connection, new_table, [
+            "market_type", "level", "county", "entity", "beds", "month",
+            "count", "sum", "mean", "median", "trimmed_mean"
+        ])
+        total = sum(loader.load(frame) for frame in frames if frame is not None)
+
+        connection.commit()
+
+        # RENAME TABLE vymění obě tabulky v jednom atomickém kroku
+        cursor.execute(f"DROP TABLE IF EXISTS {old_table}")
+        cursor.execute(
+            f"RENAME TABLE {AGGREGATES_TABLE} TO {old_table}, {new_table} TO {AGGREGATES_TABLE}"
+        )
+        cursor.execute(f"DROP TABLE IF EXISTS {old_table}")
+        connection.commit()
+
+        print(f"✅ Materializované agregace nahrány ({total} řádků)")
+        return total
+
+    finally:
+        cursor.close()
+        if own_connection:
+            connection.close()
+
+def refresh_materialized_tables(market_types=MARKET_TYPES, loader=None):
+    """Přepočítej pmx_aggregates ze zpracovaných záznamů
+
+    loader(market_type) vrací záznamy jednoho typu trhu - výchozí stahuje
+    přes simple_backend z Elasticsearch, import předá čtení z pmx_records.
+    """
+    if loader is None:
+        from simple_backend import load_processed_records as loader
+
+    frames = []
+    for market_type in market_types:
+        print(f"📊 Přepočítávám agregace: {market_type}")
+        records = loader(market_type)
+        frames.append(build_aggregate_frame(records, market_type))
+
+    return write_materialized_tables(frames)
+
+def read_materialized_results(market_type, date_from, date_to, level="county",
+                              current_year=None, yoy_key="yoy"):
+    """Načti průměry a YoY z pmx_aggregates ve stejném tvaru jako backend
+
+    Vrací (avg_results, yoy_results) - {entity: [{county, beds, avg}]}
+    a {entity: [{county, beds, <yoy_key>}]}. Pro region/oblast mají záznamy
+    navíc klíč úrovně a county je skutečný kraj.
+    """
+    if current_year is None:
+        current_year = datetime.now().year
+
+    connection = get_connection()
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT entity, county, beds, YEAR(month) AS year, SUM(count), SUM(sum)
+            FROM {AGGREGATES_TABLE}
+            WHERE market_type = %s AND level = %s AND month BETWEEN %s AND %s
+            GROUP BY entity, county, beds, year
+            ORDER BY entity, county, beds
+        """, (market_type, level, date_from.strftime("%Y-%m-01"), date_to.strftime("%Y-%m-%d")))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+    return results_from_totals(rows, level, current_year, yoy_key)
+
+def results_from_totals(rows, level="county", current_year=None, yoy_key="yoy"):
+    """(avg_results, yoy_results) z řádků (entity, county, beds, rok, počet, součet cen)"""
+    if current_year is None:
+        current_year = datetime.now().year
+
+    totals = {}
+    for entity, county, beds, year, count, total in rows:
+        bucket = totals.setdefault((entity, county, int(beds)), {})
+        bucket[int(year)] = (int(count), float(total))
+
+    def record(entity, county, beds, value_key, value):
+        if level == "county":
+            return {'county': entity, 'beds': beds, value_key: value}
+        return {'county': county, level: entity, 'beds': beds, value_key: value}
+
+    avg_results = {}
+    yoy_results = {}
+    for (entity, county, beds), years in totals.items():
+        count = sum(c for c, _ in years.values())
+        total = sum(t for _, t in years.values())
+        if count:
+            avg_results.setdefault(entity, []).append(record(entity, county, beds, 'avg', total / count))
+
+        current = years.get(current_year)
+        last = years.get(current_year - 1)
+        if current and last and current[0] and last[0]:
+            current_price = current[1] / current[0]
+            last_price = last[1] / last[0]
+            yoy_change = round(((current_price - last_price) / last_price) * 100, 1)
+            yoy_results.setdefault(entity, []).append(record(entity, county, beds, yoy_key, yoy_change))
+
+    return avg_results, yoy_results
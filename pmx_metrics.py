@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Metriky ve formátu Prometheus (text exposition 0.0.4)
+
+Malý registr bez externích závislostí - countery, histogramy a hodnoty
+čtené až při scrapu (cache, pool, breaker). Fáze zpracování se měří
+přes stage_timer(), endpointy middlewarem v backendu.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    """Monotónně rostoucí počítadlo s volitelnými labely"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+class Histogram:
+    """Histogram s kumulativními buckety, součtem a počtem pozorování"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+class Callback:
+    """Hodnota čtená až při scrapu - fn vrací číslo nebo {hodnoty labelů: číslo}"""
+
+    def __init__(self, name, help_text, fn, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.label_names = tuple(labels)
+        self.kind = kind
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if value is None:
+            return
+
+        if isinstance(value, dict):
+            for key, item in sorted(value.items()):
+                if item is None:
+                    continue
+                key = key if isinstance(key, tuple) else (key,)
+                yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(item)}"
+        else:
+            yield f"{self.name} {_format_value(value)}"
+
+class Registry:
+    """Seznam metrik a jejich výpis pro /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Opakovaná registrace (reload modulu) vrátí existující metriku
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, Callback):
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def callback(self, name, help_text, fn, labels=(), kind="gauge"):
+        return self._register(Callback(name, help_text, fn, labels, kind))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# charset=utf-8 doplní Response sám
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pmx_stage_duration_seconds",
+    "Doba fáze zpracování (es_fetch, hit_processing, outlier_trim, grouping, yoy, serialization)",
+    labels=("stage",)
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "pmx_http_request_duration_seconds",
+    "Doba odpovědi podle endpointu",
+    labels=("method", "endpoint", "status")
+)
+AUTH_SECONDS = REGISTRY.histogram(
+    "pmx_auth_lookup_duration_seconds",
+    "Doba ověření API klíče v pmx_api_auth (jen při miss v cache)",
+    labels=("result",)
+)
+HITS_FETCHED = REGISTRY.counter(
+    "pmx_es_hits_fetched_total",
+    "Počet hitů stažených z Elasticsearch"
+)
+RECORDS_KEPT = REGISTRY.counter(
+    "pmx_records_kept_total",
+    "Počet záznamů, které prošly validací"
+)
+RECORDS_DROPPED = REGISTRY.counter(
+    "pmx_records_dropped_total",
+    "Počet zahozených záznamů podle prvního porušeného pravidla",
+    labels=("rule",)
+)
+
+def stage_timer(stage):
+    """with stage_timer("grouping"): ... - změří fázi do pmx_stage_duration_seconds"""
+    return STAGE_SECONDS.time(stage=stage)
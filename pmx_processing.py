@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Sloupcové zpracování záznamů z Elasticsearch
+
+Místo skládání slovníku pro každý záznam se potřebná pole z _source
+vytáhnou rovnou do typovaných sloupců a validace (ložnice, cena, kraj)
+proběhne jako vektorové masky.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from pmx_cube import RollupCube
+from pmx_metrics import RECORDS_DROPPED, RECORDS_KEPT, stage_timer
+
+CHUNK_SIZE = 100000
+
+# Pole, která se jen přenáší do výstupu, a jejich výchozí hodnoty
+EXTRA_FIELDS = {
+    "saleDate": "",
+    "rawAddress": "",
+    "sqrMetres": 0,
+    "location": "",
+    "id": ""
+}
+
+# Pro agregace stačí datum - ostatní pole jen zdržují a zabírají paměť
+AGGREGATION_FIELDS = {"saleDate": ""}
+
+def _numeric_column(values):
+    """Seznam hodnot → float64 pole, neplatné hodnoty jako NaN"""
+    try:
+        # Rychlá cesta - čísla a None (→ NaN) převede numpy přímo
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+
+def empty_frame(county_list, extra_fields=EXTRA_FIELDS):
+    """Prázdný výsledek se stejnými sloupci a typy jako process_hits_columnar"""
+    df = pd.DataFrame({
+        "county": pd.Categorical([], categories=county_list),
+        "beds": np.array([], dtype=np.int8),
+        "price": np.array([], dtype=np.float64),
+        "area": pd.Categorical([]),
+        "region": pd.Categorical([])
+    })
+    for field in extra_fields:
+        df[field] = pd.Series([], dtype=object)
+    if "saleDate" in extra_fields:
+        df["saleDate"] = pd.Series([], dtype="datetime64[ns]")
+    return df
+
+def _process_chunk(sources, county_list, max_beds, extra_fields):
+    """Validuj jeden blok _source slovníků a vrať jen platné řádky"""
+    beds = _numeric_column([s.get("beds") for s in sources])
+    price = _numeric_column([s.get("price") for s in sources])
+    county = pd.Categorical([s.get("county") for s in sources], categories=county_list)
+
+    # NaN v porovnání vždy vrací False, takže chybějící hodnoty vypadnou
+    rules = [("beds", beds > 0), ("price", price > 0), ("county", county.codes >= 0)]
+    if max_beds is not None:
+        rules.append(("max_beds", beds <= max_beds))
+
+    # Zahozený záznam se počítá k prvnímu pravidlu, které porušil
+    keep = np.ones(len(sources), dtype=bool)
+    kept = len(sources)
+    for rule, mask in rules:
+        keep &= mask
+        remaining = int(np.count_nonzero(keep))
+        if remaining < kept:
+            RECORDS_DROPPED.inc(kept - remaining, rule=rule)
+        kept = remaining
+    RECORDS_KEPT.inc(kept)
+
+    index = np.flatnonzero(keep)
+    if not len(index):
+        return None
+
+    kept = [sources[i] for i in index]
+    beds = np.trunc(beds[index])
+    beds[beds > 5] = 6
+
+    columns = {
+        "county": county[index],
+        "beds": beds.astype(np.int8),
+        "price": price[index].astype(np.float64),
+        "area": [s.get("area", "") for s in kept],
+        "region": [s.get("region", "") for s in kept]
+    }
+    for field, default in extra_fields.items():
+        columns[field] = [s.get(field, default) for s in kept]
+
+    return pd.DataFrame(columns)
+
+def process_hits_columnar(hits, county_list, max_beds=None, extra_fields=EXTRA_FIELDS, chunk_size=CHUNK_SIZE):
+    """Převeď hity z Elasticsearch na DataFrame s typovanými sloupci
+
+    county/region/area jsou kategorie, beds int8 (5+ → 6), price float64
+    a saleDate datetime64. Záznamy bez kladné ceny či ložnic nebo mimo
+    county_list se zahodí. Hity se zpracovávají po blocích, takže lze
+    předat i generátor.
+    """
+    iterator = iter(hits)
+    chunks = []
+
+    while True:
+        sources = [hit.get("_source") or {} for hit in itertools.islice(iterator, chunk_size)]
+        if not sources:
+            break
+
+        # Čtení z iterátoru může stahovat další stránku - měří se jen zpracování
+        with stage_timer("hit_processing"):
+            chunk = _process_chunk(sources, county_list, max_beds, extra_fields)
+        if chunk is not None:
+            chunks.append(chunk)
+
+    if not chunks:
+        return empty_frame(county_list, extra_fields)
+
+    with stage_timer("hit_processing"):
+        df = pd.concat(chunks, ignore_index=True)
+        for column in ("area", "region"):
+            df[column] = df[column].fillna("").astype("category")
+        if "saleDate" in df:
+            df["saleDate"] = pd.to_datetime(df["saleDate"], errors="coerce", format="ISO8601")
+
+    return df
+
+def records_to_dicts(df):
+    """Převeď zpracované záznamy na seznam slovníků pro JSON odpověď"""
+    if df.empty:
+        return []
+
+    with stage_timer("serialization"):
+        out = df.astype({column: object for column in ("county", "area", "region") if column in df})
+        if "saleDate" in out:
+            out["saleDate"] = out["saleDate"].dt.strftime("%Y-%m-%d").fillna("")
+        return out.to_dict("records")
+
+def averages_and_yoy(df, current_year, keys=("county", "beds")):
+    """Průměr za celé okno a meziroční změnu pro všechny skupiny najednou
+
+    Data se seskupí jen jednou podle (keys, rok) na součet a počet. Průměr
+    okna i průměry obou let se z nich dopočítají bez procházení řádků.
+    Vrací (avg_frame, yoy_frame) se sloupci keys + avg, resp. keys + yoy.
+    """
+    keys = list(keys)
+    if df.empty:
+        return (pd.DataFrame(columns=keys + ["avg"]), pd.DataFrame(columns=keys + ["yoy"]))
+
+    with stage_timer("grouping"):
+        year = df["saleDate"].dt.year.rename("year")
+        by_year = df.groupby(keys + [year], observed=True)["price"].agg(["sum", "count"])
+
+        totals = by_year.groupby(level=keys, observed=True).sum()
+        avg_frame = (totals["sum"] / totals["count"]).rename("avg").reset_index()
+
+    with stage_timer("yoy"):
+        yearly = (by_year["sum"] / by_year["count"]).unstack("year")
+        if current_year in yearly and current_year - 1 in yearly:
+            last = yearly[current_year - 1]
+            yoy = (((yearly[current_year] - last) / last) * 100).round(1).dropna()
+        else:
+            yoy = pd.Series([], dtype=np.float64, index=yearly.index[:0])
+        yoy_frame = yoy.rename("yoy").reset_index()
+
+    return avg_frame, yoy_frame
+
+def frame_to_records(frame, value_column, output_key=None):
+    """Seznam {county, beds, <output_key>} z výsledku averages_and_yoy"""
+    output_key = output_key or value_column
+    with stage_timer("serialization"):
+        out = frame.rename(columns={value_column: output_key})
+        out = out.astype({"county": object, "beds": int, output_key: float})
+        return out.to_dict("records")
+
+def group_records(frame, value_column, output_key=None, group_by="county"):
+    """{county: [{county, beds, <output_key>}]} z výsledku averages_and_yoy"""
+    grouped = {}
+    for record in frame_to_records(frame, value_column, output_key):
+        grouped.setdefault(record[group_by], []).append(record)
+    return grouped
+
+def summarize_records(df, current_year, entity="county", trim=None):
+    """Průměry a YoY ({entity: [záznamy]}) ze zpracovaných záznamů
+
+    trim=(0.05, 0.95) nejdřív odstraní globální outliery. Funkce nepoužívá
+    stav backendu, takže může běžet i v procesovém poolu.
+    """
+    if df.empty:
+        return {}, {}
+
+    if trim:
+        with stage_timer("outlier_trim"):
+            condition = (df['price'] > df['price'].quantile(trim[0])) & (df['price'] < df['price'].quantile(trim[1]))
+            df = df.loc[condition]
+
+    if entity == "county":
+        # Průměry i YoY z jednoho seskupení podle (kraj, ložnice, rok)
+        avg_frame, yoy_frame = averages_and_yoy(df, current_year)
+        return group_records(avg_frame, 'avg'), group_records(yoy_frame, 'yoy')
+
+    cube = RollupCube.from_frame(df, current_year)
+    return cube.results(entity, 'avg'), cube.results(entity, 'yoy')
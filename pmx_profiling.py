@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Vzorkovací profiler na vyžádání (výstup pro flame graph)
+
+Sampler v samostatném vlákně pravidelně čte zásobníky všech vláken přes
+sys._current_frames() a počítá je ve formátu "collapsed stacks"
+(rámec;rámec;rámec počet) - ten přímo čte flamegraph.pl i speedscope.
+
+- jeden požadavek: hlavička X-PMX-Profile s hodnotou PMX_ADMIN_TOKEN (jen
+  hlavička - token v URL by skončil v access logech); report se uloží do
+  PMX_PROFILE_DIR
+- globální profiler: zapíná/vypíná se za běhu přes admin endpoint
+
+Vzorkují se všechna vlákna, protože pandas fáze a dotazy na ippi.io běží
+ve worker poolu mimo event loop. Souběžné požadavky se tak v reportu
+jednoho požadavku mohou objevit také. Práci v procesech
+(PMX_WORKER_MODE=process) sampler nevidí.
+"""
+import asyncio
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+
+from fastapi import HTTPException
+
+ADMIN_TOKEN = os.getenv("PMX_ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PMX_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PMX_PROFILE_INTERVAL", "0.005"))
+PROFILER_INTERVAL = float(os.getenv("PMX_PROFILER_INTERVAL", "0.02"))
+PROFILER_ENABLED = os.getenv("PMX_PROFILER", "0") == "1"
+
+PROFILE_HEADER = "X-PMX-Profile"
+
+# Vlákna, která jen čekají na práci - ve flame grafu by přehlušila zbytek
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+
+def is_admin(token):
+    """Odpovídá token PMX_ADMIN_TOKEN? Bez nastaveného tokenu je profilování vypnuté"""
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(str(token), ADMIN_TOKEN)
+
+def require_admin(token):
+    """HTTPException 403 pro chybějící nebo neplatný admin token"""
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Vyžaduje PMX_ADMIN_TOKEN")
+
+def frame_name(code):
+    """Název rámce - funkce a soubor:řádek definice (bez středníků)"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+class StackSampler:
+    """Sbírá collapsed stacks všech vláken s daným intervalem"""
+
+    def __init__(self, interval=PROFILER_INTERVAL, include_idle=False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = {}
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._thread = threading.Thread(target=self._run, name="pmx-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+            self.stopped_at = time.time()
+
+    def reset(self):
+        with self._lock:
+            self.stacks = {}
+            self.samples = 0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(skip=own_id)
+
+    def sample(self, skip=None):
+        """Jeden vzorek zásobníků všech vláken kromě skip"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        collected = []
+
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == skip:
+                continue
+
+            leaf = frame.f_code
+            if not self.include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)).replace(";", ":"))
+            collected.append(";".join(reversed(stack)))
+
+        with self._lock:
+            self.samples += 1
+            for stack in collected:
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def collapsed(self):
+        """Report pro flamegraph.pl / speedscope - "rámec;rámec počet" na řádek"""
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "interval": self.interval,
+                "samples": self.samples,
+                "stacks": len(self.stacks),
+                "started_at": self.started_at,
+                "stopped_at": self.stopped_at
+            }
+
+# Globální profiler přepínaný za běhu
+profiler = StackSampler(PROFILER_INTERVAL)
+
+def wants_profile(request):
+    """Žádá požadavek o profil? (admin token v hlavičce X-PMX-Profile)"""
+    return is_admin(request.headers.get(PROFILE_HEADER))
+
+def report_path(name, directory=PROFILE_DIR):
+    """Cesta k uloženému reportu - jen jméno souboru, žádné cesty z URL"""
+    if not re.fullmatch(r"[\w.-]+\.collapsed", name):
+        return None
+    return os.path.join(directory, name)
+
+def write_report(sampler, method, path, directory=PROFILE_DIR):
+    """Ulož collapsed report jednoho požadavku, vrať jméno souboru"""
+    os.makedirs(directory, exist_ok=True)
+    slug = re.sub(r"[^\w]+", "_", path).strip("_") or "root"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{method.lower()}-{slug}.collapsed"
+    with open(os.path.join(directory, name), "w") as f:
+        f.write(sampler.collapsed())
+    return name
+
+async def profile_request(request, call_next, interval=PROFILE_INTERVAL):
+    """Obal jeden požadavek samplerem; report jde do souboru, jméno do hlavičky"""
+    sampler = StackSampler(interval)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        # Join vlákna sampleru i zápis reportu blokují - mimo event loop
+        await asyncio.to_thread(sampler.stop)
+
+    name = await asyncio.to_thread(write_report, sampler, request.method, request.url.path)
+    print(f"🔬 Profil {request.method} {request.url.path}: {sampler.samples} vzorků → {name}")
+
+    response.headers["X-PMX-Profile-Report"] = name
+    response.headers["X-PMX-Profile-Samples"] = str(sampler.samples)
+    response.headers["X-PMX-Profile-Seconds"] = f"{time.perf_counter() - started:.3f}"
+    return response
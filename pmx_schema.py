@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Spravované schéma záznamů v pmx_report
+
+pmx_records (prodeje i nájmy) je rozdělená podle měsíce saleDate
+(RANGE COLUMNS), takže dotaz na okno čte jen jeho měsíce a staré měsíce
+jdou zahodit přes DROP PARTITION místo DELETE. Složené indexy obsahují
+všechny sloupce, které dashboard potřebuje (kraj/region/oblast × ložnice ×
+datum × cena), a dotazy v read_record_results se tak obslouží jen z indexu.
+
+Změny schématu jsou číslované migrace zapsané v pmx_schema_migrations:
+    python pmx_schema.py migrate     # proveď čekající migrace a doplň oddíly
+    python pmx_schema.py status      # verze schématu a oddíly s počty řádků
+    python pmx_schema.py explain     # plán dotazu kraj × ložnice nad oknem
+"""
+import argparse
+import math
+import os
+import sys
+from datetime import datetime
+
+from pmx_materialize import get_connection, results_from_totals, TRIM_OUTLIERS
+
+RECORDS_TABLE = "pmx_records"
+WATERMARKS_TABLE = "pmx_import_watermarks"
+BOUNDS_TABLE = "pmx_price_bounds"
+MIGRATIONS_TABLE = "pmx_schema_migrations"
+
+# Oddíly dopředu a dozadu od aktuálního měsíce (okno backendu jsou 3 roky)
+PARTITION_MONTHS_BACK = int(os.getenv("PMX_PARTITION_MONTHS_BACK", "36"))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PMX_PARTITION_MONTHS_AHEAD", "3"))
+
+OUTLIER_TRIM = (0.05, 0.95)
+
+# Úroveň → index, který pokryje seskupení podle ní (kontroluje ho explain;
+# bez FORCE INDEX, aby dotaz prošel i během importu s odloženými indexy)
+LEVEL_INDEXES = {
+    "county": "idx_records_county",
+    "region": "idx_records_region",
+    "area": "idx_records_area"
+}
+
+RECORDS_COLUMNS_DDL = """
+    market_type VARCHAR(32) NOT NULL,
+    id VARCHAR(64) NOT NULL,
+    sale_date DATE NOT NULL,
+    county VARCHAR(64) NOT NULL,
+    region VARCHAR(128) NOT NULL,
+    area VARCHAR(128) NOT NULL,
+    beds TINYINT NOT NULL,
+    price DOUBLE NOT NULL,
+    sqr_metres DOUBLE NULL,
+    raw_address VARCHAR(255) NULL,
+    synced_at DATETIME NOT NULL,
+    PRIMARY KEY (market_type, id, sale_date),
+    KEY idx_records_county (market_type, county, beds, sale_date, price),
+    KEY idx_records_region (market_type, region, beds, sale_date, price, county),
+    KEY idx_records_area (market_type, area, beds, sale_date, price, county)
+"""
+
+RECORD_COLUMNS = [
+    "market_type", "id", "sale_date", "county", "region", "area",
+    "beds", "price", "sqr_metres", "raw_address", "synced_at"
+]
+
+CREATE_WATERMARKS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {WATERMARKS_TABLE} (
+    market_type VARCHAR(32) NOT NULL PRIMARY KEY,
+    sale_date DATE NOT NULL,
+    doc_id VARCHAR(64) NOT NULL,
+    sort_values VARCHAR(255) NOT NULL,
+    last_full_at DATETIME NULL,
+    updated_at DATETIME NOT NULL
+)
+"""
+
+CREATE_BOUNDS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {BOUNDS_TABLE} (
+    market_type VARCHAR(32) NOT NULL PRIMARY KEY,
+    date_from DATE NOT NULL,
+    date_to DATE NOT NULL,
+    price_low DOUBLE NOT NULL,
+    price_high DOUBLE NOT NULL,
+    computed_at DATETIME NOT NULL
+)
+"""
+
+CREATE_MIGRATIONS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+    version INT NOT NULL PRIMARY KEY,
+    name VARCHAR(64) NOT NULL,
+    applied_at DATETIME NOT NULL
+)
+"""
+
+def add_months(month, count):
+    """První den měsíce posunutý o count měsíců"""
+    year, index = divmod(month.year * 12 + month.month - 1 + count, 12)
+    return datetime(year, index + 1, 1)
+
+def partition_name(month):
+    return f"p{month:%Y%m}"
+
+def partition_months(today=None, back=PARTITION_MONTHS_BACK, ahead=PARTITION_MONTHS_AHEAD):
+    """Začátky měsíců, pro které má existovat oddíl"""
+    current = (today or datetime.today()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return [add_months(current, offset) for offset in range(-back, ahead + 1)]
+
+def partition_clause(months):
+    """PARTITION BY ... pro dané měsíce - první oddíl bere i vše starší, pmax vše novější"""
+    partitions = [
+        f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+        for month in months
+    ]
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return "PARTITION BY RANGE COLUMNS (sale_date) (\n    " + ",\n    ".join(partitions) + "\n)"
+
+def create_records_table(table=RECORDS_TABLE, months=None):
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} ({RECORDS_COLUMNS_DDL})\n"
+        + partition_clause(months or partition_months())
+    )
+
+def _table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return cursor.fetchone()[0] > 0
+
+def _columns(cursor, table):
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return {row[0].lower() for row in cursor.fetchall()}
+
+def partitions(cursor, table=RECORDS_TABLE):
+    """[(název, horní mez, odhad řádků)] v pořadí oddílů; prázdné pro nerozdělenou tabulku"""
+    cursor.execute("""
+        SELECT partition_name, partition_description, table_rows
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+    """, (table,))
+    return [(name, description, rows) for name, description, rows in cursor.fetchall()]
+
+def _create_tables(cursor):
+    """1: tabulka záznamů (rovnou rozdělená) a watermarky importu"""
+    cursor.execute(create_records_table())
+    cursor.execute(CREATE_WATERMARKS_TABLE)
+
+def _partition_records(cursor):
+    """2: převod nerozdělené pmx_records (import před spravovaným schématem)
+
+    Data se zkopírují do nové rozdělené tabulky s indexy a tabulky se
+    atomicky vymění. Primární klíč nově obsahuje sale_date - MySQL to
+    u rozdělených tabulek vyžaduje.
+    """
+    if partitions(cursor):
+        return
+
+    columns = _columns(cursor, RECORDS_TABLE)
+    new_table = f"{RECORDS_TABLE}_new"
+    old_table = f"{RECORDS_TABLE}_old"
+
+    cursor.execute(f"DROP TABLE IF EXISTS {new_table}")
+    cursor.execute(create_records_table(new_table))
+
+    select = [
+        column if column in columns else ("'1970-01-01'" if column == "synced_at" else "NULL")
+        for column in RECORD_COLUMNS
+    ]
+    cursor.execute(
+        f"INSERT INTO {new_table} ({', '.join(RECORD_COLUMNS)}) "
+        f"SELECT {', '.join(select)} FROM {RECORDS_TABLE}"
+    )
+    cursor.execute(f"DROP TABLE IF EXISTS {old_table}")
+    cursor.execute(f"RENAME TABLE {RECORDS_TABLE} TO {old_table}, {new_table} TO {RECORDS_TABLE}")
+    cursor.execute(f"DROP TABLE {old_table}")
+
+def _create_bounds_table(cursor):
+    """3: meze ořezu cen okna - počítá je import, dotazy je jen čtou"""
+    cursor.execute(CREATE_BOUNDS_TABLE)
+
+MIGRATIONS = [
+    (1, "create_records_tables", _create_tables),
+    (2, "partition_records_by_month", _partition_records),
+    (3, "create_price_bounds", _create_bounds_table),
+]
+
+def applied_versions(cursor):
+    cursor.execute(CREATE_MIGRATIONS_TABLE)
+    cursor.execute(f"SELECT version FROM {MIGRATIONS_TABLE}")
+    return {row[0] for row in cursor.fetchall()}
+
+def ensure_partitions(cursor, months=None, table=RECORDS_TABLE):
+    """Doplň chybějící budoucí měsíce rozdělením pmax; vrať jejich názvy"""
+    existing = partitions(cursor, table)
+    if not existing:
+        return []
+
+    names = {name for name, _, _ in existing}
+    bounds = [description.strip("'") for name, description, _ in existing if name != "pmax"]
+    last_bound = max(bounds) if bounds else "0000-00-00"
+
+    missing = [
+        month for month in (months or partition_months())
+        if partition_name(month) not in names and add_months(month, 1).strftime("%Y-%m-%d") > last_bound
+    ]
+    if not missing:
+        return []
+
+    parts = [
+        f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+        for month in missing
+    ]
+    parts.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    cursor.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({', '.join(parts)})")
+    return [partition_name(month) for month in missing]
+
+def drop_partitions_before(cursor, date_from, table=RECORDS_TABLE):
+    """Zahoď měsíce celé před date_from (oba typy trhu mají stejné okno)
+
+    První zbylý oddíl dál přijímá i starší data, takže vložení nikdy neselže.
+    """
+    existing = [(name, description.strip("'")) for name, description, _ in partitions(cursor, table)]
+    limit = date_from.strftime("%Y-%m-%d")
+    old = [name for name, bound in existing[:-1] if name != "pmax" and bound <= limit]
+
+    # Aspoň jeden oddíl před pmax musí zůstat
+    keep = [name for name, _ in existing if name != "pmax" and name not in old]
+    if not keep and old:
+        old = old[:-1]
+    if old:
+        cursor.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(old)}")
+    return old
+
+def migrate(connection, verbose=True):
+    """Proveď čekající migrace a doplň oddíly; vrať seznam provedených migrací"""
+    cursor = connection.cursor()
+    try:
+        done = applied_versions(cursor)
+        applied = []
+        for version, name, step in MIGRATIONS:
+            if version in done:
+                continue
+            if verbose:
+                print(f"🛠 Migrace {version}: {name}")
+            step(cursor)
+            cursor.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, name, applied_at) VALUES (%s, %s, %s)",
+                (version, name, datetime.now().replace(microsecond=0))
+            )
+            connection.commit()
+            applied.append(name)
+
+        added = ensure_partitions(cursor)
+        if added and verbose:
+            print(f"🗓 Nové oddíly {RECORDS_TABLE}: {', '.join(added)}")
+        connection.commit()
+        return applied
+    finally:
+        cursor.close()
+
+def price_bounds(cursor, market_type, date_from, date_to, trim=OUTLIER_TRIM):
+    """Kvantily ceny v okně stejně jako pandas (lineární interpolace)"""
+    where = "market_type = %s AND sale_date BETWEEN %s AND %s"
+    params = (market_type, date_from.date(), date_to.date())
+
+    cursor.execute(f"SELECT COUNT(*) FROM {RECORDS_TABLE} WHERE {where}", params)
+    count = cursor.fetchone()[0]
+    if not count:
+        return None
+
+    bounds = []
+    for quantile in trim:
+        position = quantile * (count - 1)
+        lower = math.floor(position)
+        cursor.execute(
+            f"SELECT price FROM {RECORDS_TABLE} WHERE {where} ORDER BY price LIMIT 2 OFFSET %s",
+            params + (lower,)
+        )
+        values = [row[0] for row in cursor.fetchall()]
+        if len(values) > 1:
+            bounds.append(values[0] + (values[1] - values[0]) * (position - lower))
+        else:
+            bounds.append(values[0])
+    return tuple(bounds)
+
+def stored_price_bounds(cursor, market_type, date_from, date_to):
+    """Meze uložené importem pro stejné okno, jinak None"""
+    cursor.execute(f"""
+        SELECT price_low, price_high FROM {BOUNDS_TABLE}
+        WHERE market_type = %s AND date_from = %s AND date_to = %s
+    """, (market_type, date_from.date(), date_to.date()))
+    row = cursor.fetchone()
+    return tuple(row) if row else None
+
+def refresh_price_bounds(connection, market_type, date_from, date_to, trim=OUTLIER_TRIM):
+    """Spočítej meze ořezu okna (jedno řazení cen) a ulož je k typu trhu"""
+    cursor = connection.cursor()
+    try:
+        bounds = price_bounds(cursor, market_type, date_from, date_to, trim)
+        if bounds is None:
+            cursor.execute(f"DELETE FROM {BOUNDS_TABLE} WHERE market_type = %s", (market_type,))
+        else:
+            cursor.execute(f"""
+                INSERT INTO {BOUNDS_TABLE} (market_type, date_from, date_to, price_low, price_high, computed_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    date_from = VALUES(date_from), date_to = VALUES(date_to),
+                    price_low = VALUES(price_low), price_high = VALUES(price_high),
+                    computed_at = VALUES(computed_at)
+            """, (market_type, date_from.date(), date_to.date(), *bounds, datetime.now().replace(microsecond=0)))
+        connection.commit()
+        return bounds
+    finally:
+        cursor.close()
+
+def record_totals_query(level="county", trimmed=False):
+    """Součty po (entita, kraj, ložnice, rok) - optimalizátor zvolí pokrývající index úrovně"""
+    entity = "county" if level == "county" else level
+    price_filter = " AND price > %s AND price < %s" if trimmed else ""
+    return f"""
+        SELECT {entity}, county, beds, YEAR(sale_date) AS year, COUNT(*), SUM(price)
+        FROM {RECORDS_TABLE}
+        WHERE market_type = %s AND sale_date BETWEEN %s AND %s{price_filter}
+        GROUP BY {entity}, county, beds, year
+    """
+
+def read_record_results(market_type, date_from, date_to, level="county", current_year=None,
+                        yoy_key="yoy", trim_outliers=None):
+    """Průměry a YoY přímo z pmx_records ve stejném tvaru jako read_materialized_results
+
+    Prodeje se jako v backendu nejdřív ořežou na 5 % - 95 % cen okna. Meze
+    se čtou z pmx_price_bounds; řadit ceny celého okna je potřeba, jen když
+    import pro aktuální okno (např. hned po přelomu měsíce) meze ještě neuložil.
+    """
+    if trim_outliers is None:
+        trim_outliers = TRIM_OUTLIERS.get(market_type, False)
+
+    connection = get_connection()
+    cursor = connection.cursor()
+    try:
+        params = (market_type, date_from.date(), date_to.date())
+        if trim_outliers:
+            bounds = stored_price_bounds(cursor, market_type, date_from, date_to)
+            if bounds is None:
+                bounds = price_bounds(cursor, market_type, date_from, date_to)
+            if bounds is None:
+                return {}, {}
+            params += bounds
+
+        cursor.execute(record_totals_query(level, trimmed=trim_outliers), params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+    return results_from_totals(rows, level, current_year, yoy_key)
+
+def print_status(connection):
+    cursor = connection.cursor()
+    try:
+        done = applied_versions(cursor)
+        for version, name, _ in MIGRATIONS:
+            print(f"{'✅' if version in done else '⏳'} {version}: {name}")
+
+        existing = partitions(cursor) if _table_exists(cursor, RECORDS_TABLE) else []
+        if existing:
+            print(f"🗓 {RECORDS_TABLE}: {len(existing)} oddílů ({existing[0][0]} … {existing[-1][0]})")
+            for name, bound, rows in existing:
+                print(f"   {name:<8} < {bound:<14} ~{rows or 0:,} řádků")
+    finally:
+        cursor.close()
+
+def print_explain(connection, level="county"):
+    """Plán dotazu pro okno backendu - oddíly a 'Using index' ověří prořezání a pokrytí"""
+    from pmx_window import get_date_range
+
+    date_from, date_to, _ = get_date_range()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            "EXPLAIN " + record_totals_query(level, trimmed=True),
+            ("Residential Sale", date_from.date(), date_to.date(), 0, 1e12)
+        )
+        for row in cursor.fetchall():
+            print(f"🔎 partitions: {row.get('partitions')}")
+            print(f"   key: {row.get('key')} (očekávaný {LEVEL_INDEXES[level]})  "
+                  f"rows: {row.get('rows')}  extra: {row.get('Extra')}")
+    finally:
+        cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Schéma záznamů v pmx_report")
+    parser.add_argument("command", choices=["migrate", "status", "explain"])
+    parser.add_argument("--level", choices=list(LEVEL_INDEXES), default="county", help="Úroveň pro explain")
+    args = parser.parse_args()
+
+    connection = get_connection()
+    try:
+        if args.command == "migrate":
+            applied = migrate(connection)
+            print(f"✅ Schéma je aktuální ({len(applied)} nových migrací)")
+        elif args.command == "status":
+            print_status(connection)
+        else:
+            print_explain(connection, args.level)
+    finally:
+        connection.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Single-flight slučování souběžných identických dotazů na upstream
+
+Pokud pro stejný klíč už běží dotaz, další volající nečekají na vlastní
+dotaz, ale na výsledek toho rozběhnutého.
+"""
+import asyncio
+
+class SingleFlight:
+    """Sdílí jeden běžící asyncio task mezi všemi volajícími se stejným klíčem"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """Spusť fn() pro daný klíč, nebo se připoj k již běžícímu volání
+
+        fn je funkce vracející awaitable. Výsledek (i výjimka) se doručí
+        všem volajícím. Zrušení jednoho volajícího neruší sdílený dotaz.
+        """
+        self.calls += 1
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        """Po dokončení uvolni klíč, aby další volání šlo znovu na upstream"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # Výjimku si vždy vyzvedni, i když všichni volající mezitím skončili
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """Počty volání, sdílených výsledků a právě běžících dotazů"""
+        return {
+            "calls": self.calls,
+            "shared": self.shared,
+            "inflight": len(self._inflight)
+        }
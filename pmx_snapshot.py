@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Perzistentní sloupcový snapshot zpracovaných záznamů (Arrow/Feather)
+
+Po každé obnově se validované záznamy uloží na disk. Po restartu se
+snapshot načte z disku a backend může odpovídat hned, bez stahování
+celého okna z ippi.io. Engine i endpointy potřebují DataFrame, takže se
+data při načtení vždy zkopírují do paměti - memory-map by nic neušetřil. pyarrow je volitelná závislost - bez
+něj se snapshoty jen vypnou.
+"""
+import json
+import os
+import time
+
+import pandas as pd
+
+SNAPSHOT_DIR = os.getenv("PMX_SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_ENABLED = os.getenv("PMX_SNAPSHOT", "1") == "1"
+
+# lz4 je rychlé na čtení a zmenší soubor; "uncompressed" pro pomalé CPU
+SNAPSHOT_COMPRESSION = os.getenv("PMX_SNAPSHOT_COMPRESSION", "lz4")
+
+# Změna formátu uložených sloupců → starší snapshoty se ignorují
+SNAPSHOT_VERSION = 1
+
+METADATA_KEY = b"pmx_snapshot"
+
+def snapshot_available():
+    """Jsou snapshoty zapnuté a je k dispozici pyarrow?"""
+    if not SNAPSHOT_ENABLED:
+        return False
+    try:
+        import pyarrow.feather  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def snapshot_path(market_type, directory=SNAPSHOT_DIR):
+    """Soubor snapshotu typu trhu ("Residential Sale" → residential_sale.arrow)"""
+    name = market_type.lower().replace(" ", "_")
+    return os.path.join(directory, f"{name}.arrow")
+
+def splice_records(previous, fresh, date_from, refresh_from):
+    """Nahraď v uložených záznamech prodeje od refresh_from čerstvě staženými
+
+    Starší měsíce okna (od date_from) zůstanou z předchozího snapshotu, takže
+    obnova stahuje jen nová data. Kategorie sloupců se po sloučení sjednotí.
+    """
+    if previous is None or previous.empty or refresh_from <= date_from:
+        return fresh
+
+    sale_dates = previous["saleDate"]
+    kept = previous[(sale_dates >= pd.Timestamp(date_from)) & (sale_dates < pd.Timestamp(refresh_from))]
+    merged = pd.concat([kept, fresh], ignore_index=True)
+
+    for column in fresh.columns:
+        if isinstance(fresh[column].dtype, pd.CategoricalDtype):
+            merged[column] = merged[column].astype("category")
+    return merged
+
+def write_snapshot(market_type, df, date_from, date_to, directory=SNAPSHOT_DIR):
+    """Atomicky ulož zpracované záznamy - zapíše se dočasný soubor a přejmenuje"""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(market_type, directory)
+    tmp_path = f"{path}.tmp"
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "market_type": market_type,
+        "date_from": date_from.strftime("%Y-%m-%d"),
+        "date_to": date_to.strftime("%Y-%m-%d"),
+        "created_at": time.time(),
+        "records": len(df)
+    }
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Smíšené typy v přenášených polích (např. sqrMetres jako text) → řetězce
+        df = df.copy()
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].map(lambda value: value if value is None else str(value))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        METADATA_KEY: json.dumps(meta).encode()
+    })
+    feather.write_feather(table, tmp_path, compression=SNAPSHOT_COMPRESSION)
+    os.replace(tmp_path, path)
+
+    print(f"💾 Snapshot uložen: {path} ({len(df)} záznamů)")
+    return meta
+
+def read_snapshot(market_type, directory=SNAPSHOT_DIR):
+    """Načti snapshot → (DataFrame, meta), None pokud chybí či je neplatný"""
+    path = snapshot_path(market_type, directory)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        import pyarrow.feather as feather
+
+        table = feather.read_table(path)
+        meta = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b"{}"))
+        if meta.get("version") != SNAPSHOT_VERSION or meta.get("market_type") != market_type:
+            print(f"⚠️ Snapshot {path} má jinou verzi - ignoruji")
+            return None
+
+        return table.to_pandas(), meta
+
+    except Exception as e:
+        print(f"❌ Chyba při čtení snapshotu {path}: {str(e)}")
+        return None
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Lokální stand-in za ippi.io Elasticsearch
+
+Odpovídá na _search nad syntetickými (pmx_synthetic) nebo nahranými hity
+a umí přesně to, co backendy používají: bool/match/term/terms/range dotazy,
+size, _source, řazení saleDate + id se search_after a agregace terms,
+range, date_histogram, percentiles a avg/sum/min/max/value_count.
+Latence, chyby a pomalé tělo odpovědi se nastavují z příkazové řádky
+nebo za běhu přes POST /_standin/config.
+
+Spuštění:
+    python pmx_standin.py --docs 200000 --latency-ms 80 --error-rate 0.01
+    PMX_ES_URL=http://127.0.0.1:9200/_search python start_backend.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Pole, podle kterých se filtruje a agreguje - zbytek _source se jen vrací
+INDEXED_FIELDS = ("marketType", "saleDate", "county", "area", "region", "beds", "price", "id")
+NUMERIC_FIELDS = ("beds", "price", "id")
+
+MAX_RESULT_WINDOW = 10000
+BODY_CHUNK = 65536
+
+class QueryError(Exception):
+    """Dotaz, který stand-in neumí - vrací se 400 jako z Elasticsearch"""
+
+def _field(name):
+    """county.keyword → county"""
+    return name[:-len(".keyword")] if name.endswith(".keyword") else name
+
+def _clauses(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _single(spec, kind):
+    if not isinstance(spec, dict) or len(spec) != 1:
+        raise QueryError(f"{kind} očekává právě jedno pole")
+    return next(iter(spec.items()))
+
+def _to_millis(values):
+    stamps = pd.to_datetime(pd.Series(values), errors="coerce", format="ISO8601", utc=True)
+    return (stamps.astype("int64") // 1000000).to_numpy()
+
+def load_recorded(paths):
+    """Hity z nahraných souborů - JSONL hitů/odpovědí nebo JSON odpověď _search"""
+    hits = []
+
+    def collect(item):
+        if isinstance(item, list):
+            for entry in item:
+                collect(entry)
+        elif isinstance(item, dict) and isinstance(item.get("hits"), dict):
+            hits.extend(item["hits"].get("hits", []))
+        elif isinstance(item, dict) and "_source" in item:
+            hits.append(item)
+
+    for path in paths:
+        with open(path) as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        collect(json.loads(line))
+            else:
+                collect(json.load(f))
+
+    return hits
+
+class StandinIndex:
+    """Hity seřazené podle (saleDate, id) a sloupce pro filtry a agregace"""
+
+    def __init__(self, hits, name="ippi"):
+        self.name = name
+        sources = [hit.get("_source", {}) for hit in hits]
+
+        frame = pd.DataFrame({field: [source.get(field) for source in sources] for field in INDEXED_FIELDS})
+        for field in NUMERIC_FIELDS:
+            frame[field] = pd.to_numeric(frame[field], errors="coerce")
+        millis = _to_millis(frame["saleDate"])
+        frame["saleDate"] = pd.to_datetime(frame["saleDate"], errors="coerce", format="ISO8601")
+
+        # Stejné pořadí jako sort: [saleDate asc, id asc] - search_after je pak jen řez
+        order = np.lexsort((frame["id"].fillna(-1).to_numpy(), millis))
+        self.frame = frame.iloc[order].reset_index(drop=True)
+        self.hits = [hits[i] for i in order]
+        self.millis = millis[order]
+        self.ids = self.frame["id"].fillna(-1).to_numpy()
+
+    def __len__(self):
+        return len(self.hits)
+
+    # --- dotaz ---
+
+    def _column(self, field):
+        field = _field(field)
+        return self.frame[field] if field in self.frame else None
+
+    def _match(self, query):
+        """Boolovská maska řádků odpovídajících dotazu"""
+        rows = len(self.frame)
+        if not query:
+            return np.ones(rows, dtype=bool)
+
+        kind, spec = _single(query, "query")
+
+        if kind == "match_all":
+            return np.ones(rows, dtype=bool)
+
+        if kind == "bool":
+            mask = np.ones(rows, dtype=bool)
+            for clause in _clauses(spec.get("must")) + _clauses(spec.get("filter")):
+                mask &= self._match(clause)
+            for clause in _clauses(spec.get("must_not")):
+                mask &= ~self._match(clause)
+            should = _clauses(spec.get("should"))
+            if should:
+                mask &= np.logical_or.reduce([self._match(clause) for clause in should])
+            return mask
+
+        if kind in ("match", "term"):
+            field, value = _single(spec, kind)
+            if isinstance(value, dict):
+                value = value.get("query", value.get("value"))
+            column = self._column(field)
+            if column is None:
+                return np.zeros(rows, dtype=bool)
+            return (column == value).to_numpy()
+
+        if kind == "terms":
+            field, values = _single(spec, kind)
+            column = self._column(field)
+            if column is None:
+                return np.zeros(rows, dtype=bool)
+            return column.isin(values).to_numpy()
+
+        if kind == "range":
+            field, bounds = _single(spec, kind)
+            column = self._column(field)
+            if column is None:
+                return np.zeros(rows, dtype=bool)
+
+            convert = pd.Timestamp if _field(field) == "saleDate" else float
+            mask = column.notna().to_numpy()
+            for op, compare in (("gte", "__ge__"), ("gt", "__gt__"), ("lte", "__le__"), ("lt", "__lt__")):
+                if bounds.get(op) is not None:
+                    mask &= getattr(column, compare)(convert(bounds[op])).to_numpy()
+            return mask
+
+        raise QueryError(f"Nepodporovaný dotaz: {kind}")
+
+    def _sorted(self, sort):
+        """Je požadované řazení to, podle kterého je index uložen?"""
+        if not sort:
+            return False
+        fields = []
+        for item in sort:
+            field, order = (item, "asc") if isinstance(item, str) else _single(item, "sort")
+            if isinstance(order, dict):
+                order = order.get("order", "asc")
+            fields.append((_field(field), order))
+        if fields not in ([("saleDate", "asc")], [("saleDate", "asc"), ("id", "asc")]):
+            raise QueryError(f"Nepodporované řazení: {sort}")
+        return True
+
+    def _after(self, positions, search_after):
+        """Řádky za hodnotami sort posledního hitu předchozí stránky"""
+        after_millis = search_after[0]
+        if isinstance(after_millis, str):
+            after_millis = int(_to_millis([after_millis])[0])
+        after_id = float(search_after[1]) if len(search_after) > 1 else np.inf
+
+        millis = self.millis[positions]
+        ids = self.ids[positions]
+        return positions[(millis > after_millis) | ((millis == after_millis) & (ids > after_id))]
+
+    @staticmethod
+    def _includes(source_spec):
+        if source_spec is None or source_spec is True:
+            return None
+        if source_spec is False:
+            return []
+        if isinstance(source_spec, str):
+            return [source_spec]
+        if isinstance(source_spec, list):
+            return source_spec
+        return source_spec.get("includes", source_spec.get("include"))
+
+    def _render(self, position, includes, with_sort):
+        hit = self.hits[position]
+        source = hit.get("_source", {})
+        if includes is not None:
+            source = {field: source[field] for field in includes if field in source}
+
+        rendered = {
+            "_index": self.name,
+            "_id": hit.get("_id", str(position)),
+            "_score": None if with_sort else 1.0,
+            "_source": source
+        }
+        if with_sort:
+            rendered["sort"] = [int(self.millis[position]), hit.get("_source", {}).get("id")]
+        return rendered
+
+    def search(self, body, size=10):
+        """Odpověď _search ve tvaru Elasticsearch 7"""
+        started = time.perf_counter()
+        body = body or {}
+        start = int(body.get("from", 0))
+        if size + start > MAX_RESULT_WINDOW:
+            raise QueryError(f"Result window is too large, from + size must be <= {MAX_RESULT_WINDOW}")
+
+        positions = np.flatnonzero(self._match(body.get("query")))
+        with_sort = self._sorted(body.get("sort"))
+        total = len(positions)
+
+        aggs = body.get("aggs") or body.get("aggregations")
+        aggregations = aggregate(self.frame.iloc[positions], aggs) if aggs else None
+
+        if body.get("search_after") is not None:
+            if not with_sort:
+                raise QueryError("search_after vyžaduje sort")
+            positions = self._after(positions, body["search_after"])
+
+        includes = self._includes(body.get("_source"))
+        hits = [self._render(position, includes, with_sort) for position in positions[start:start + size]]
+
+        response = {
+            "took": int((time.perf_counter() - started) * 1000),
+            "timed_out": False,
+            "hits": {
+                "total": {"value": total, "relation": "eq"},
+                "max_score": None if with_sort else 1.0,
+                "hits": hits
+            }
+        }
+        if aggregations is not None:
+            response["aggregations"] = aggregations
+        return response
+
+# --- agregace ---
+
+def _metric(kind, values):
+    values = values.dropna()
+    if kind == "value_count":
+        return int(len(values))
+    if kind == "sum":
+        return float(values.sum())
+    if values.empty:
+        return None
+    return float(getattr(values, {"avg": "mean", "min": "min", "max": "max"}[kind])())
+
+def aggregate(frame, aggs):
+    """Výsledky agregací nad vybranými řádky (rekurzivně pro vnořené aggs)"""
+    results = {}
+
+    for name, spec in (aggs or {}).items():
+        spec = dict(spec)
+        sub_aggs = spec.pop("aggs", None) or spec.pop("aggregations", None)
+        kind, params = _single(spec, "aggregace")
+        field = _field(params.get("field", ""))
+        if field not in frame:
+            raise QueryError(f"Neznámé pole agregace: {field}")
+        column = frame[field]
+
+        def bucket(rows, **fields):
+            entry = dict(fields, doc_count=int(len(rows)))
+            if sub_aggs:
+                entry.update(aggregate(rows, sub_aggs))
+            return entry
+
+        if kind in ("avg", "sum", "min", "max", "value_count"):
+            results[name] = {"value": _metric(kind, column)}
+
+        elif kind == "percentiles":
+            values = column.dropna().to_numpy()
+            percents = params.get("percents", [1, 5, 25, 50, 75, 95, 99])
+            results[name] = {"values": {
+                str(float(p)): float(np.percentile(values, p)) if len(values) else None for p in percents
+            }}
+
+        elif kind == "terms":
+            counts = column.value_counts()
+            counts = counts.iloc[np.lexsort((counts.index.astype(str), -counts.to_numpy()))]
+            shown = counts.head(int(params.get("size", 10)))
+            results[name] = {
+                "doc_count_error_upper_bound": 0,
+                "sum_other_doc_count": int(counts.sum() - shown.sum()),
+                "buckets": [bucket(frame[column == key], key=key) for key in shown.index]
+            }
+
+        elif kind == "range":
+            buckets = []
+            for spec_range in params.get("ranges", []):
+                mask = column.notna()
+                low, high = spec_range.get("from"), spec_range.get("to")
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column < high
+                key = spec_range.get("key", f"{'*' if low is None else float(low)}-{'*' if high is None else float(high)}")
+                extra = {"from": low} if low is not None else {}
+                if high is not None:
+                    extra["to"] = high
+                buckets.append(bucket(frame[mask], key=key, **extra))
+            results[name] = {"buckets": buckets}
+
+        elif kind == "date_histogram":
+            interval = params.get("calendar_interval", params.get("interval"))
+            freq = {"month": "M", "1M": "M", "year": "Y", "1y": "Y", "day": "D", "1d": "D"}.get(interval)
+            if freq is None:
+                raise QueryError(f"Nepodporovaný interval: {interval}")
+
+            periods = column.dt.to_period(freq)
+            present = periods.dropna()
+            if present.empty:
+                results[name] = {"buckets": []}
+                continue
+
+            # min_doc_count 0 doplní prázdné měsíce mezi prvním a posledním jako ES
+            min_doc_count = int(params.get("min_doc_count", 0))
+            groups = frame.groupby(periods, observed=True).indices
+            buckets = []
+            for period in pd.period_range(present.min(), present.max(), freq=freq):
+                rows = frame.iloc[groups.get(period, [])]
+                if len(rows) < min_doc_count:
+                    continue
+                start = period.start_time
+                buckets.append(bucket(rows, key_as_string=start.strftime("%Y-%m-%dT00:00:00.000Z"),
+                                      key=int(start.value // 1000000)))
+            results[name] = {"buckets": buckets}
+
+        else:
+            raise QueryError(f"Nepodporovaná agregace: {kind}")
+
+    return results
+
+# --- vstřikování chyb ---
+
+class Faults:
+    """Nastavitelná latence, chyby a pomalé tělo odpovědi"""
+
+    FIELDS = {
+        "latency_ms": float,
+        "jitter_ms": float,
+        "error_rate": float,
+        "error_status": int,
+        "slow_body_ms": float
+    }
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503,
+                 slow_body_ms=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_body_ms = slow_body_ms
+        self._random = random.Random(seed)
+
+    def update(self, values):
+        for field, value in values.items():
+            if field not in self.FIELDS:
+                raise ValueError(f"Neznámé nastavení: {field}")
+            setattr(self, field, self.FIELDS[field](value))
+
+    def delay(self):
+        """Latence v sekundách pro jeden dotaz"""
+        jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(self.latency_ms + jitter, 0.0) / 1000
+
+    def fail(self):
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+async def _slow_body(payload, pause):
+    for offset in range(0, len(payload), BODY_CHUNK):
+        yield payload[offset:offset + BODY_CHUNK]
+        await asyncio.sleep(pause)
+
+def create_app(index, faults=None):
+    """FastAPI aplikace se stejnou _search cestou jako ippi.io"""
+    faults = faults or Faults()
+    stats = {"requests": 0, "errors": 0, "injected_errors": 0, "hits_returned": 0}
+    app = FastAPI(title="PMX Elasticsearch stand-in")
+
+    @app.get("/")
+    async def info():
+        return {"name": "pmx-standin", "version": {"number": "7.17.0"}, "documents": len(index)}
+
+    @app.api_route("/_search", methods=["GET", "POST"])
+    @app.api_route("/{index_name}/_search", methods=["GET", "POST"])
+    async def search(request: Request, size: int = None, index_name: str = None):
+        stats["requests"] += 1
+        raw = await request.body()
+
+        delay = faults.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        if faults.fail():
+            stats["injected_errors"] += 1
+            return JSONResponse(
+                {"error": {"type": "standin_injected_error", "reason": "Vstříknutá chyba"},
+                 "status": faults.error_status},
+                status_code=faults.error_status
+            )
+
+        try:
+            body = json.loads(raw) if raw else {}
+            if size is None:
+                size = int(body.get("size", 10))
+            result = await asyncio.to_thread(index.search, body, size)
+        except (QueryError, ValueError) as e:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"type": "parsing_exception", "reason": str(e)}, "status": 400},
+                                status_code=400)
+
+        stats["hits_returned"] += len(result["hits"]["hits"])
+        payload = json.dumps(result).encode()
+        if faults.slow_body_ms:
+            return StreamingResponse(_slow_body(payload, faults.slow_body_ms / 1000), media_type="application/json")
+        return Response(payload, media_type="application/json")
+
+    @app.get("/_standin/config")
+    async def get_config():
+        return faults.as_dict()
+
+    @app.post("/_standin/config")
+    async def set_config(request: Request):
+        try:
+            faults.update(await request.json())
+        except (ValueError, TypeError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return faults.as_dict()
+
+    @app.get("/_standin/stats")
+    async def get_stats():
+        return dict(stats, documents=len(index))
+
+    return app
+
+def build_index(docs=100000, rent_docs=None, seed=42, recorded=None):
+    """Index ze záznamů (recorded) nebo ze syntetických prodejů a nájmů"""
+    if recorded:
+        hits = load_recorded(recorded)
+    else:
+        from pmx_synthetic import generate_hits
+
+        rent_docs = docs // 4 if rent_docs is None else rent_docs
+        hits = list(generate_hits(docs, seed=seed, market_type="Residential Sale"))
+        hits.extend(generate_hits(rent_docs, seed=seed + 1, market_type="Residential Rent", start_id=docs))
+    return StandinIndex(hits)
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokální stand-in za ippi.io Elasticsearch")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--docs", type=int, default=100000, help="Syntetické prodeje")
+    parser.add_argument("--rent-docs", type=int, default=None, help="Syntetické nájmy (výchozí docs / 4)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--recorded", nargs="+", help="Nahrané hity/odpovědi (.json, .jsonl) místo syntetických")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--slow-body-ms", type=float, default=0.0, help="Pauza mezi 64KB bloky odpovědi")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = build_index(args.docs, args.rent_docs, args.seed, args.recorded)
+    print(f"📦 Stand-in index: {len(index)} dokumentů ({time.perf_counter() - started:.1f} s)")
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status,
+                    args.slow_body_ms, seed=args.seed)
+
+    import uvicorn
+    print(f"🧪 Elasticsearch stand-in: http://{args.host}:{args.port}/_search")
+    uvicorn.run(create_app(index, faults), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Deterministický generátor syntetických hitů ve tvaru ippi.io
+
+Stejný seed, typ trhu a rozsah dat → stejné dokumenty, takže benchmarky
+i lokální stand-in Elasticsearch dávají opakovatelné výsledky. Rozložení
+je záměrně nerovnoměrné jako v reálných datech: Dublin a Cork tvoří
+většinu prodejů, oblasti v kraji mají Zipfovo rozložení, ceny jsou
+log-normální s odlehlými hodnotami a malá část záznamů je neplatná
+(0 ložnic, chybějící cena, neznámý kraj), aby validace měla co zahazovat.
+
+Dokumenty se generují po blocích přes numpy, takže jde vyrobit i 10M
+hitů bez držení všech v paměti (generate_hits je generátor).
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Podíl prodejů podle kraje (zhruba podle počtu obyvatel)
+COUNTY_WEIGHTS = {
+    "Dublin": 28.0, "Cork": 11.5, "Galway": 5.5, "Kildare": 5.0, "Meath": 4.5,
+    "Limerick": 4.0, "Wicklow": 3.0, "Wexford": 3.0, "Donegal": 3.0, "Tipperary": 3.0,
+    "Kerry": 3.0, "Louth": 2.8, "Mayo": 2.5, "Clare": 2.5, "Waterford": 2.5,
+    "Westmeath": 1.8, "Kilkenny": 1.8, "Laois": 1.6, "Offaly": 1.5, "Cavan": 1.5,
+    "Sligo": 1.2, "Roscommon": 1.2, "Monaghan": 1.1, "Carlow": 1.1, "Longford": 0.8,
+    "Leitrim": 0.6, "Antrim": 0.6, "Down": 0.5, "Tyrone": 0.3, "Fermanagh": 0.2
+}
+
+# Hodnoty kraje, které validace zahodí (překlepy, prázdné pole)
+INVALID_COUNTIES = ["Co. Dublin", "Unknown", "", None]
+
+# Cenová hladina kraje vůči průměru
+COUNTY_PRICE_FACTOR = {
+    "Dublin": 1.8, "Wicklow": 1.5, "Kildare": 1.3, "Meath": 1.2, "Cork": 1.1,
+    "Galway": 1.1, "Louth": 1.0, "Limerick": 0.95, "Kerry": 0.9, "Waterford": 0.9,
+    "Clare": 0.85, "Kilkenny": 0.9, "Wexford": 0.85, "Westmeath": 0.8
+}
+
+BEDS_VALUES = np.array([0, 1, 2, 3, 4, 5, 6, 7, 8])
+BEDS_WEIGHTS = np.array([0.02, 0.09, 0.22, 0.33, 0.20, 0.08, 0.03, 0.02, 0.01])
+
+SALE_MEDIAN = 320000.0
+RENT_MEDIAN = 1800.0
+
+AREAS_PER_COUNTY = 40
+REGIONS_PER_COUNTY = 4
+
+# Podíl vadných záznamů
+INVALID_COUNTY_SHARE = 0.01
+MISSING_PRICE_SHARE = 0.01
+OUTLIER_SHARE = 0.005
+
+CHUNK_SIZE = 50000
+
+def default_window(today=None, months=36):
+    """Okno jako v backendu - posledních `months` měsíců do konce aktuálního měsíce"""
+    today = today or datetime.today()
+    next_month = today.replace(day=28) + timedelta(days=4)
+    date_to = next_month - timedelta(days=next_month.day)
+    year, month = divmod(today.year * 12 + today.month - 1 - months, 12)
+    return datetime(year, month + 1, 1), date_to.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _weights(values):
+    weights = np.array(values, dtype=np.float64)
+    return weights / weights.sum()
+
+def _chunk_columns(rng, count, market_type, date_from, span_days):
+    """Jeden blok sloupců - vše vektorově, dokumenty se skládají až potom"""
+    counties = list(COUNTY_WEIGHTS)
+    county_index = rng.choice(len(counties), size=count, p=_weights(list(COUNTY_WEIGHTS.values())))
+    county = np.array(counties, dtype=object)[county_index]
+
+    invalid = rng.random(count) < INVALID_COUNTY_SHARE
+    county[invalid] = rng.choice(np.array(INVALID_COUNTIES, dtype=object), size=int(invalid.sum()))
+
+    beds = rng.choice(BEDS_VALUES, size=count, p=BEDS_WEIGHTS)
+
+    # Zipf - pár oblastí v kraji má většinu prodejů
+    area_index = np.minimum(rng.zipf(1.6, size=count), AREAS_PER_COUNTY)
+    region_index = area_index % REGIONS_PER_COUNTY + 1
+
+    factor = np.array([COUNTY_PRICE_FACTOR.get(name, 0.75) for name in counties])[county_index]
+    median = RENT_MEDIAN if "Rent" in market_type else SALE_MEDIAN
+    price = median * factor * (0.6 + 0.2 * np.minimum(beds, 6)) * rng.lognormal(0.0, 0.35, size=count)
+    outliers = rng.random(count) < OUTLIER_SHARE
+    price[outliers] *= rng.choice([0.05, 10.0], size=int(outliers.sum()))
+    price = np.round(price, -2 if median > 10000 else 0)
+
+    missing_price = rng.random(count) < MISSING_PRICE_SHARE
+
+    # Sezónnost - čtvrtina prodejů z prosince a ledna se přesune jinam
+    day = rng.integers(0, span_days, size=count)
+    month = (date_from.month - 1 + (day // 30)) % 12
+    seasonal = rng.random(count) < np.where(np.isin(month, [0, 11]), 0.25, 0.0)
+    day[seasonal] = rng.integers(0, span_days, size=int(seasonal.sum()))
+
+    sqr_metres = np.round(20 + beds * 28 + rng.normal(0, 12, size=count), 1)
+    lat = 51.5 + rng.random(count) * 3.8
+    lon = -10.4 + rng.random(count) * 4.4
+
+    return county, beds, area_index, region_index, price, missing_price, day, sqr_metres, lat, lon
+
+def generate_hits(count, seed=42, market_type="Residential Sale", date_from=None, date_to=None,
+                  start_id=0, chunk_size=CHUNK_SIZE):
+    """Generátor `count` hitů (_id, _source, sort) - deterministický pro daný seed a okno
+
+    Každý blok má vlastní RNG odvozený ze seedu a čísla bloku, takže kratší
+    běh vrátí přesně začátek delšího.
+    """
+    if date_from is None or date_to is None:
+        default_from, default_to = default_window()
+        date_from = date_from or default_from
+        date_to = date_to or default_to
+
+    span_days = max((date_to - date_from).days + 1, 1)
+    epoch = datetime(1970, 1, 1)
+
+    # Formátování data je nejdražší část skládání dokumentu - jednou pro každý den
+    days = [date_from + timedelta(days=offset) for offset in range(span_days)]
+    day_strings = [day.strftime("%Y-%m-%d") for day in days]
+    day_millis = [int((day - epoch).total_seconds() * 1000) for day in days]
+    places = {}
+
+    produced = 0
+    while produced < count:
+        size = min(chunk_size, count - produced)
+        rng = np.random.default_rng([seed, produced // chunk_size])
+        (county, beds, area_index, region_index, price, missing_price,
+         day, sqr_metres, lat, lon) = _chunk_columns(rng, chunk_size, market_type, date_from, span_days)
+
+        for i in range(size):
+            doc_id = start_id + produced + i
+            name = county[i]
+            key = (name, area_index[i], region_index[i])
+            place = places.get(key)
+            if place is None:
+                town = name or "Ireland"
+                place = places[key] = (f"{town} Area {key[1]}", f"{town} Region {key[2]}", town)
+
+            source = {
+                "id": doc_id,
+                "county": name,
+                "area": place[0],
+                "region": place[1],
+                "beds": int(beds[i]),
+                "price": None if missing_price[i] else float(price[i]),
+                "saleDate": day_strings[day[i]],
+                "sqrMetres": float(sqr_metres[i]) if i % 17 else str(sqr_metres[i]),
+                "location": {"lat": round(float(lat[i]), 5), "lon": round(float(lon[i]), 5)},
+                "rawAddress": f"{doc_id % 300 + 1} Main Street, {place[2]}",
+                "marketType": market_type
+            }
+            yield {"_id": str(doc_id), "_source": source, "sort": [day_millis[day[i]], doc_id]}
+
+        produced += size
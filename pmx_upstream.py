@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Zaměnitelný upstream pro dotazy do Elasticsearch
+
+Oba backendy volají upstream přes search_elasticsearch(query_body, size).
+Bez PMX_ES_URL se použije produkční ippi.io (ElasticsearchManager, resp.
+výchozí URL ve working_backend.py), s ním libovolný endpoint _search -
+typicky lokální stand-in z pmx_standin.py pro zátěžové testy bez sítě.
+"""
+import json
+import os
+
+import httpx
+
+ES_URL = os.getenv("PMX_ES_URL", "")
+ES_TOKEN = os.getenv("PMX_ES_TOKEN", "")
+ES_TIMEOUT = float(os.getenv("PMX_ES_TIMEOUT", "30"))
+
+class HttpSearchClient:
+    """Blokující klient se stejným rozhraním jako ElasticsearchManager"""
+
+    def __init__(self, url, token=ES_TOKEN, timeout=ES_TIMEOUT):
+        self.url = url
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self._client = httpx.Client(headers=headers, timeout=timeout)
+
+    def search_elasticsearch(self, query_body, size=10):
+        """Pošli dotaz na _search a vrať JSON odpověď (HTTP chyba → výjimka pro breaker)"""
+        response = self._client.request(
+            "GET", self.url, params={"size": size}, content=json.dumps(query_body)
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self._client.close()
+
+def create_search_client(default_factory):
+    """HttpSearchClient pro PMX_ES_URL, jinak výchozí (produkční) klient"""
+    if ES_URL:
+        print(f"🔁 Upstream přesměrován na {ES_URL}")
+        return HttpSearchClient(ES_URL)
+    return default_factory()
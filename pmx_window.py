@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Datové okno PMX - poslední tři roky prodejů po konec aktuálního měsíce
+
+Sdílí ho backend (dotazy do Elasticsearch, engine, snapshoty) i import do
+MySQL, aby import nemusel kvůli výpočtu okna načítat celý backend.
+"""
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+def get_date_range():
+    """Získej rozsah dat pro dotazy - použij existující logiku"""
+    date_on = datetime.today()
+    years_ago = date_on - relativedelta(years=3)
+    last_year = date_on - relativedelta(years=1)
+    
+    import_date_from = years_ago.replace(day=1)
+    next_month = date_on.replace(day=28) + timedelta(days=4)
+    import_date_to = next_month - timedelta(days=next_month.day)
+    next_month = last_year.replace(day=28) + timedelta(days=4)
+    last_year_end_date = next_month - timedelta(days=next_month.day)
+    
+    return import_date_from, import_date_to, last_year_end_date
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Pool pro CPU náročné fáze (zpracování hitů, ořez outlierů, seskupení, YoY)
+
+Async handlery jen orchestrují - pandas práce běží ve vláknech (nebo
+v procesech), takže levné endpointy jako /health nečekají na velkou
+agregaci. Fronta je omezená a každá fáze má vlastní timeout.
+
+Dlouhé I/O fáze (stahování z ippi.io, obnova enginu, snapshot) mají
+vlastní pool vláken - i několikaminutová obnova tak nezabere workery,
+na které čekají krátké fáze požadavků (process, aggregate).
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+# thread (výchozí) nebo process - v procesech běží jen run_cpu fáze
+WORKER_MODE = os.getenv("PMX_WORKER_MODE", "thread")
+WORKER_COUNT = int(os.getenv("PMX_WORKERS", str(min(4, os.cpu_count() or 1))))
+WORKER_QUEUE = int(os.getenv("PMX_WORKER_QUEUE", "32"))
+# Vlákna pro I/O fáze - většinu času čekají na síť nebo MySQL
+IO_WORKER_COUNT = int(os.getenv("PMX_IO_WORKERS", "8"))
+
+# Fáze, které běží v I/O poolu místo poolu požadavků
+IO_STAGES = ("fetch", "refresh", "snapshot")
+
+# Timeouty fází v sekundách, přepsatelné přes PMX_STAGE_TIMEOUT_<FÁZE>
+DEFAULT_STAGE_TIMEOUT = 60.0
+STAGE_TIMEOUTS = {
+    "fetch": 300.0,
+    "refresh": 300.0,
+    "snapshot": 1800.0,
+    "process": 60.0,
+    "aggregate": 60.0,
+}
+
+def stage_timeout(stage):
+    """Timeout fáze z prostředí nebo ze STAGE_TIMEOUTS"""
+    value = os.getenv(f"PMX_STAGE_TIMEOUT_{stage.upper()}")
+    if value is not None:
+        return float(value)
+    return STAGE_TIMEOUTS.get(stage, DEFAULT_STAGE_TIMEOUT)
+
+def _timed_call(fn, args, kwargs):
+    """Spusť fn a vrať i čistý čas běhu (bez čekání ve frontě)"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+class WorkerPool:
+    """Omezený pool vláken (a volitelně procesů) s počítadly po fázích
+
+    Fáze z IO_STAGES běží v samostatném I/O poolu s vlastní frontou,
+    ostatní ve vláknech (nebo procesech) pro požadavky.
+    """
+
+    def __init__(self, mode=WORKER_MODE, workers=WORKER_COUNT, max_queue=WORKER_QUEUE,
+                 io_workers=IO_WORKER_COUNT):
+        self.mode = mode
+        self.workers = workers
+        self.io_workers = io_workers
+        self.max_pending = workers + max_queue
+        self.max_io_pending = io_workers + max_queue
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pmx-worker")
+        self._io_threads = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="pmx-io")
+        self._processes = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.io_pending = 0
+        self.rejected = 0
+        self.stages = {}
+
+    def _cpu_executor(self):
+        if self.mode != "process":
+            return self._threads
+
+        with self._lock:
+            if self._processes is None:
+                # spawn - nezdědí vlákna ani otevřená spojení rodiče
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._processes
+
+    def _stage(self, stage):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "timeouts": 0, "errors": 0}
+        return entry
+
+    def _release(self, stage, future):
+        """Uvolni místo ve frontě až po skutečném doběhnutí úlohy"""
+        with self._lock:
+            if stage in IO_STAGES:
+                self.io_pending -= 1
+            else:
+                self.pending -= 1
+            entry = self._stage(stage)
+
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                entry["errors"] += 1
+                return
+
+            _, elapsed = future.result()
+            entry["count"] += 1
+            entry["seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+
+    async def _submit(self, executor, stage, fn, args, kwargs, timeout):
+        io = stage in IO_STAGES
+        with self._lock:
+            pending, limit = (self.io_pending, self.max_io_pending) if io else (self.pending, self.max_pending)
+            if pending >= limit:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Server je přetížený, zkus to později")
+            if io:
+                self.io_pending += 1
+            else:
+                self.pending += 1
+
+        try:
+            future = executor.submit(_timed_call, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                if io:
+                    self.io_pending -= 1
+                else:
+                    self.pending -= 1
+            raise
+        future.add_done_callback(lambda done: self._release(stage, done))
+
+        if timeout is None:
+            timeout = stage_timeout(stage)
+
+        try:
+            # Zrušení zastaví úlohu, která ještě čeká ve frontě; běžící doběhne
+            result, _ = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stage(stage)["timeouts"] += 1
+            raise HTTPException(status_code=504, detail=f"Fáze {stage} nestihla doběhnout do {timeout:g} s")
+
+        return result
+
+    async def run(self, stage, fn, *args, timeout=None, **kwargs):
+        """Spusť blokující fn ve vlákně (I/O a fáze se sdíleným stavem)"""
+        executor = self._io_threads if stage in IO_STAGES else self._threads
+        return await self._submit(executor, stage, fn, args, kwargs, timeout)
+
+    async def run_cpu(self, stage, fn, *args, timeout=None, **kwargs):
+        """Spusť čistě výpočetní fn - v režimu process v samostatném procesu
+
+        fn musí být funkce na úrovni modulu a argumenty i výsledek se musí
+        dát serializovat (pickle). Worker proces importuje modul funkce,
+        proto patří do lehkých modulů (pmx_processing), ne do backendu.
+        """
+        return await self._submit(self._cpu_executor(), stage, fn, args, kwargs, timeout)
+
+    def shutdown(self):
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._io_threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """Stav poolu a časy fází pro monitoring"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "saturation": round(self.pending / self.max_pending, 4),
+                "io_workers": self.io_workers,
+                "io_pending": self.io_pending,
+                "max_io_pending": self.max_io_pending,
+                "rejected": self.rejected,
+                "stages": {stage: dict(entry) for stage, entry in self.stages.items()}
+            }
@@ -1,12 +1,19 @@
 #!/usr/bin/env python3
 """
 Run data import from Elasticsearch to MySQL
+
+Sales and rent are imported concurrently in this process (pmx_import.py)
+with progress and a resumable checkpoint. The old sequential subprocess
+import of sales.py/rent.py is still available with --legacy.
 """
 import subprocess
 import sys
+import os
+
+from pmx_import import run_inprocess_import, refresh_aggregates, invalidate_api_cache, parse_args
 
 def install_dependencies():
-    """Install required dependencies for data import"""
+    """Install required dependencies for the legacy data import"""
     dependencies = [
         'requests',
         'pandas',
@@ -24,19 +31,8 @@ def install_dependencies():
             return False
     return True
 
-# Install dependencies first
-print("📦 Installing required dependencies...")
-if not install_dependencies():
-    print("❌ Failed to install dependencies. Exiting.")
-    sys.exit(1)
-
-import sys
-import os
-import subprocess
-import time
-
 def run_import():
-    """Run the data import process"""
+    """Run the legacy data import process (subprocesses)"""
     print("🚀 Starting data import from Elasticsearch...")
     
     # Change to the correct directory
@@ -89,10 +85,23 @@ def run_import():
         os.chdir(original_dir)
 
 if __name__ == "__main__":
-    if run_import():
+    args = parse_args("Import data from Elasticsearch to MySQL")
+    
+    if args.legacy:
+        print("📦 Installing required dependencies...")
+        if not install_dependencies():
+            print("❌ Failed to install dependencies. Exiting.")
+            sys.exit(1)
+        imported = run_import()
+    else:
+        imported = run_inprocess_import(args)
+    
+    if imported:
+        refresh_aggregates(from_records=not args.legacy)
+        invalidate_api_cache()
         print("\n✅ Data import completed successfully!")
         print("\n📝 Next step:")
         print("Start the API server: uvicorn main:app --reload")
     else:
         print("\n❌ Data import failed!")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
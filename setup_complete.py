@@ -19,6 +19,7 @@ def install_python_dependencies():
         'requests==2.31.0',
         'pandas==2.1.3',
         'python-dateutil==2.8.2',
+        'httpx==0.25.2',
         'mysql-connector-python',
         'pymysql',
         'sqlalchemy==2.0.23',
@@ -79,11 +80,21 @@ def setup_mysql_database():
                 token VARCHAR(64),
                 user_id INT,
                 salt VARCHAR(16),
+                INDEX idx_tokens_token (token),
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
             """
             cursor.execute(create_tokens_table)
             
+            # Index pro vyhledání tokenu při ověření API klíče
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = 'pmx_api_auth' AND table_name = 'tokens'
+                AND index_name = 'idx_tokens_token'
+            """)
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("CREATE INDEX idx_tokens_token ON tokens (token)")
+            
             # Test uživatel a token
             test_api_key = "test_api_key_123"
             hash_object = hashlib.sha256()
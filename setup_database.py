@@ -75,11 +75,21 @@ def create_databases():
                 token VARCHAR(64),
                 user_id INT,
                 salt VARCHAR(16),
+                INDEX idx_tokens_token (token),
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
             """
             cursor.execute(create_tokens_table)
             
+            # Index for token lookups during API key authentication
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = 'pmx_api_auth' AND table_name = 'tokens'
+                AND index_name = 'idx_tokens_token'
+            """)
+            if cursor.fetchone()[0] == 0:
+                cursor.execute("CREATE INDEX idx_tokens_token ON tokens (token)")
+            
             # Insert test user and token
             import hashlib
             test_domain = "localhost"
@@ -102,6 +112,12 @@ def create_databases():
             
             connection.commit()
             print("✅ Authentication tables created")
+
+            # Managed schema for sale/rent records (partitioned by month, covering indexes)
+            from pmx_schema import migrate
+            cursor.execute("USE pmx_report")
+            applied = migrate(connection)
+            print(f"✅ pmx_report schema up to date ({len(applied)} migrations applied)")
             print(f"✅ Test API key created: {test_api_key}")
             print(f"✅ Test domain: {test_domain}")
             
@@ -125,6 +141,7 @@ if __name__ == "__main__":
         print("1. Run the data import: python elasticsearch_to_mysql/sales.py")
         print("2. Run the rent data import: python elasticsearch_to_mysql/rent.py")
         print("3. Start the API: uvicorn main:app --reload")
+        print("   After upgrading PMX, apply new schema migrations: python pmx_schema.py migrate")
         print("\n🔑 API Credentials for testing:")
         print("API Key: test_api_key_123")
         print("Domain: localhost")
@@ -5,26 +5,58 @@ FastAPI backend používající existující Elasticsearch kód z projektu
 
 import sys
 import os
+import itertools
+import asyncio
+import threading
+import time
 
 # Přidej cesty k existujícím modulům
 sys.path.append("Elasticsearch-to-MySQL-master/Elasticsearch-to-MySQL-master/PMX-api")
 sys.path.append("Elasticsearch-to-MySQL-master/Elasticsearch-to-MySQL-master/ElasticsearchToMysql")
 
 try:
-    from fastapi import FastAPI, HTTPException, Query
+    from fastapi import FastAPI, HTTPException, Query, Header
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response, PlainTextResponse, FileResponse
     import json
-    from datetime import datetime, timedelta
+    from datetime import datetime
     from dateutil.relativedelta import relativedelta
     import pandas as pd
     
     # Import existujícího autentifikačního systému
-    from app.api.utils.auth.check_api_key import auth_api_key
+    from app.api.utils.auth.check_api_key import auth_api_key as check_api_key
     
     # Import existujících Elasticsearch utilit
     from elasticsearch_to_mysql.data_manager.data_manager import DataManager
     from elasticsearch_to_mysql.data_manager.elasticsearch_manager import ElasticsearchManager
     
+    from pmx_auth import ApiKeyAuth
+    from pmx_window import get_date_range
+    from pmx_upstream import create_search_client
+    from pmx_singleflight import SingleFlight
+    from pmx_cache import AggregateCache, MISSING, make_key
+    from pmx_materialize import read_materialized_results
+    from pmx_schema import read_record_results
+    from pmx_fanout import fetch_slices, month_slices, FETCH_FANOUT, FETCH_SLICE, FETCH_SLICE_MONTHS
+    from pmx_engine import AggregationEngine, month_key
+    from pmx_cube import normalize_level
+    from pmx_workers import WorkerPool
+    from pmx_snapshot import snapshot_available, read_snapshot, write_snapshot, splice_records
+    from pmx_breaker import CircuitBreaker, UpstreamUnavailable, CLOSED
+    from pmx_health import UpstreamProber, PROBE_QUERY
+    from pmx_metrics import REGISTRY, CONTENT_TYPE, HTTP_SECONDS, HITS_FETCHED, stage_timer
+    from pmx_profiling import (
+        profiler, require_admin, wants_profile, profile_request, report_path, PROFILER_ENABLED
+    )
+    from pmx_processing import (
+        process_hits_columnar, records_to_dicts, averages_and_yoy, frame_to_records,
+        summarize_records, EXTRA_FIELDS
+    )
+    from pmx_aggregations import (
+        COUNTY_FIELD, build_price_percentiles_body, build_county_beds_body, parse_price_percentiles,
+        parse_county_beds_buckets, rows_to_avg_results, rows_to_yoy_results
+    )
+    
 except ImportError as e:
     print(f"Chyba importu: {e}")
     print("CHYBA: Některé moduly nejsou dostupné. Zkontroluj cestu k PMX-api a ElasticsearchToMysql.")
@@ -44,18 +76,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["X-Data-Age", "X-Data-Stale", "X-Upstream-State"],
 )
 
 # Inicializace existujících managerů
 try:
     data_manager = DataManager()
-    elasticsearch_manager = ElasticsearchManager()
+    # PMX_ES_URL přesměruje dotazy jinam (např. na lokální stand-in)
+    elasticsearch_manager = create_search_client(ElasticsearchManager)
     print("✅ Elasticsearch managery inicializovány")
 except Exception as e:
     print(f"⚠️ Chyba při inicializaci managerů: {e}")
     data_manager = None
     elasticsearch_manager = None
 
+# Souběžné identické dotazy na ippi.io sdílí jeden běžící fetch
+upstream_flight = SingleFlight()
+
+# Spočítané agregace - platí do dalšího importu (nebo do vypršení TTL)
+aggregate_cache = AggregateCache()
+
+# Měsíční dílčí agregace - po prvním načtení se obnovují jen poslední měsíce
+aggregation_engine = AggregationEngine()
+
+# CPU náročné fáze běží mimo event loop (PMX_WORKER_MODE, PMX_WORKERS)
+workers = WorkerPool()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    workers.shutdown()
+
+# ippi.io se po opakovaných chybách přestane volat (PMX_BREAKER_*)
+upstream_breaker = CircuitBreaker()
+ENGINE_CHECK_INTERVAL = 30
+engine_refresh_task = None
+background_refreshes = set()
+
+# Snapshot zpracovaných záznamů na disku - rychlý start po restartu
+SNAPSHOT_MARKET_TYPES = ("Residential Sale", "Residential Rent")
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("PMX_SNAPSHOT_REFRESH_INTERVAL", "3600"))
+SNAPSHOT_CHECK_INTERVAL = 60
+snapshot_records = {}
+snapshot_meta = {}
+# Načtení snapshotu z disku a obnova z Elasticsearch nesmí data přepsat souběžně
+snapshot_lock = threading.Lock()
+snapshot_task = None
+
+# Výsledky existujícího ověření API klíčů - krátkodobá cache před pmx_api_auth
+api_key_auth = ApiKeyAuth(check_api_key)
+
+def auth_api_key(key, domain):
+    """Ověř API klíč a doménu existujícím auth_api_key (výsledek z cache do TTL)"""
+    return api_key_auth.authenticate(key, domain)
+
 COUNTY_LIST = [
     "Antrim", "Carlow", "Cavan", "Clare", "Cork", "Donegal", "Down", "Dublin",
     "Fermanagh", "Galway", "Kerry", "Kildare", "Kilkenny", "Laoighis", "Laois",
@@ -64,178 +137,568 @@ COUNTY_LIST = [
     "Westmeath", "Wexford", "Wicklow"
 ]
 
-def get_date_range():
-    """Získej rozsah dat pro dotazy - použij existující logiku"""
-    date_on = datetime.today()
-    years_ago = date_on - relativedelta(years=3)
-    last_year = date_on - relativedelta(years=1)
+# Stránkování přes search_after - celý rozsah dat bez limitu 5000 záznamů
+ES_STREAM_FETCH = os.getenv("PMX_ES_STREAM", "1") == "1"
+ES_PAGE_SIZE = int(os.getenv("PMX_ES_PAGE_SIZE", "1000"))
+
+# Zdroj dat pro /api/pmx/*: "elasticsearch" (živě), "materialized" (pmx_aggregates)
+# nebo "records" (součty z pmx_records přes pokrývající indexy)
+DATA_SOURCE = os.getenv("PMX_DATA_SOURCE", "elasticsearch")
+STORED_READERS = {"materialized": read_materialized_results, "records": read_record_results}
+
+# Agregace county × beds přímo v Elasticsearch místo stahování záznamů
+ES_AGG_PUSHDOWN = os.getenv("PMX_ES_AGG_PUSHDOWN", "0") == "1"
+
+# Inkrementální engine místo přepočtu celého okna při každém dotazu
+AGG_ENGINE = os.getenv("PMX_AGG_ENGINE", "1") == "1"
+ENGINE_REFRESH_INTERVAL = float(os.getenv("PMX_ENGINE_REFRESH_INTERVAL", "900"))
+ENGINE_REFRESH_MONTHS = int(os.getenv("PMX_ENGINE_REFRESH_MONTHS", "2"))
+
+# Odstranění outlierů - 5% a 95% percentil
+OUTLIER_TRIM = (0.05, 0.95)
+
+ES_SOURCE_FIELDS = [
+    "saleDate", "county", "area", "region", "rawAddress", "price",
+    "beds", "id", "sqrMetres", "location", "marketType"
+]
+
+# Agregacím stačí tato pole - menší _source i menší zpracované záznamy
+AGGREGATION_SOURCE_FIELDS = ["saleDate", "county", "area", "region", "price", "beds"]
+
+def build_query_body(market_type, import_date_from, import_date_to, source_fields=ES_SOURCE_FIELDS):
+    """Sestav dotaz na jeden typ trhu v daném rozsahu dat"""
+    return {
+        "_source": {
+            "include": list(source_fields)
+        },
+        "query": {
+            "bool": {
+                "must": [{"match": {"marketType": market_type}}],
+                "filter": [{
+                    "range": {
+                        "saleDate": {
+                            "gte": import_date_from.strftime("%Y-%m-%d"),
+                            "lte": import_date_to.strftime("%Y-%m-%d")
+                        }
+                    }
+                }]
+            }
+        }
+    }
+
+def search_upstream(query_body, size):
+    """Jeden dotaz na ippi.io přes breaker, měřený jako fáze es_fetch"""
+    with stage_timer("es_fetch"):
+        results = upstream_breaker.call(elasticsearch_manager.search_elasticsearch, query_body, size=size)
+    
+    if results and "hits" in results and "hits" in results["hits"]:
+        HITS_FETCHED.inc(len(results["hits"]["hits"]))
+    return results
+
+def stream_elasticsearch_hits(market_type="Residential Sale", page_size=ES_PAGE_SIZE, source_fields=ES_SOURCE_FIELDS,
+                              date_from=None, date_to=None, search_after=None, county=None):
+    """Generátor, který postupně projde všechny záznamy pomocí search_after
     
-    import_date_from = years_ago.replace(day=1)
-    next_month = date_on.replace(day=28) + timedelta(days=4)
-    import_date_to = next_month - timedelta(days=next_month.day)
-    next_month = last_year.replace(day=28) + timedelta(days=4)
-    last_year_end_date = next_month - timedelta(days=next_month.day)
+    V paměti je vždy jen jedna stránka výsledků, takže spotřeba nezávisí
+    na celkovém počtu záznamů v rozsahu. date_from/date_to (a county) zúží
+    okno, search_after (hodnoty sort posledního hitu) naváže na přerušený průchod.
+    """
+    import_date_from, import_date_to, _ = get_date_range()
+    if date_from is not None:
+        import_date_from = date_from
+    if date_to is not None:
+        import_date_to = date_to
     
-    return import_date_from, import_date_to, last_year_end_date
+    query_body = build_query_body(market_type, import_date_from, import_date_to, source_fields)
+    if county is not None:
+        query_body["query"]["bool"]["filter"].append({"term": {COUNTY_FIELD: county}})
+    # Stabilní řazení je nutné pro search_after - id rozhoduje při stejném datu
+    query_body["sort"] = [{"saleDate": "asc"}, {"id": "asc"}]
+    if search_after:
+        query_body["search_after"] = list(search_after)
+    
+    while True:
+        results = search_upstream(query_body, size=page_size)
+        
+        if not results or "hits" not in results or "hits" not in results["hits"]:
+            return
+        
+        hits = results["hits"]["hits"]
+        yield from hits
+        
+        if len(hits) < page_size:
+            return
+        
+        search_after = hits[-1].get("sort")
+        if not search_after:
+            print("⚠️ Elasticsearch nevrátil hodnoty sort - stránkování ukončeno")
+            return
+        query_body["search_after"] = search_after
+
+def fetch_slice_specs(date_from, date_to, slicing=FETCH_SLICE):
+    """Úseky okna pro souběžné stahování - po měsících, nebo po krajích"""
+    if slicing == "county":
+        return [{"date_from": date_from, "date_to": date_to, "county": county} for county in COUNTY_LIST]
+    return [
+        {"date_from": slice_from, "date_to": slice_to}
+        for slice_from, slice_to in month_slices(date_from, date_to, FETCH_SLICE_MONTHS)
+    ]
+
+def stream_elasticsearch_slices(market_type="Residential Sale", source_fields=ES_SOURCE_FIELDS, date_from=None,
+                                fanout=FETCH_FANOUT, slicing=FETCH_SLICE):
+    """Celé okno přes souběžné kurzory úseků slité do jednoho generátoru
+    
+    Každý úsek se při chybě zopakuje zvlášť od posledního předaného hitu,
+    dokud breaker ippi.io zůstává zavřený. Pořadí hitů mezi úseky není zaručené.
+    """
+    import_date_from, import_date_to, _ = get_date_range()
+    if date_from is not None:
+        import_date_from = date_from
+    
+    def stream_slice(search_after=None, **spec):
+        return stream_elasticsearch_hits(
+            market_type, source_fields=source_fields, search_after=search_after, **spec
+        )
+    
+    return fetch_slices(
+        fetch_slice_specs(import_date_from, import_date_to, slicing), stream_slice,
+        fanout=fanout, retryable=lambda error: upstream_breaker.state == CLOSED
+    )
+
+def count_elasticsearch_hits(market_type="Residential Sale", date_from=None, date_to=None):
+    """Přesný počet záznamů v okně (size: 0) - pro průběh a ETA importu"""
+    import_date_from, import_date_to, _ = get_date_range()
+    query_body = build_query_body(market_type, date_from or import_date_from, date_to or import_date_to, [])
+    query_body["track_total_hits"] = True
+    
+    results = search_upstream(query_body, size=0)
+    total = (results or {}).get("hits", {}).get("total", 0)
+    return int(total["value"] if isinstance(total, dict) else total)
 
-async def query_elasticsearch_with_existing_code(market_type="Residential Sale", max_size=5000):
-    """Použij existující Elasticsearch kód pro dotazy"""
+def fetch_elasticsearch_hits(market_type="Residential Sale", max_size=5000, stream=ES_STREAM_FETCH,
+                             source_fields=ES_SOURCE_FIELDS, date_from=None, strict=False):
+    """Stáhni záznamy z Elasticsearch (blokující)
+    
+    Při stream=True vrací generátor přes celý rozsah dat (max_size se ignoruje),
+    jinak jeden dotaz omezený na max_size záznamů. Se strict=True se chyba
+    vyhodí místo prázdného výsledku, aby ji volající odlišil od prázdného okna.
+    """
     try:
         if not elasticsearch_manager:
             print("❌ Elasticsearch manager není dostupný")
+            if strict:
+                raise UpstreamUnavailable("Elasticsearch manager není dostupný")
             return []
         
+        if stream:
+            if FETCH_FANOUT > 1:
+                hits = stream_elasticsearch_slices(market_type, source_fields=source_fields, date_from=date_from)
+            else:
+                hits = stream_elasticsearch_hits(market_type, source_fields=source_fields, date_from=date_from)
+            first_hit = next(hits, None)
+            
+            if first_hit is None:
+                print("⚠️ Žádné výsledky z Elasticsearch")
+                return []
+            
+            return itertools.chain([first_hit], hits)
+        
         import_date_from, import_date_to, _ = get_date_range()
+        if date_from is not None:
+            import_date_from = date_from
         
         # Použij existující metody z ElasticsearchManager
-        query_body = {
-            "_source": {
-                "include": [
-                    "saleDate", "county", "area", "region", "rawAddress", "price",
-                    "beds", "id", "sqrMetres", "location", "marketType"
-                ]
-            },
-            "query": {
-                "bool": {
-                    "must": [{"match": {"marketType": market_type}}],
-                    "filter": [{
-                        "range": {
-                            "saleDate": {
-                                "gte": import_date_from.strftime("%Y-%m-%d"),
-                                "lte": import_date_to.strftime("%Y-%m-%d")
-                            }
-                        }
-                    }]
-                }
-            }
-        }
+        query_body = build_query_body(market_type, import_date_from, import_date_to, source_fields)
         
         # Použij existující metodu pro dotaz
-        results = elasticsearch_manager.search_elasticsearch(query_body, size=max_size)
+        results = search_upstream(query_body, size=max_size)
         
         if results and "hits" in results and "hits" in results["hits"]:
             return results["hits"]["hits"]
         else:
             print("⚠️ Žádné výsledky z Elasticsearch")
             return []
-            
+    
+    except UpstreamUnavailable:
+        # Obnova musí poznat výpadek od prázdného výsledku a ponechat stará data
+        raise
     except Exception as e:
         print(f"❌ Chyba při dotazu na Elasticsearch: {str(e)}")
+        if strict:
+            raise
         return []
 
-def process_elasticsearch_data_with_existing_logic(raw_data):
-    """Zpracuj data pomocí existující logiky"""
-    processed = []
+def query_county_beds_aggregation(market_type="Residential Sale", trim_outliers=True):
+    """Spočítej county × beds agregace v Elasticsearch (size: 0)
     
-    for item in raw_data:
-        try:
-            source = item.get("_source", {})
+    Při trim_outliers se nejdřív zjistí globální 5. a 95. percentil ceny
+    a hlavní agregace pak počítá jen s cenami mezi nimi - stejně jako
+    calculate_averages_and_yoy_with_existing_logic.
+    """
+    try:
+        if not elasticsearch_manager:
+            print("❌ Elasticsearch manager není dostupný")
+            return []
+        
+        import_date_from, import_date_to, _ = get_date_range()
+        price_gt, price_lt = 0, None
+        
+        if trim_outliers:
+            query_body = build_price_percentiles_body(market_type, import_date_from, import_date_to, COUNTY_LIST)
+            results = search_upstream(query_body, size=0)
             
-            # Validace dat - použij existující logiku
-            beds = source.get("beds")
-            if not beds or beds <= 0:
-                continue
-                
-            beds = int(beds)
-            if beds > 5:
-                beds = 6
-                
-            price = source.get("price")
-            if not price or price <= 0:
-                continue
-                
-            price = float(price)
-            county = source.get("county", "")
+            if not results or "aggregations" not in results:
+                print("⚠️ Žádné výsledky z Elasticsearch")
+                return []
             
-            if county not in COUNTY_LIST:
+            price_gt, price_lt = parse_price_percentiles(results["aggregations"])
+            if price_gt is None or price_lt is None:
+                return []
+        
+        query_body = build_county_beds_body(
+            market_type, import_date_from, import_date_to, COUNTY_LIST,
+            price_gt=price_gt, price_lt=price_lt
+        )
+        results = search_upstream(query_body, size=0)
+        
+        if not results or "aggregations" not in results:
+            print("⚠️ Žádné výsledky z Elasticsearch")
+            return []
+        
+        return parse_county_beds_buckets(results["aggregations"])
+        
+    except Exception as e:
+        print(f"❌ Chyba při agregačním dotazu na Elasticsearch: {str(e)}")
+        return []
+
+def process_elasticsearch_data_with_existing_logic(raw_data, extra_fields=EXTRA_FIELDS):
+    """Zpracuj data pomocí existující logiky
+    
+    Validace (ložnice > 0, 5+ → 6, cena > 0, kraj z COUNTY_LIST) běží
+    vektorově nad sloupci, výsledkem je DataFrame s typovanými sloupci.
+    """
+    return process_hits_columnar(raw_data, COUNTY_LIST, extra_fields=extra_fields)
+
+def load_processed_records(market_type="Residential Sale", max_size=5000, stream=ES_STREAM_FETCH,
+                           source_fields=AGGREGATION_SOURCE_FIELDS, date_from=None, strict=False):
+    """Stáhni a zpracuj záznamy jednoho typu trhu (blokující)"""
+    raw_data = fetch_elasticsearch_hits(market_type, max_size, stream, source_fields, date_from, strict)
+    extra_fields = {field: default for field, default in EXTRA_FIELDS.items() if field in source_fields}
+    return process_elasticsearch_data_with_existing_logic(raw_data, extra_fields)
+
+async def get_processed_records(market_type="Residential Sale", max_size=5000, stream=ES_STREAM_FETCH,
+                                source_fields=AGGREGATION_SOURCE_FIELDS):
+    """Zpracované záznamy - souběžní volající se stejným klíčem sdílí jeden fetch
+    
+    Klíč tvoří typ trhu, datové okno a stahovaná pole. Vrácený DataFrame je
+    sdílený mezi volajícími a nesmí se měnit.
+    """
+    import_date_from, import_date_to, _ = get_date_range()
+    key = (
+        "records", market_type,
+        import_date_from.strftime("%Y-%m-%d"), import_date_to.strftime("%Y-%m-%d"),
+        tuple(source_fields), None if stream else max_size
+    )
+    return await upstream_flight.do(
+        key, lambda: workers.run("fetch", load_processed_records, market_type, max_size, stream, source_fields)
+    )
+
+def refresh_aggregation_engine(market_type="Residential Sale"):
+    """Obnov agregační engine a snapshot typu trhu (blokující)
+    
+    Poprvé se načte celé okno, potom už jen posledních ENGINE_REFRESH_MONTHS
+    měsíců (nejméně od konce uloženého snapshotu), které se v enginu i ve
+    snapshotu nahradí - cena obnovy odpovídá novým datům.
+    """
+    import_date_from, import_date_to, _ = get_date_range()
+    keep_snapshot = market_type in SNAPSHOT_MARKET_TYPES and snapshot_available()
+    
+    if aggregation_engine.has_data(market_type) and (not keep_snapshot or market_type in snapshot_records):
+        refresh_from = import_date_to.replace(day=1) - relativedelta(months=ENGINE_REFRESH_MONTHS - 1)
+        meta = snapshot_meta.get(market_type)
+        if meta:
+            # Po startu ze starého snapshotu se dotáhnou i měsíce, které v něm chybí
+            covered_to = datetime.strptime(meta["date_to"], "%Y-%m-%d").replace(day=1)
+            refresh_from = max(min(refresh_from, covered_to), import_date_from)
+    else:
+        refresh_from = import_date_from
+    
+    source_fields = ES_SOURCE_FIELDS if keep_snapshot else AGGREGATION_SOURCE_FIELDS
+    # Výpadek ippi.io se vyhodí a engine i snapshot si ponechají poslední data
+    records = load_processed_records(
+        market_type, source_fields=source_fields, date_from=refresh_from, strict=True
+    )
+    
+    if records.empty:
+        # Dotaz prošel, jen nepřibyly dokumenty - data jsou aktuální
+        aggregation_engine.mark_refreshed(market_type)
+        print(f"ℹ️ Žádná nová data pro {market_type} - engine beze změny")
+        return 0
+    
+    with snapshot_lock:
+        if keep_snapshot:
+            window = splice_records(snapshot_records.get(market_type), records, import_date_from, refresh_from)
+            snapshot_meta[market_type] = write_snapshot(market_type, window, import_date_from, import_date_to)
+            snapshot_records[market_type] = window
+        
+        ingested = aggregation_engine.replace_months(market_type, records, month_key(refresh_from))
+    aggregation_engine.prune(market_type, month_key(import_date_from))
+    aggregate_cache.invalidate(market_type)
+    print(f"✅ Engine obnoven: {market_type} od {refresh_from:%Y-%m} ({ingested} záznamů)")
+    return ingested
+
+async def revalidate_engine(market_type="Residential Sale"):
+    """Obnov engine; při výpadku ippi.io zůstanou poslední dobrá data"""
+    try:
+        await upstream_flight.do(
+            ("engine", market_type),
+            lambda: workers.run("refresh", refresh_aggregation_engine, market_type)
+        )
+    except Exception as e:
+        age = aggregation_engine.age(market_type)
+        if age is None:
+            print(f"❌ Načtení {market_type} selhalo: {str(e)}")
+        else:
+            print(f"⚠️ Obnova {market_type} selhala, data jsou stará {age:.0f} s: {str(e)}")
+
+def schedule_revalidation(market_type):
+    """Spusť obnovu na pozadí - požadavek na ni nečeká"""
+    task = asyncio.ensure_future(revalidate_engine(market_type))
+    background_refreshes.add(task)
+    task.add_done_callback(background_refreshes.discard)
+
+def revalidate_if_stale(market_type):
+    """Odpověď z cache - jen naplánuj obnovu, pokud jsou data enginu stará"""
+    age = aggregation_engine.age(market_type)
+    if AGG_ENGINE and age is not None and age > ENGINE_REFRESH_INTERVAL:
+        schedule_revalidation(market_type)
+
+async def ensure_engine_fresh(market_type="Residential Sale"):
+    """Stale-while-revalidate: starší data se vrátí hned a obnoví se na pozadí
+    
+    Čekat se musí jen na úplně první načtení, kdy engine nemá žádná data.
+    """
+    age = aggregation_engine.age(market_type)
+    
+    if age is None:
+        await revalidate_engine(market_type)
+    elif age > ENGINE_REFRESH_INTERVAL:
+        schedule_revalidation(market_type)
+    
+    return aggregation_engine.has_data(market_type)
+
+async def engine_refresh_loop():
+    """Udržuj načtené typy trhu čerstvé i bez provozu"""
+    while True:
+        await asyncio.sleep(ENGINE_CHECK_INTERVAL)
+        
+        for market_type in aggregation_engine.stats()["market_types"]:
+            age = aggregation_engine.age(market_type)
+            if age is not None and age > ENGINE_REFRESH_INTERVAL:
+                await revalidate_engine(market_type)
+
+@app.on_event("startup")
+async def start_engine_refresher():
+    global engine_refresh_task
+    
+    if AGG_ENGINE:
+        engine_refresh_task = asyncio.create_task(engine_refresh_loop())
+
+@app.on_event("shutdown")
+async def stop_engine_refresher():
+    if engine_refresh_task is not None:
+        engine_refresh_task.cancel()
+
+def data_age(market_type="Residential Sale"):
+    """Stáří dat, ze kterých se odpovídá (None pokud není známé)"""
+    if AGG_ENGINE and aggregation_engine.has_data(market_type):
+        return aggregation_engine.age(market_type)
+    return snapshot_age(market_type)
+
+async def probe_upstream():
+    """Sonda ippi.io pro prober - přes breaker, takže při výpadku nebuší do upstreamu"""
+    if not elasticsearch_manager:
+        return False
+    return await asyncio.to_thread(
+        upstream_breaker.call, elasticsearch_manager.search_elasticsearch, PROBE_QUERY, size=0
+    )
+
+upstream_prober = UpstreamProber(probe_upstream)
+
+@app.on_event("startup")
+async def start_upstream_prober():
+    upstream_prober.start()
+
+@app.on_event("shutdown")
+async def stop_upstream_prober():
+    upstream_prober.stop()
+
+@app.middleware("http")
+async def add_data_age_headers(request, call_next):
+    """X-Data-Age / X-Data-Stale / X-Upstream-State u datových endpointů"""
+    response = await call_next(request)
+    path = request.url.path
+    
+    if path.startswith("/api/pmx/") or path.startswith("/api/eval/"):
+        market_type = "Residential Rent" if path == "/api/pmx/rent" else "Residential Sale"
+        age = data_age(market_type)
+        if age is not None:
+            response.headers["X-Data-Age"] = str(int(age))
+            response.headers["X-Data-Stale"] = "1" if age > ENGINE_REFRESH_INTERVAL else "0"
+        response.headers["X-Upstream-State"] = upstream_breaker.state
+    
+    return response
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    """Doba odpovědi podle šablony cesty (ne konkrétní URL) a statusu"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            endpoint=getattr(route, "path", "unmatched"),
+            status=str(status)
+        )
+
+@app.middleware("http")
+async def profile_admin_requests(request, call_next):
+    """Profil jednoho požadavku na vyžádání admina (hlavička X-PMX-Profile)"""
+    if not wants_profile(request):
+        return await call_next(request)
+    return await profile_request(request, call_next)
+
+@app.on_event("startup")
+async def start_profiler():
+    if PROFILER_ENABLED:
+        profiler.start()
+
+@app.on_event("shutdown")
+async def stop_profiler():
+    profiler.stop()
+
+def warm_from_snapshot(market_type):
+    """Načti snapshot z disku a naplň z něj engine (blokující)"""
+    if market_type in snapshot_records:
+        # Obnova z Elasticsearch doběhla dřív - snapshot na disku je starší
+        return 0
+    
+    loaded = read_snapshot(market_type)
+    if loaded is None:
+        return 0
+    
+    records, meta = loaded
+    import_date_from, _, _ = get_date_range()
+    
+    with snapshot_lock:
+        if market_type in snapshot_records or aggregation_engine.has_data(market_type):
+            # Obnova z Elasticsearch doběhla během čtení - má novější data
+            return 0
+        
+        snapshot_records[market_type] = records
+        snapshot_meta[market_type] = meta
+        
+        # Engine zdědí stáří snapshotu, aby se čerstvější měsíce dotáhly obnovou
+        ingested = aggregation_engine.replace_months(
+            market_type, records, month_key(import_date_from), refreshed_at=meta["created_at"]
+        )
+    aggregation_engine.prune(market_type, month_key(import_date_from))
+    print(f"⚡ Snapshot načten: {market_type} ({meta['records']} záznamů z {meta['date_to']})")
+    return ingested
+
+def snapshot_age(market_type):
+    """Stáří snapshotu v sekundách (None pokud žádný není)"""
+    meta = snapshot_meta.get(market_type)
+    return time.time() - meta["created_at"] if meta else None
+
+async def snapshot_refresh_loop():
+    """Na pozadí načti snapshoty z disku a pravidelně je obnovuj z Elasticsearch
+    
+    Načtení z disku má vlastní klíč - první požadavek se tak nepřipojí
+    k načtení chybějícího snapshotu místo skutečného stažení dat.
+    """
+    await asyncio.gather(*(
+        upstream_flight.do(("snapshot", market_type), lambda mt=market_type: workers.run("snapshot", warm_from_snapshot, mt))
+        for market_type in SNAPSHOT_MARKET_TYPES
+    ), return_exceptions=True)
+    
+    while True:
+        for market_type in SNAPSHOT_MARKET_TYPES:
+            age = snapshot_age(market_type)
+            if age is not None and age < SNAPSHOT_REFRESH_INTERVAL:
                 continue
-                
-            processed.append({
-                "county": county,
-                "beds": beds,
-                "price": price,
-                "area": source.get("area", ""),
-                "region": source.get("region", ""),
-                "saleDate": source.get("saleDate", ""),
-                "rawAddress": source.get("rawAddress", ""),
-                "sqrMetres": source.get("sqrMetres", 0),
-                "location": source.get("location", ""),
-                "id": source.get("id", "")
-            })
             
-        except Exception as e:
-            continue
+            # Stejný klíč jako obnova enginu - obě potřeby pokryje jedno stažení
+            await revalidate_engine(market_type)
+        
+        await asyncio.sleep(SNAPSHOT_CHECK_INTERVAL)
+
+@app.on_event("startup")
+async def start_snapshots():
+    """Spusť načtení a obnovu snapshotů - start aplikace na ně nečeká"""
+    global snapshot_task
     
-    return processed
+    if not snapshot_available():
+        print("ℹ️ Snapshoty vypnuté (PMX_SNAPSHOT=0 nebo chybí pyarrow)")
+        return
+    
+    snapshot_task = asyncio.create_task(snapshot_refresh_loop())
+
+@app.on_event("shutdown")
+async def stop_snapshots():
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+
+async def get_window_records(market_type="Residential Sale", **kwargs):
+    """Zpracované záznamy okna - ze snapshotu, jinak z Elasticsearch"""
+    records = snapshot_records.get(market_type)
+    if records is not None:
+        return records
+    return await get_processed_records(market_type, **kwargs)
+
+async def get_county_beds_rows(market_type="Residential Sale", trim_outliers=True):
+    """County × beds agregace z Elasticsearch - se slučováním souběžných dotazů"""
+    import_date_from, import_date_to, _ = get_date_range()
+    key = (
+        "aggregation", market_type,
+        import_date_from.strftime("%Y-%m-%d"), import_date_to.strftime("%Y-%m-%d"),
+        trim_outliers
+    )
+    return await upstream_flight.do(
+        key, lambda: workers.run("fetch", query_county_beds_aggregation, market_type, trim_outliers)
+    )
 
-def calculate_averages_and_yoy_with_existing_logic(data):
-    """Vypočítej průměry a YoY změny pomocí existující logiky"""
-    if not data:
+def calculate_averages_and_yoy_with_existing_logic(data=None, market_type="Residential Sale", entity="county"):
+    """Vypočítej průměry a YoY změny pomocí existující logiky
+    
+    Bez data se výsledek vezme z kostky postavené nad měsíčními agregacemi
+    enginu (outliery se ořežou podle přesných kvantilů ze sloučených histogramů).
+    entity je úroveň výsledku - county, region nebo area.
+    """
+    if data is None:
+        import_date_from, import_date_to, _ = get_date_range()
+        cube = aggregation_engine.rollup(
+            market_type, month_key(import_date_from), month_key(import_date_to),
+            datetime.now().year, trim=OUTLIER_TRIM
+        )
+        return cube.results(entity, 'avg'), cube.results(entity, 'yoy')
+    
+    if len(data) == 0:
         return {}, {}
     
     df = pd.DataFrame(data)
     
     # Převeď datum
     df['saleDate'] = pd.to_datetime(df['saleDate'])
-    df['month_year'] = df['saleDate'].dt.to_period('M')
-    
-    # Odstraň outliers (5% - 95% percentil) - existující logika
-    condition = (df['price'] > df['price'].quantile(0.05)) & (df['price'] < df['price'].quantile(0.95))
-    df_clean = df.loc[condition]
-    
-    # Seskup podle krajů a ložnic
-    grouped = df_clean.groupby(['county', 'beds'])['price'].agg(['mean', 'count']).reset_index()
-    
-    # Vytvoř výsledky pro průměry
-    avg_results = {}
-    for _, row in grouped.iterrows():
-        county = row['county']
-        if county not in avg_results:
-            avg_results[county] = []
-        
-        avg_results[county].append({
-            'county': county,
-            'beds': int(row['beds']),
-            'avg': float(row['mean'])
-        })
-    
-    # Pro YoY - porovnej s loňskými daty
-    current_year = datetime.now().year
-    last_year = current_year - 1
-    
-    current_year_data = df_clean[df_clean['saleDate'].dt.year == current_year]
-    last_year_data = df_clean[df_clean['saleDate'].dt.year == last_year]
-    
-    yoy_results = {}
-    if not current_year_data.empty and not last_year_data.empty:
-        current_grouped = current_year_data.groupby(['county', 'beds'])['price'].mean().reset_index()
-        last_grouped = last_year_data.groupby(['county', 'beds'])['price'].mean().reset_index()
-        
-        for _, current_row in current_grouped.iterrows():
-            county = current_row['county']
-            beds = current_row['beds']
-            current_price = current_row['price']
-            
-            # Najdi odpovídající loňský záznam
-            last_row = last_grouped[
-                (last_grouped['county'] == county) & 
-                (last_grouped['beds'] == beds)
-            ]
-            
-            if not last_row.empty:
-                last_price = last_row.iloc[0]['price']
-                yoy_change = ((current_price - last_price) / last_price) * 100
-                
-                if county not in yoy_results:
-                    yoy_results[county] = []
-                
-                yoy_results[county].append({
-                    'county': county,
-                    'beds': int(beds),
-                    'yoy': round(yoy_change, 1)
-                })
     
-    return avg_results, yoy_results
+    # Odstraň outliers (5% - 95% percentil) a spočítej průměry i YoY
+    return summarize_records(df, datetime.now().year, entity, trim=OUTLIER_TRIM)
 
 @app.get("/")
 async def root():
@@ -248,6 +711,67 @@ async def root():
         "elasticsearch_manager": "available" if elasticsearch_manager else "unavailable"
     }
 
+async def load_all_data(entity="county", version="avg"):
+    """Všechna data podle entity a verze (bez autentifikace)
+    
+    Sdílí ho /api/pmx/all, /average a /yoy - klíč ověřuje jen endpoint.
+    """
+    level = normalize_level(entity)
+    if level is None:
+        raise HTTPException(status_code=400, detail=f"Neznámá entita: {entity}")
+    
+    import_date_from, import_date_to, _ = get_date_range()
+    cached = aggregate_cache.get(make_key("Residential Sale", import_date_from, import_date_to, level, version))
+    if cached is not MISSING:
+        revalidate_if_stale("Residential Sale")
+        return cached
+    
+    if DATA_SOURCE in STORED_READERS:
+        avg_results, yoy_results = await workers.run(
+            "fetch", STORED_READERS[DATA_SOURCE], "Residential Sale", import_date_from, import_date_to, level
+        )
+        
+        if not avg_results:
+            return {"error": "Žádná uložená data v pmx_report", "data": {}}
+    elif ES_AGG_PUSHDOWN and level == "county":
+        # Agregace v Elasticsearch je jen po krajích, region/oblast jdou přes kostku
+        print("🔍 Agreguji data přímo v ippi.io Elasticsearch...")
+        rows = await get_county_beds_rows("Residential Sale")
+        
+        if not rows:
+            return {"error": "Žádná data z ippi.io", "data": {}}
+        
+        avg_results = rows_to_avg_results(rows)
+        yoy_results = rows_to_yoy_results(rows, datetime.now().year)
+    elif AGG_ENGINE:
+        if not await ensure_engine_fresh("Residential Sale"):
+            return {"error": "Žádná data z ippi.io", "data": {}}
+        
+        avg_results, yoy_results = await workers.run(
+            "aggregate", calculate_averages_and_yoy_with_existing_logic, None, "Residential Sale", level
+        )
+    else:
+        print(f"🔍 Dotazuji ippi.io pomocí existujícího kódu...")
+        processed_data = await get_window_records("Residential Sale")
+        
+        if processed_data.empty:
+            return {"error": "Žádná data z ippi.io", "data": {}}
+        
+        print(f"✅ Zpracováno {len(processed_data)} skutečných záznamů pomocí existující logiky")
+        
+        avg_results, yoy_results = await workers.run_cpu(
+            "aggregate", summarize_records, processed_data, datetime.now().year, level, OUTLIER_TRIM
+        )
+    
+    # Ulož obě verze - avg i yoy vznikají ze stejného výpočtu
+    aggregate_cache.set(make_key("Residential Sale", import_date_from, import_date_to, level, "avg"), avg_results)
+    aggregate_cache.set(make_key("Residential Sale", import_date_from, import_date_to, level, "yoy"), yoy_results)
+    
+    if version == "yoy":
+        return yoy_results
+    else:
+        return avg_results
+
 @app.get("/api/pmx/all")
 async def get_all_data(
     key: str = Query("test_api_key_123", description="API klíč"),
@@ -260,27 +784,21 @@ async def get_all_data(
         # Autentifikace pomocí existujícího systému
         auth_api_key(key=key, domain=domain)
         
-        print(f"🔍 Dotazuji ippi.io pomocí existujícího kódu...")
-        raw_data = await query_elasticsearch_with_existing_code("Residential Sale")
-        
-        if not raw_data:
-            return {"error": "Žádná data z ippi.io", "data": {}}
-        
-        processed_data = process_elasticsearch_data_with_existing_logic(raw_data)
-        print(f"✅ Zpracováno {len(processed_data)} skutečných záznamů pomocí existující logiky")
-        
-        avg_results, yoy_results = calculate_averages_and_yoy_with_existing_logic(processed_data)
-        
-        if version == "yoy":
-            return yoy_results
-        else:
-            return avg_results
+        return await load_all_data(entity, version)
         
     except HTTPException:
         raise
     except Exception as e:
         return {"error": f"Chyba při načítání dat: {str(e)}", "data": {}}
 
+def select_entity(county, region=None, area=None):
+    """Nejpodrobnější zadaná úroveň → (level, entity) pro /average a /yoy"""
+    if area and area != "All":
+        return "area", area
+    if region and region != "All":
+        return "region", region
+    return "county", county
+
 @app.get("/api/pmx/average")
 async def get_average_prices(
     key: str = Query("test_api_key_123"),
@@ -295,12 +813,17 @@ async def get_average_prices(
         auth_api_key(key=key, domain=domain)
         
         # Získej všechna data a filtruj
-        all_data = await get_all_data(key, domain, "county", "avg")
+        level, entity = select_entity(county, region, area)
+        all_data = await load_all_data(level, "avg")
         
-        if county not in all_data:
+        if entity not in all_data:
             return []
         
-        result = all_data[county]
+        result = all_data[entity]
+        
+        # Region/oblast může zasahovat do více krajů
+        if level != "county":
+            result = [item for item in result if item['county'] == county]
         
         # Filtruj podle ložnic
         if beds:
@@ -328,12 +851,17 @@ async def get_yoy_changes(
         auth_api_key(key=key, domain=domain)
         
         # Získej YoY data
-        all_data = await get_all_data(key, domain, "county", "yoy")
+        level, entity = select_entity(county, region, area)
+        all_data = await load_all_data(level, "yoy")
         
-        if county not in all_data:
+        if entity not in all_data:
             return []
         
-        result = all_data[county]
+        result = all_data[entity]
+        
+        # Region/oblast může zasahovat do více krajů
+        if level != "county":
+            result = [item for item in result if item['county'] == county]
         
         # Filtruj podle ložnic
         if beds:
@@ -357,65 +885,63 @@ async def get_rent_data(
     try:
         auth_api_key(key=key, domain=domain)
         
-        print("🏠 Dotazuji nájemní data pomocí existujícího kódu")
-        raw_data = await query_elasticsearch_with_existing_code("Residential Rent", max_size=3000)
-        
-        if not raw_data:
-            return []
-        
-        processed_data = process_elasticsearch_data_with_existing_logic(raw_data)
-        
-        if not processed_data:
-            return []
+        import_date_from, import_date_to, _ = get_date_range()
+        cache_key = make_key("Residential Rent", import_date_from, import_date_to, "county", version)
+        cached = aggregate_cache.get(cache_key)
+        if cached is not MISSING:
+            revalidate_if_stale("Residential Rent")
+            return cached
         
-        # Seskup podle krajů a ložnic
-        df = pd.DataFrame(processed_data)
+        if DATA_SOURCE in STORED_READERS or ES_AGG_PUSHDOWN:
+            if DATA_SOURCE in STORED_READERS:
+                avg_grouped, yoy_grouped = await workers.run(
+                    "fetch", STORED_READERS[DATA_SOURCE], "Residential Rent", import_date_from, import_date_to,
+                    yoy_key='avg_yoy'
+                )
+                grouped = yoy_grouped if version == "yoy" else avg_grouped
+            else:
+                print("🏠 Agreguji nájemní data přímo v ippi.io Elasticsearch")
+                rows = await get_county_beds_rows("Residential Rent", trim_outliers=False)
+                
+                if version == "yoy":
+                    grouped = rows_to_yoy_results(rows, datetime.now().year, key='avg_yoy')
+                else:
+                    grouped = rows_to_avg_results(rows)
+            
+            result = [item for items in grouped.values() for item in items]
+            if result:
+                aggregate_cache.set(cache_key, result)
+            return result
         
-        if version == "yoy":
-            # Vypočítej YoY pro nájmy
-            df['saleDate'] = pd.to_datetime(df['saleDate'])
-            current_year = datetime.now().year
-            last_year = current_year - 1
+        if AGG_ENGINE:
+            if not await ensure_engine_fresh("Residential Rent"):
+                return []
             
-            current_data = df[df['saleDate'].dt.year == current_year]
-            last_data = df[df['saleDate'].dt.year == last_year]
+            avg_frame, yoy_frame = await workers.run(
+                "aggregate", aggregation_engine.averages_and_yoy, "Residential Rent",
+                month_key(import_date_from), month_key(import_date_to), datetime.now().year
+            )
+        else:
+            print("🏠 Dotazuji nájemní data pomocí existujícího kódu")
+            processed_data = await get_window_records("Residential Rent", max_size=3000)
             
-            if current_data.empty or last_data.empty:
+            if processed_data.empty:
                 return []
             
-            current_grouped = current_data.groupby(['county', 'beds'])['price'].mean().reset_index()
-            last_grouped = last_data.groupby(['county', 'beds'])['price'].mean().reset_index()
-            
-            result = []
-            for _, current_row in current_grouped.iterrows():
-                county = current_row['county']
-                beds = current_row['beds']
-                current_price = current_row['price']
-                
-                last_row = last_grouped[
-                    (last_grouped['county'] == county) & 
-                    (last_grouped['beds'] == beds)
-                ]
-                
-                if not last_row.empty:
-                    last_price = last_row.iloc[0]['price']
-                    yoy_change = ((current_price - last_price) / last_price) * 100
-                    
-                    result.append({
-                        'county': county,
-                        'beds': int(beds),
-                        'avg_yoy': round(yoy_change, 1)
-                    })
+            # Seskup podle krajů a ložnic
+            avg_frame, yoy_frame = await workers.run_cpu(
+                "aggregate", averages_and_yoy, processed_data, datetime.now().year
+            )
+        
+        if version == "yoy":
+            # YoY pro nájmy
+            result = frame_to_records(yoy_frame, 'yoy', 'avg_yoy')
         else:
             # Průměrné nájmy
-            grouped = df.groupby(['county', 'beds'])['price'].mean().reset_index()
-            result = []
-            for _, row in grouped.iterrows():
-                result.append({
-                    'county': row['county'],
-                    'beds': int(row['beds']),
-                    'avg': float(row['price'])
-                })
+            result = frame_to_records(avg_frame, 'avg')
+        
+        if result:
+            aggregate_cache.set(cache_key, result)
         
         return result
         
@@ -424,6 +950,17 @@ async def get_rent_data(
     except Exception as e:
         return {"error": f"Chyba při načítání rent dat: {str(e)}"}
 
+def filter_property_records(processed_data, area="All", limit=100):
+    """Záznamy pro /api/eval/property - filtr podle kraje/regionu/oblasti"""
+    if area != "All":
+        processed_data = processed_data[
+            (processed_data['county'] == area) |
+            (processed_data['region'] == area) |
+            (processed_data['area'] == area)
+        ]
+    
+    return records_to_dicts(processed_data.head(limit))  # Omez na 100 výsledků
+
 @app.get("/api/eval/property")
 async def get_property_details(
     key: str = Query("test_api_key_123"),
@@ -435,66 +972,170 @@ async def get_property_details(
         auth_api_key(key=key, domain=domain)
         
         print("🔍 Dotazuji detaily nemovitostí pomocí existujícího kódu")
-        raw_data = await query_elasticsearch_with_existing_code("Residential Sale", max_size=1000)
+        processed_data = await get_window_records(
+            "Residential Sale", max_size=1000, stream=False, source_fields=ES_SOURCE_FIELDS
+        )
         
-        if not raw_data:
+        if processed_data.empty:
             return []
         
-        processed_data = process_elasticsearch_data_with_existing_logic(raw_data)
-        
-        # Filtruj podle oblasti
-        if area != "All":
-            filtered_data = []
-            for prop in processed_data:
-                if (prop['county'] == area or 
-                    prop['region'] == area or 
-                    prop['area'] == area):
-                    filtered_data.append(prop)
-            processed_data = filtered_data
-        
-        return processed_data[:100]  # Omez na 100 výsledků
+        return await workers.run("process", filter_property_records, processed_data, area)
         
     except HTTPException:
         raise
     except Exception as e:
         return {"error": f"Chyba při načítání property dat: {str(e)}"}
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    try:
-        # Test připojení pomocí existujícího kódu
-        if elasticsearch_manager:
-            # Zkus jednoduchý dotaz
-            test_query = {
-                "query": {"match_all": {}},
-                "size": 1
+@app.get("/api/cache/stats")
+async def get_cache_stats(x_pmx_admin_token: str = Header(None)):
+    """Statistiky cache agregací a ověřování klíčů"""
+    require_admin(x_pmx_admin_token)
+    stats = aggregate_cache.stats()
+    stats["auth"] = api_key_auth.stats()
+    stats["upstream"] = upstream_breaker.stats()
+    return stats
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(
+    market_type: str = Query(None, description="Typ trhu, jinak celá cache"),
+    auth: bool = Query(False, description="Místo agregací zapomeň ověřené i odmítnuté API klíče"),
+    x_pmx_admin_token: str = Header(None),
+    x_pmx_api_key: str = Header(None)
+):
+    """Zneplatni cache agregací - volá import po načtení nových dat
+    
+    S auth=true (nebo hlavičkou X-PMX-Api-Key pro jeden klíč) se místo
+    agregací zapomenou výsledky ověření - zrušený klíč přestane platit
+    a nově vydaný začne platit hned, ne až po vypršení TTL.
+    """
+    require_admin(x_pmx_admin_token)
+    if auth or x_pmx_api_key:
+        removed = api_key_auth.invalidate(x_pmx_api_key)
+        print(f"🧹 Cache API klíčů zneplatněna ({removed} záznamů)")
+        return {"invalidated": removed, "scope": "auth"}
+    
+    removed = aggregate_cache.invalidate(market_type)
+    print(f"🧹 Cache zneplatněna ({removed} záznamů)")
+    return {"invalidated": removed}
+
+def readiness_report():
+    """Stav instance jen z paměti - data, stav ippi.io z proberu, cache a pool"""
+    has_data = (
+        DATA_SOURCE in STORED_READERS
+        or aggregation_engine.has_data("Residential Sale")
+        or "Residential Sale" in snapshot_records
+    )
+    upstream = upstream_prober.report()
+    upstream["breaker"] = upstream_breaker.state
+    
+    # Připravená je instance, která má co servírovat (i ze starých dat)
+    ready = has_data or upstream["status"] == "up"
+    
+    cache = aggregate_cache.stats()
+    pool = workers.stats()
+    
+    return ready, {
+        "status": "ready" if ready else "not_ready",
+        "timestamp": datetime.now().isoformat(),
+        "upstream": upstream,
+        "data": {
+            market_type: {
+                "age": data_age(market_type),
+                "snapshot_age": snapshot_age(market_type)
             }
-            
-            result = elasticsearch_manager.search_elasticsearch(test_query, size=1)
-            
-            if result:
-                return {
-                    "status": "healthy",
-                    "timestamp": datetime.now().isoformat(),
-                    "elasticsearch_connection": "connected",
-                    "data_source": "ippi.io Elasticsearch - existující kód",
-                    "manager_status": "available"
-                }
-        
-        return {
-            "status": "partial",
-            "timestamp": datetime.now().isoformat(),
-            "elasticsearch_connection": "manager unavailable",
-            "note": "API funguje, ale Elasticsearch manager není dostupný"
-        }
-            
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "timestamp": datetime.now().isoformat(),
-            "elasticsearch_connection": f"error: {str(e)}"
+            for market_type in SNAPSHOT_MARKET_TYPES
+        },
+        "cache": {
+            "entries": cache["entries"],
+            "fill": round(cache["bytes"] / cache["max_bytes"], 4) if cache["max_bytes"] else 0.0,
+            "hit_ratio": cache["hit_ratio"]
+        },
+        "workers": {
+            "pending": pool["pending"],
+            "max_pending": pool["max_pending"],
+            "saturation": pool["saturation"],
+            "rejected": pool["rejected"]
         }
+    }
+
+REGISTRY.callback("pmx_cache_hits_total", "Zásahy cache agregací",
+                  lambda: aggregate_cache.stats()["hits"], kind="counter")
+REGISTRY.callback("pmx_cache_misses_total", "Výpadky cache agregací",
+                  lambda: aggregate_cache.stats()["misses"], kind="counter")
+REGISTRY.callback("pmx_cache_hit_ratio", "Podíl zásahů cache agregací",
+                  lambda: aggregate_cache.stats()["hit_ratio"])
+REGISTRY.callback("pmx_cache_bytes", "Odhad velikosti cache agregací v bajtech",
+                  lambda: aggregate_cache.stats()["bytes"])
+REGISTRY.callback("pmx_auth_cache_hit_ratio", "Podíl zásahů cache ověřených klíčů",
+                  lambda: api_key_auth.stats()["hit_ratio"])
+REGISTRY.callback("pmx_upstream_shared_total", "Dotazy na ippi.io sdílené přes single-flight",
+                  lambda: upstream_flight.stats()["shared"], kind="counter")
+REGISTRY.callback("pmx_worker_pending", "Rozpracované úlohy ve worker poolu",
+                  lambda: workers.stats()["pending"])
+REGISTRY.callback("pmx_worker_saturation", "Zaplnění worker poolu (pending / max_pending)",
+                  lambda: workers.stats()["saturation"])
+REGISTRY.callback("pmx_worker_rejected_total", "Úlohy odmítnuté kvůli plnému poolu (503)",
+                  lambda: workers.stats()["rejected"], kind="counter")
+REGISTRY.callback("pmx_upstream_breaker_open", "1 pokud circuit breaker ippi.io není zavřený",
+                  lambda: 0 if upstream_breaker.state == CLOSED else 1)
+REGISTRY.callback("pmx_data_age_seconds", "Stáří dat, ze kterých se odpovídá",
+                  lambda: {market_type: data_age(market_type) for market_type in SNAPSHOT_MARKET_TYPES},
+                  labels=("market_type",))
+
+@app.get("/api/admin/profiler")
+async def get_profiler(x_pmx_admin_token: str = Header(None)):
+    """Stav globálního profileru"""
+    require_admin(x_pmx_admin_token)
+    return profiler.stats()
+
+@app.post("/api/admin/profiler")
+async def toggle_profiler(enabled: bool, reset: bool = False, x_pmx_admin_token: str = Header(None)):
+    """Zapni/vypni globální profiler za běhu, volitelně zahoď nasbírané vzorky"""
+    require_admin(x_pmx_admin_token)
+    if reset:
+        profiler.reset()
+    if enabled:
+        profiler.start()
+    else:
+        await asyncio.to_thread(profiler.stop)
+    return profiler.stats()
+
+@app.get("/api/admin/profiler/report")
+async def get_profiler_report(x_pmx_admin_token: str = Header(None)):
+    """Collapsed stacks globálního profileru (flamegraph.pl, speedscope)"""
+    require_admin(x_pmx_admin_token)
+    return PlainTextResponse(profiler.collapsed())
+
+@app.get("/api/admin/profiles/{name}")
+async def get_profile_report(name: str, x_pmx_admin_token: str = Header(None)):
+    """Uložený profil jednoho požadavku (jméno z hlavičky X-PMX-Profile-Report)"""
+    require_admin(x_pmx_admin_token)
+    path = report_path(name)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profil nenalezen")
+    return FileResponse(path, media_type="text/plain")
+
+@app.get("/metrics")
+async def metrics():
+    """Metriky pro Prometheus - bez API klíče, jen čtení z paměti"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness - proces běží a event loop odpovídá"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness - 503, dokud instance nemá data ani dostupné ippi.io"""
+    ready, report = readiness_report()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+@app.get("/health")
+async def health_check():
+    """Health check endpoint - souhrn stavu bez dotazu na Elasticsearch"""
+    _, report = readiness_report()
+    return report
 
 if __name__ == "__main__":
     print("🚀 Spouštím Property Market API s existujícím Elasticsearch kódem...")
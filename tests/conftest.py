@@ -0,0 +1,31 @@
+"""
+Společné fixtures testů - syntetická data místo Elasticsearch
+
+Testy běží z kořene repozitáře (python -m pytest tests) bez MySQL
+i Elasticsearch, stačí pandas a numpy.
+"""
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pmx_processing import process_hits_columnar, EXTRA_FIELDS
+from pmx_synthetic import COUNTY_WEIGHTS, generate_hits
+
+COUNTY_LIST = list(COUNTY_WEIGHTS)
+DATE_FROM = datetime(2023, 1, 1)
+DATE_TO = datetime(2025, 12, 31)
+
+def make_hits(count, seed=42, market_type="Residential Sale", date_from=DATE_FROM, date_to=DATE_TO, start_id=0):
+    return list(generate_hits(count, seed=seed, market_type=market_type,
+                              date_from=date_from, date_to=date_to, start_id=start_id))
+
+def make_records(hits):
+    return process_hits_columnar(hits, COUNTY_LIST, extra_fields=EXTRA_FIELDS)
+
+@pytest.fixture(scope="session")
+def sale_records():
+    return make_records(make_hits(20000))
@@ -0,0 +1,69 @@
+"""Přechody stavů circuit breakeru"""
+import time
+
+import pytest
+
+from pmx_breaker import CircuitBreaker, UpstreamUnavailable, CLOSED, OPEN, HALF_OPEN
+
+def fail():
+    raise ConnectionError("timeout")
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=3, backoff=60)
+    for _ in range(2):
+        breaker.record_failure("timeout")
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+def test_half_open_after_backoff_then_closes():
+    breaker = CircuitBreaker("test", failure_threshold=1, backoff=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # V half_open projde jen jeden zkušební dotaz
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+def test_half_open_failure_doubles_backoff():
+    breaker = CircuitBreaker("test", failure_threshold=1, backoff=0.01, max_backoff=0.03)
+    breaker.record_failure()
+    for expected in (0.02, 0.03, 0.03):
+        time.sleep(breaker.backoff + 0.01)
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.backoff == pytest.approx(expected)
+
+    time.sleep(breaker.backoff + 0.01)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.backoff == pytest.approx(0.01)
+
+def test_call_counts_exceptions_and_empty_results():
+    breaker = CircuitBreaker("test", failure_threshold=2, backoff=60)
+    with pytest.raises(UpstreamUnavailable):
+        breaker.call(fail)
+    with pytest.raises(UpstreamUnavailable):
+        breaker.call(lambda: None)
+    assert breaker.state == OPEN
+
+    # Otevřený breaker funkci vůbec nezavolá
+    called = []
+    with pytest.raises(UpstreamUnavailable):
+        breaker.call(lambda: called.append(1) or {})
+    assert not called
+
+def test_call_success_returns_result():
+    breaker = CircuitBreaker("test", failure_threshold=2, backoff=60)
+    breaker.record_failure()
+    assert breaker.call(lambda: {"ok": 1}) == {"ok": 1}
+    assert breaker.failures == 0
@@ -0,0 +1,55 @@
+"""Souběžné stahování úseků - opakovaný úsek naváže od posledního hitu"""
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+import pmx_fanout
+from pmx_fanout import fetch_slices, month_slices
+
+def hit(slice_id, position):
+    return {"_id": f"{slice_id}-{position}", "sort": [position, slice_id]}
+
+def make_stream(sizes, failures):
+    """stream_slice, který v úsecích z failures jednou selže uprostřed"""
+    calls = Counter()
+
+    def stream_slice(search_after=None, slice_id=None):
+        calls[slice_id] += 1
+        start = 0 if search_after is None else search_after[0] + 1
+        for position in range(start, sizes[slice_id]):
+            if slice_id in failures and calls[slice_id] == 1 and position == failures[slice_id]:
+                raise ConnectionError("timeout")
+            yield hit(slice_id, position)
+
+    return stream_slice, calls
+
+def test_month_slices_cover_window():
+    slices = month_slices(datetime(2023, 1, 1), datetime(2025, 12, 31), 12)
+    assert slices == [
+        (datetime(2023, 1, 1), datetime(2023, 12, 31)),
+        (datetime(2024, 1, 1), datetime(2024, 12, 31)),
+        (datetime(2025, 1, 1), datetime(2025, 12, 31))
+    ]
+
+def test_failed_slice_resumes_without_duplicates(monkeypatch):
+    monkeypatch.setattr(pmx_fanout, "CHUNK_SIZE", 10)
+    sizes = {0: 45, 1: 30, 2: 7}
+    stream_slice, calls = make_stream(sizes, failures={0: 23, 2: 3})
+
+    specs = [{"slice_id": slice_id} for slice_id in sizes]
+    ids = [item["_id"] for item in fetch_slices(specs, stream_slice, fanout=2, retries=1, backoff=0)]
+
+    assert Counter(ids) == Counter(hit(s, p)["_id"] for s, size in sizes.items() for p in range(size))
+    assert calls == {0: 2, 1: 1, 2: 2}
+
+def test_exhausted_retries_raise():
+    stream_slice, _ = make_stream({0: 5}, failures={0: 2})
+    with pytest.raises(ConnectionError):
+        list(fetch_slices([{"slice_id": 0}], stream_slice, retries=0, backoff=0))
+
+def test_non_retryable_error_is_not_repeated():
+    stream_slice, calls = make_stream({0: 5}, failures={0: 2})
+    with pytest.raises(ConnectionError):
+        list(fetch_slices([{"slice_id": 0}], stream_slice, retries=3, backoff=0, retryable=lambda error: False))
+    assert calls[0] == 1
@@ -0,0 +1,108 @@
+"""Checkpoint importu - přerušený úsek naváže bez ztráty i zdvojení záznamů"""
+import threading
+from collections import Counter
+
+import pmx_import
+from pmx_import import ImportCheckpoint, ImportJob, DONE, STOPPED, FAILED
+from conftest import DATE_FROM, DATE_TO, make_hits, make_records
+
+class FakeBackend:
+    """Elasticsearch nad seznamem hitů seřazených podle sort"""
+
+    def __init__(self, hits, fail_after=None):
+        self.hits = sorted(hits, key=lambda hit: hit["sort"])
+        self.fail_after = fail_after
+
+    def stream_elasticsearch_hits(self, market_type, source_fields=None, date_from=None, date_to=None,
+                                  search_after=None):
+        for position, hit in enumerate(hit for hit in self.hits if search_after is None or hit["sort"] > search_after):
+            if self.fail_after is not None and position >= self.fail_after:
+                raise ConnectionError("spojení přerušeno")
+            yield hit
+
+    def process_elasticsearch_data_with_existing_logic(self, hits, extra_fields):
+        return make_records(hits)
+
+class FakeLoader:
+    """Místo MySQL si zapsané řádky jen pamatuje"""
+
+    def __init__(self, written, stop_event=None):
+        self.written = written
+        self.stop_event = stop_event
+
+    def load(self, frame):
+        self.written.extend(frame["id"])
+        if self.stop_event is not None:
+            self.stop_event.set()
+        return len(frame)
+
+class FakeConnection:
+    def close(self):
+        pass
+
+def patch_database(monkeypatch, written, stop_event=None):
+    monkeypatch.setattr(pmx_import, "bulk_connect", FakeConnection)
+    monkeypatch.setattr(pmx_import, "records_loader", lambda connection: FakeLoader(written, stop_event))
+
+def test_checkpoint_persists_and_retains(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    checkpoint = ImportCheckpoint(str(path))
+    checkpoint.update("a", search_after=[1, 2], docs=10)
+    checkpoint.update("a", docs=20)
+    checkpoint.update("b", done=True)
+
+    reloaded = ImportCheckpoint(str(path))
+    assert reloaded.get("a")["search_after"] == [1, 2]
+    assert reloaded.get("a")["docs"] == 20
+    assert reloaded.get("missing") == {}
+
+    reloaded.retain(["b"])
+    assert ImportCheckpoint(str(path)).get("a") == {}
+    assert ImportCheckpoint(str(path)).get("b")["done"]
+
+    reloaded.clear()
+    assert ImportCheckpoint(str(path)).get("b") == {}
+
+def test_stopped_job_resumes_without_duplicates(tmp_path, monkeypatch):
+    hits = make_hits(2500)
+    backend = FakeBackend(hits)
+    expected = set(make_records(hits)["id"].astype(str))
+    checkpoint = ImportCheckpoint(str(tmp_path / "checkpoint.json"))
+    written = []
+
+    # Po první dávce přijde Ctrl+C
+    stop_event = threading.Event()
+    patch_database(monkeypatch, written, stop_event)
+    job = ImportJob("Residential Sale", DATE_FROM, DATE_TO, checkpoint, batch_size=1000)
+    assert job.run(backend, stop_event).state == STOPPED
+    assert job.docs == 1000
+    assert ImportCheckpoint(checkpoint.path).get(job.key)["search_after"] == backend.hits[999]["sort"]
+
+    patch_database(monkeypatch, written)
+    resumed = ImportJob("Residential Sale", DATE_FROM, DATE_TO, ImportCheckpoint(checkpoint.path), batch_size=1000)
+    assert resumed.run(backend, threading.Event()).state == DONE
+    assert resumed.resumed_docs == 1000
+    assert resumed.docs == len(hits)
+
+    assert not [doc_id for doc_id, seen in Counter(written).items() if seen > 1]
+    assert set(written) == expected
+
+    # Hotový úsek se při dalším běhu přeskočí
+    again = ImportJob("Residential Sale", DATE_FROM, DATE_TO, ImportCheckpoint(checkpoint.path), batch_size=1000)
+    assert again.run(backend, threading.Event()).state == DONE
+    assert len(written) == len(expected)
+
+def test_failed_job_resumes_after_last_commit(tmp_path, monkeypatch):
+    hits = make_hits(2500)
+    checkpoint = ImportCheckpoint(str(tmp_path / "checkpoint.json"))
+    written = []
+    patch_database(monkeypatch, written)
+
+    job = ImportJob("Residential Sale", DATE_FROM, DATE_TO, checkpoint, batch_size=1000)
+    assert job.run(FakeBackend(hits, fail_after=1500), threading.Event()).state == FAILED
+    assert "ConnectionError" in job.error
+    assert job.docs == 1000
+
+    resumed = ImportJob("Residential Sale", DATE_FROM, DATE_TO, ImportCheckpoint(checkpoint.path), batch_size=1000)
+    assert resumed.run(FakeBackend(hits), threading.Event()).state == DONE
+    assert len(written) == len(set(written)) == len(make_records(hits))
@@ -0,0 +1,42 @@
+"""Spojování snapshotu s obnovenými měsíci a zápis/čtení snapshotu"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from pmx_snapshot import splice_records, write_snapshot, read_snapshot
+from conftest import DATE_FROM, DATE_TO, make_hits, make_records
+
+REFRESH_FROM = datetime(2025, 10, 1)
+
+def test_splice_replaces_refreshed_months(sale_records):
+    fresh = make_records(make_hits(300, seed=3, date_from=REFRESH_FROM, date_to=DATE_TO, start_id=10 ** 6))
+    window_from = datetime(2023, 6, 1)
+    merged = splice_records(sale_records, fresh, window_from, REFRESH_FROM)
+
+    dates = sale_records["saleDate"]
+    kept = sale_records[(dates >= pd.Timestamp(window_from)) & (dates < pd.Timestamp(REFRESH_FROM))]
+    assert len(merged) == len(kept) + len(fresh)
+    assert merged["saleDate"].min() >= pd.Timestamp(window_from)
+
+    refreshed = merged[merged["saleDate"] >= pd.Timestamp(REFRESH_FROM)]
+    assert sorted(refreshed["id"]) == sorted(fresh["id"])
+
+    for column in ("county", "region", "area"):
+        assert isinstance(merged[column].dtype, pd.CategoricalDtype)
+
+def test_splice_without_previous_returns_fresh(sale_records):
+    fresh = sale_records.head(10)
+    assert splice_records(None, fresh, DATE_FROM, REFRESH_FROM) is fresh
+    assert splice_records(sale_records.head(0), fresh, DATE_FROM, REFRESH_FROM) is fresh
+    assert splice_records(sale_records, fresh, REFRESH_FROM, REFRESH_FROM) is fresh
+
+def test_snapshot_roundtrip(sale_records, tmp_path):
+    pytest.importorskip("pyarrow")
+    meta = write_snapshot("Residential Sale", sale_records, DATE_FROM, DATE_TO, directory=tmp_path)
+    df, loaded = read_snapshot("Residential Sale", directory=tmp_path)
+
+    assert loaded["records"] == meta["records"] == len(sale_records)
+    assert loaded["date_from"] == "2023-01-01"
+    pd.testing.assert_series_equal(df["price"], sale_records["price"].reset_index(drop=True))
+    assert read_snapshot("Residential Rent", directory=tmp_path) is None